@@ -1,146 +1,259 @@
-from fastapi import FastAPI, Query
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Query, Request, Response
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
+from sqlalchemy import insert, update, func
+import asyncio
+import logging
+import os
+import time
 import uuid
 import math
 import json
+from typing import Optional
 
 from database import engine, SessionLocal
 from models import Base, UserSession, TimelineItem, Reflection, Message
+from migrations import run_migrations
+from message_feed import subscribe, wait_for_change
+from single_flight import SingleFlight
+from context_builder import forget_summary
+from conversation_summary import delete_summary
+from jobs import job_queue, job_handler, public_job, ACTIVE_STATUSES
+from prefetch import prefetch_task, prefetch_likely_next
+from evaluation import evaluate, evaluation_key
+from metrics import HTTP_REQUEST_SECONDS, instrument_engine, render as render_metrics
 from tasks import TASKS
-from orchestrator import handle_turn
-from llm.task_analyzer import analyze_task, generate_task_description, generate_task_insights, choose_similar_task
-from llm.coach_agent import generate_task_feedback
-from llm.manager_agent import generate_scenario_example
-from llm.performance_analyzer import get_performance_history, calculate_difficulty_adjustment, adjust_difficulty_string, create_difficulty_context
-from llm.prompt_generator import (
-    generate_analysis_task, 
-    generate_interpretation_task,
-    generate_planning_task,
-    generate_technique_task
-)
-from llm.evaluation_agent import (
-    evaluate_analysis,
-    evaluate_interpretation,
-    evaluate_plan,
-    evaluate_technique
+from orchestrator import handle_turn, stream_turn, latest_coach_tips, format_message, ensure_scenario, COACH_MODES
+from content_pool import build_pool, draw_pooled_content
+from llm.task_analyzer import analyze_task, generate_task_description, generate_task_insights, choose_similar_task, estimate_program_length
+from llm.coach_agent import generate_task_feedback_async
+from llm.performance_analyzer import get_performance_history, calculate_difficulty_adjustment, adjust_difficulty_string, create_difficulty_context, get_performance_band, difficulty_context_for_band, counted_grade, record_grade
+from llm.prompt_generator import generate_task_content_async
+from llm.evaluation_agent import RUBRICS
+from llm.client import close_async_client, llm_priority, BACKGROUND, INTERACTIVE
+
+# LOG_LEVEL=DEBUG restores the verbose per-turn tracing (conversation histories, task state dumps)
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
 )
+logger = logging.getLogger(__name__)
+
+instrument_engine(engine)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pre-generate shared task content in the background
+    pool_builder = asyncio.create_task(build_pool())
+    await job_queue.start()
+    yield
+    await job_queue.stop()
+    pool_builder.cancel()
+    # Release pooled LLM connections on shutdown
+    await close_async_client()
+
+
+app = FastAPI(title="SkillBuilder – Negotiation", lifespan=lifespan)
+
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template (/messages/{session_id}/{task_title}), not the raw path
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - started,
+        method=request.method,
+        route=route.path if route is not None else "unmatched",
+    )
+    return response
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus-style metrics: request, DB query, LLM call and parse timings, token counts."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+def _job_accepted(job: dict) -> JSONResponse:
+    """202 response for work handed to the job queue; poll status_url or stream it for the result."""
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job["id"], "status": job["status"], "status_url": f"/jobs/{job['id']}"},
+    )
+
+
+# Background jobs
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Status of a queued job: queued | running | succeeded | failed, with its result once finished."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found"})
+    return public_job(job)
+
+
+@app.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str, request: Request):
+    """Push the job as an SSE "job" event on every status change; the stream ends when it finishes."""
+    async def events():
+        with job_queue.watch(job_id) as changed:
+            while not await request.is_disconnected():
+                changed.clear()
+                job = job_queue.get(job_id)
+                if job is None:
+                    yield _sse_event("error", {"error": "Job not found"})
+                    return
+                yield _sse_event("job", public_job(job))
+                if job["status"] not in ACTIVE_STATUSES:
+                    return
+                if not await wait_for_change(changed, MESSAGE_STREAM_HEARTBEAT_SECONDS):
+                    yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-app = FastAPI(title="SkillBuilder – Negotiation")
 
 # Task Feedback 
 @app.get("/task-feedback/{session_id}")
-def task_feedback(session_id: str):
+async def task_feedback(session_id: str, wait: bool = True):
+    """Grade the current simulation and move on to the next task. With wait=false, returns a job (202)."""
+    if not wait:
+        return _job_accepted(job_queue.enqueue("task_feedback", {"session_id": session_id}, dedupe_key=f"task_feedback:{session_id}"))
+    return await _task_feedback(session_id)
+
+
+def _load_task_feedback_input(session_id: str) -> tuple:
+    """(user/manager chat history, in_progress task id or None, its title) in a short-lived session."""
     db = SessionLocal()
-    # Get all messages for the session
-    messages = (
-        db.query(Message)
-        .filter(Message.session_id == session_id)
-        .order_by(Message.timestamp.asc())
-        .all()
-    )
-    # Get current active task for the session
-    current_task = (
-        db.query(TimelineItem)
-        .filter(TimelineItem.session_id == session_id, TimelineItem.status == "in_progress")
-        .first()
-    )
-    chat_history = [
-        {
-            "sender": msg.sender,
-            "text": msg.text,
-        }
-        for msg in messages
-        if msg.sender in ["user", "manager"]
-    ]
-    # Use task title if available
-    task_title = current_task.title if current_task else ""
-    result = generate_task_feedback(chat_history, task_title)
-    # Mark current task as completed (only if it was started by user)
-    if current_task:
+    try:
+        # Get all messages for the session
+        messages = (
+            db.query(Message)
+            .filter(Message.session_id == session_id)
+            .order_by(Message.timestamp.asc())
+            .all()
+        )
+        # Get current active task for the session
+        current_task = (
+            db.query(TimelineItem)
+            .filter(TimelineItem.session_id == session_id, TimelineItem.status == "in_progress")
+            .first()
+        )
+        chat_history = [
+            {
+                "sender": msg.sender,
+                "text": msg.text,
+            }
+            for msg in messages
+            if msg.sender in ["user", "manager"]
+        ]
+        if not current_task:
+            return chat_history, None, ""
+        return chat_history, current_task.id, current_task.title
+    finally:
+        db.close()
+
+
+def _save_task_feedback(session_id: str, task_id: int, result: dict) -> None:
+    """Store a simulation's grade, complete it if the user started it and start the next planned task."""
+    db = SessionLocal()
+    try:
+        current_task = db.query(TimelineItem).filter(TimelineItem.id == task_id).first()
         # Only mark as completed if user actually started it
-        if current_task.has_started == 1:
+        if current_task and current_task.has_started == 1:
+            old_grade = counted_grade(current_task)
             current_task.status = "completed"
             # Save the grade to the database
             if result.get("grade") is not None:
                 current_task.grade = result["grade"]
                 current_task.feedback = result.get("feedback", "")
-                print(f"[task_feedback] Marking task '{current_task.title}' as completed with grade {result['grade']}")
+                logger.info("[task_feedback] Marking task '%s' as completed with grade %s", current_task.title, result['grade'])
             else:
-                print(f"[task_feedback] Marking task '{current_task.title}' as completed (no grade)")
-        else:
+                logger.info("[task_feedback] Marking task '%s' as completed (no grade)", current_task.title)
+            record_grade(db, current_task, old_grade)
+        elif current_task:
             # Task was never started, don't mark as complete
-            print(f"[task_feedback] Task '{current_task.title}' was never started, not marking as completed")
+            logger.info("[task_feedback] Task '%s' was never started, not marking as completed", current_task.title)
         # Set next planned task to in_progress
         next_task = db.query(TimelineItem).filter(TimelineItem.session_id == session_id, TimelineItem.status == "planned").first()
         if next_task:
             next_task.status = "in_progress"
         db.commit()
-    db.close()
+        prefetch_task(session_id, next_task)
+    finally:
+        db.close()
+
+
+@job_handler("task_feedback", priority=INTERACTIVE)
+async def _task_feedback(session_id: str) -> dict:
+    # Database work runs in worker threads with short-lived sessions, so no connection
+    # is held (and the event loop never blocks on the pool) during the LLM call
+    chat_history, task_id, task_title = await asyncio.to_thread(_load_task_feedback_input, session_id)
+    result = await generate_task_feedback_async(chat_history, task_title)
+    if task_id is not None:
+        await asyncio.to_thread(_save_task_feedback, session_id, task_id, result)
     return {"feedback": result["feedback"], "grade": result["grade"]}
 
 
 # Scenario Example 
-@app.get("/scenario-example/{session_id}")
-def scenario_example(session_id: str):
+def _active_task(session_id: str) -> Optional[TimelineItem]:
+    """The session's in_progress task (detached), read in a short-lived session."""
     db = SessionLocal()
-    current_task = (
-        db.query(TimelineItem)
-        .filter(
-            TimelineItem.session_id == session_id,
-            TimelineItem.status == "in_progress",
+    try:
+        return (
+            db.query(TimelineItem)
+            .filter(
+                TimelineItem.session_id == session_id,
+                TimelineItem.status == "in_progress",
+            )
+            .first()
         )
-        .first()
-    )
+    finally:
+        db.close()
+
+
+def _store_scenario(session_id: str, task_title: str, text: str) -> None:
+    db = SessionLocal()
+    try:
+        db.add(Message(
+            session_id=session_id,
+            task_title=task_title,
+            sender="system",
+            text=text,
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+
+@app.get("/scenario-example/{session_id}")
+async def scenario_example(session_id: str):
+    # Database work runs in worker threads with short-lived sessions
+    current_task = await asyncio.to_thread(_active_task, session_id)
     
     if not current_task:
-        db.close()
         return {"error": "No active task"}
     
     # Only generate scenario for simulation tasks
     if current_task.task_type and current_task.task_type != "simulation":
-        db.close()
         return {"scenario": ""}
+    task_title, coach_summary = current_task.title, current_task.coach_summary
     
     try:
-        # First, check if scenario already exists in database (stored by orchestrator)
-        existing_scenario = (
-            db.query(Message)
-            .filter(
-                Message.session_id == session_id,
-                Message.task_title == current_task.title,
-                Message.sender == "system"
-            )
-            .first()
-        )
-        
-        if existing_scenario:
-            print(f"[scenario_example] Using stored scenario for task '{current_task.title}'")
-            db.close()
-            return {"scenario": existing_scenario.text}
-        
-        # If no stored scenario, generate and store it
-        print(f"[scenario_example] Generating new scenario for task '{current_task.title}'")
-        scenario = generate_scenario_example(current_task.title, current_task.coach_summary)
-        
-        # Store it for future use
-        scenario_msg = Message(
-            session_id=session_id,
-            task_title=current_task.title,
-            sender="system",
-            text=scenario,
-        )
-        db.add(scenario_msg)
-        db.commit()
-        print(f"[scenario_example] Scenario stored in database")
-        
-        db.close()
-        return {"scenario": scenario}
+        # Stored by an earlier call or the first chat turn; otherwise generated once,
+        # however many requests ask for it concurrently
+        scenario_msg = await ensure_scenario(session_id, task_title, coach_summary)
+        return {"scenario": scenario_msg.text}
     except Exception as e:
-        print(f"[scenario_example] LLM error: {e}")
-        import traceback
-        traceback.print_exc()
-        db.close()
+        logger.exception("[scenario_example] LLM error: %s", e)
         
         # Fallback scenario if LLM fails
         fallback_scenarios = {
@@ -149,20 +262,16 @@ def scenario_example(session_id: str):
             "Medium-Stakes Conversation: Chronic Lateness": "You are Jordan, your supervisor. You need to address chronic lateness. Jordan says: 'I've noticed you've been arriving late pretty consistently over the past few weeks. I want to understand what's going on and how we can work together to fix this.'"
         }
         
-        fallback = fallback_scenarios.get(current_task.title, "")
+        fallback = fallback_scenarios.get(task_title, "")
         if fallback:
             # Store fallback scenario for future use
-            scenario_msg = Message(
-                session_id=session_id,
-                task_title=current_task.title,
-                sender="system",
-                text=fallback,
-            )
-            db.add(scenario_msg)
-            db.commit()
-            print(f"[scenario_example] Using fallback scenario for '{current_task.title}'")
+            try:
+                await asyncio.to_thread(_store_scenario, session_id, task_title, fallback)
+            except Exception as e:
+                logger.error("[scenario_example] Error storing fallback scenario: %s", e)
+            logger.debug("[scenario_example] Using fallback scenario for '%s'", task_title)
         else:
-            print(f"[scenario_example] No fallback scenario available for '{current_task.title}'")
+            logger.warning("[scenario_example] No fallback scenario available for '%s'", task_title)
         
         return {"scenario": fallback}
 
@@ -172,13 +281,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
 Base.metadata.create_all(bind=engine)
+run_migrations(engine)
 
 # Get task content based on task type
+task_content_flights = SingleFlight("task_content")
+
+
 @app.get("/task-content/{session_id}")
-def get_task_content(session_id: str, task_title: str = Query(None)):
+async def get_task_content(session_id: str, task_title: str = Query(None)):
     """
     Get the content for the current active task or a specific task.
     For simulation tasks: returns scenario.
@@ -190,89 +304,148 @@ def get_task_content(session_id: str, task_title: str = Query(None)):
     If task_title is provided, returns content for that specific task.
     Otherwise, returns content for the current in_progress task.
     """
-    db = SessionLocal()
-    print(f"[task-content] Called with session_id={session_id}, task_title={task_title}")
-    
-    # If task_title is provided, find that specific task
-    if task_title:
-        print(f"[task-content] Searching for task with title: {task_title}")
-        current_task = (
-            db.query(TimelineItem)
-            .filter(TimelineItem.session_id == session_id, TimelineItem.title == task_title)
-            .first()
-        )
-        if not current_task:
-            print(f"[task-content] Task not found with title: {task_title}")
-    else:
-        # Otherwise, find the in_progress task
-        print(f"[task-content] Searching for in_progress task")
-        current_task = (
-            db.query(TimelineItem)
-            .filter(TimelineItem.session_id == session_id, TimelineItem.status == "in_progress")
-            .first()
-        )
+    logger.debug("[task-content] Called with session_id=%s, task_title=%s", session_id, task_title)
+    current_task = await asyncio.to_thread(_content_task, session_id, task_title)
     
     if not current_task:
-        print(f"[task-content] No task found")
-        db.close()
+        logger.warning("[task-content] No task found")
         return {"error": "No active task", "task_type": None, "task_content": {}}
     
-    print(f"[task-content] Found task: {current_task.title}, type: {current_task.task_type}")
+    logger.debug("[task-content] Found task: %s, type: %s", current_task.title, current_task.task_type)
     
-    # If task_content is already generated, return it
+    # If task_content is already generated, return it (already JSON in database)
     if current_task.task_content:
-        try:
-            print(f"[task-content] Returning stored task_content for {current_task.title}")
-            db.close()
-            # Return as string (already JSON in database)
-            return {"task_type": current_task.task_type, "task_content": current_task.task_content}
-        except Exception as e:
-            print(f"[get_task_content] Error parsing stored content: {e}")
-            pass
-    
-    # Generate content based on task type
-    task_type = current_task.task_type or "simulation"
-    print(f"[get_task_content] Generating content for task_type: {task_type}, title: {current_task.title}")
-    content = {}
-    
-    # Get performance context for adaptive difficulty
-    performance_context = create_difficulty_context(session_id, db)
-    if performance_context:
-        print(f"[get_task_content] Using performance context for task generation")
+        logger.debug("[task-content] Returning stored task_content for %s", current_task.title)
+        return {"task_type": current_task.task_type, "task_content": current_task.task_content}
     
+    # Generate once per task, however many requests arrive while it is in flight
+    return await task_content_flights.run((session_id, current_task.id), _generate_task_content, session_id, current_task.id)
+
+
+def _content_task(session_id: str, task_title: Optional[str]) -> Optional[TimelineItem]:
+    """The task titled task_title, or the in_progress task, read in a short-lived session."""
+    db = SessionLocal()
+    try:
+        # If task_title is provided, find that specific task
+        if task_title:
+            logger.debug("[task-content] Searching for task with title: %s", task_title)
+            current_task = (
+                db.query(TimelineItem)
+                .filter(TimelineItem.session_id == session_id, TimelineItem.title == task_title)
+                .first()
+            )
+            if not current_task:
+                logger.warning("[task-content] Task not found with title: %s", task_title)
+            return current_task
+        # Otherwise, find the in_progress task
+        logger.debug("[task-content] Searching for in_progress task")
+        return (
+            db.query(TimelineItem)
+            .filter(TimelineItem.session_id == session_id, TimelineItem.status == "in_progress")
+            .first()
+        )
+    finally:
+        db.close()
+
+
+@job_handler("prefetch_task_content")
+async def _prefetch_task_content(session_id: str, task_id: int) -> dict:
+    """
+    Generate a task's content ahead of the learner opening it: the scenario for simulations,
+    task content otherwise. Shares in-flight generations with /scenario-example and /task-content.
+    """
+    task = await asyncio.to_thread(_task_by_id, task_id)
+    if not task:
+        return {"error": "Task not found"}
+    task_type = task.task_type or "simulation"
+    title, coach_summary = task.title, task.coach_summary
+    if task_type == "simulation":
+        await ensure_scenario(session_id, title, coach_summary)
+    else:
+        await task_content_flights.run((session_id, task_id), _generate_task_content, session_id, task_id)
+    return {"task_id": task_id, "task_type": task_type}
+
+
+def _task_by_id(task_id: int) -> Optional[TimelineItem]:
+    db = SessionLocal()
+    try:
+        return db.query(TimelineItem).filter(TimelineItem.id == task_id).first()
+    finally:
+        db.close()
+
+
+def _prepare_task_content(session_id: str, task_id: int) -> tuple:
+    """
+    Database part of content generation, run in a worker thread with a short-lived session.
+    Returns (result, None) when the task already has content or pooled content was stored
+    for it, else (None, (task_type, title, coach_summary, performance_context)).
+    """
+    db = SessionLocal()
+    try:
+        current_task = db.query(TimelineItem).filter(TimelineItem.id == task_id).first()
+        # A previous flight may have stored it after the caller looked
+        if current_task.task_content:
+            return {"task_type": current_task.task_type, "task_content": current_task.task_content}, None
+
+        # Generate content based on task type
+        task_type = current_task.task_type or "simulation"
+        logger.debug("[get_task_content] Generating content for task_type: %s, title: %s", task_type, current_task.title)
+        
+        # Get performance band for adaptive difficulty
+        performance = get_performance_history(session_id, db)
+        band = get_performance_band(performance)
+
+        # Serve pre-generated content for this task and band when the shared pool has some
+        if task_type != "simulation":
+            pooled_content = draw_pooled_content(db, current_task.title, band)
+            if pooled_content:
+                logger.info("[get_task_content] Serving pooled content for %s (%s)", current_task.title, band)
+                current_task.task_content = pooled_content
+                db.commit()
+                return {"task_type": task_type, "task_content": pooled_content}, None
+
+        performance_context = difficulty_context_for_band(band, performance.get("avg_grade"))
+        if performance_context:
+            logger.debug("[get_task_content] Using performance context for task generation")
+        return None, (task_type, current_task.title, current_task.coach_summary, performance_context)
+    finally:
+        db.close()
+
+
+def _store_task_content(task_id: int, task_content: str) -> None:
+    db = SessionLocal()
+    try:
+        db.query(TimelineItem).filter(TimelineItem.id == task_id).update({"task_content": task_content})
+        db.commit()
+    finally:
+        db.close()
+
+
+async def _generate_task_content(session_id: str, task_id: int) -> dict:
+    """
+    Generate (or draw from the pool) and store the content for one task.
+    Database work runs in worker threads, so no session is open during the LLM call.
+    """
+    result, inputs = await asyncio.to_thread(_prepare_task_content, session_id, task_id)
+    if result is not None:
+        return result
+    task_type, title, coach_summary, performance_context = inputs
+
     try:
-        if task_type == "analysis":
-            content = generate_analysis_task(current_task.title, current_task.coach_summary, performance_context)
-            print(f"[get_task_content] Analysis content generated: {bool(content)}")
-        elif task_type == "interpretation":
-            content = generate_interpretation_task(current_task.title, current_task.coach_summary, performance_context)
-            print(f"[get_task_content] Interpretation content generated: {bool(content)}")
-        elif task_type == "planning":
-            content = generate_planning_task(current_task.title, current_task.coach_summary, performance_context)
-            print(f"[get_task_content] Planning content generated: {bool(content)}")
-        elif task_type == "technique":
-            content = generate_technique_task(current_task.title, current_task.coach_summary, "", performance_context)
-            print(f"[get_task_content] Technique content generated: {bool(content)}")
-        elif task_type == "simulation":
-            # For simulation, just return empty content
-            content = {}
+        content = await generate_task_content_async(task_type, title, coach_summary, performance_context)
+        logger.debug("[get_task_content] %s content generated: %s", task_type, bool(content))
     except Exception as e:
-        print(f"[get_task_content] Error generating {task_type} content: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[get_task_content] Error generating %s content: %s", task_type, e)
         content = {}
     
     # Save generated content to database
     if content:
         try:
-            current_task.task_content = json.dumps(content)
-            db.commit()
-            print(f"[get_task_content] Content saved to database")
+            await asyncio.to_thread(_store_task_content, task_id, json.dumps(content))
+            logger.debug("[get_task_content] Content saved to database")
         except Exception as e:
-            print(f"[get_task_content] Error saving content: {e}")
-            db.rollback()
+            logger.error("[get_task_content] Error saving content: %s", e)
     
-    db.close()
     # Return content as JSON string
     return {"task_type": task_type, "task_content": json.dumps(content)}
 
@@ -282,6 +455,9 @@ class TaskResponseRequest(BaseModel):
     session_id: str
     task_title: str
     response: str
+    # With save=true and task_id, the grade, feedback and completion are stored and the next task started
+    task_id: Optional[int] = None
+    save: bool = False
 
 
 class AnalysisResponseRequest(TaskResponseRequest):
@@ -303,185 +479,221 @@ class TechniqueResponseRequest(TaskResponseRequest):
     instruction: str = ""
 
 
-@app.post("/evaluate-analysis")
-def evaluate_analysis_response(req: AnalysisResponseRequest):
-    """Evaluate an analysis task response."""
+class EvaluationRequest(BaseModel):
+    # Prompt fields of task types added later are accepted as extra fields
+    model_config = ConfigDict(extra="allow")
+
+    task_type: str  # a key of llm.evaluation_agent.RUBRICS: analysis | interpretation | planning | technique
+    session_id: str = ""
+    task_title: str
+    response: str
+    task_id: Optional[int] = None
+    save: bool = False  # see TaskResponseRequest (ignored by /evaluate/batch)
+    question: str = ""
+    position: str = ""
+    scenario: str = ""
+    constraints: str = ""
+    technique_name: str = ""
+    other_person_statement: str = ""
+    instruction: str = ""
+
+
+async def _evaluate_request(task_type: str, req: BaseModel, tag: str) -> dict:
+    """
+    Grade a request with the task type's rubric; errors are returned, not raised.
+    With req.save, the result is also stored (see _save_evaluation).
+    """
     try:
-        result = evaluate_analysis(req.question, req.response, req.task_title)
-        
-        # Convert correctness level to grade (backend-controlled)
-        correctness_level = result.get("correctness_level", "minimal").lower()
-        grade_map = {
-            "excellent": 5,
-            "good": 4,
-            "acceptable": 3,
-            "weak": 2,
-            "minimal": 1
-        }
-        grade = grade_map.get(correctness_level, 1)
-        
-        return {
-            "correctness_level": correctness_level,
-            "feedback": result.get("feedback", ""),
-            "grade": grade,
-            "task_title": req.task_title
-        }
+        result = await evaluate(task_type, req.model_dump())
     except Exception as e:
-        print(f"[evaluate-analysis] Error: {e}")
+        logger.error("[%s] Error: %s", tag, e)
         return {"error": str(e)}
+    if req.save:
+        result.update(await asyncio.to_thread(_save_evaluation, req.session_id, req.task_id, result, tag))
+    return result
 
 
-@app.post("/evaluate-interpretation")
-def evaluate_interpretation_response(req: InterpretationResponseRequest):
-    """Evaluate an interpretation task response."""
+def _save_evaluation(session_id: str, task_id: Optional[int], result: dict, tag: str) -> dict:
+    """
+    Store an evaluation in one transaction: the task's grade and feedback, its completion
+    and the start of the next planned task (a task completed earlier is only regraded).
+    Returns {"saved", "next_task"} or {"saved": False, "save_error"}.
+    """
+    if task_id is None:
+        return {"saved": False, "save_error": "task_id is required to save an evaluation"}
+    db = SessionLocal()
     try:
-        result = evaluate_interpretation(req.position, req.response, req.task_title)
-        
-        # Convert insight level to grade (backend-controlled)
-        insight_level = result.get("insight_level", "minimal").lower()
-        grade_map = {
-            "excellent": 5,
-            "good": 4,
-            "acceptable": 3,
-            "weak": 2,
-            "minimal": 1
-        }
-        grade = grade_map.get(insight_level, 1)
-        
-        # Build feedback text
-        feedback_parts = []
-        coach_message = result.get("coach_message", "")
-        feedback = result.get("feedback", "")
-        suggestion = result.get("suggestion", "")
-        
-        if coach_message:
-            feedback_parts.append(f"Coach: {coach_message}")
-        if feedback:
-            feedback_parts.append(f"Feedback: {feedback}")
-        if suggestion:
-            feedback_parts.append(f"Suggestion: {suggestion}")
-        
-        feedback_text = "\n\n".join(feedback_parts) if feedback_parts else "Interpretation evaluation complete."
-        
-        return {
-            "insight_level": insight_level,
-            "grade": grade,
-            "feedback": feedback_text,
-            "coach_message": coach_message,
-            "suggestion": suggestion,
-            "task_title": req.task_title
-        }
+        # Completing the task is a conditional UPDATE, so of two concurrent saves only one
+        # sees rowcount 1 and starts the next task (SELECT ... FOR UPDATE is a no-op on SQLite)
+        completed_now = db.execute(
+            update(TimelineItem)
+            .where(
+                TimelineItem.session_id == session_id,
+                TimelineItem.id == task_id,
+                TimelineItem.status != "completed",
+            )
+            .values(status="completed", has_started=1)
+        ).rowcount == 1
+        task = (
+            db.query(TimelineItem)
+            .filter(TimelineItem.session_id == session_id, TimelineItem.id == task_id)
+            .first()
+        )
+        if not task:
+            return {"saved": False, "save_error": "Task not found"}
+
+        grade = max(0, min(5, result["grade"]))
+        # A task completed by this request had no grade counted in the statistics yet
+        old_grade = None if completed_now else counted_grade(task)
+        task.grade = grade
+        task.feedback = result.get("feedback", "")
+        record_grade(db, task, old_grade)
+        if completed_now:
+            logger.info("[%s] Marked task %s ('%s') as completed", tag, task.id, task.title)
+            next_task = _start_next_task(db, session_id)
+        else:
+            next_task = (
+                db.query(TimelineItem)
+                .filter(TimelineItem.session_id == session_id, TimelineItem.status == "in_progress")
+                .first()
+            )
+        next_info = (
+            {"id": next_task.id, "title": next_task.title, "task_type": next_task.task_type}
+            if next_task else None
+        )
+        db.commit()
+        logger.info("[%s] Saved grade %s for task %s", tag, grade, task_id)
+        prefetch_task(session_id, next_task)
+        return {"saved": True, "next_task": next_info}
     except Exception as e:
-        print(f"[evaluate-interpretation] Error: {e}")
-        return {"error": str(e)}
+        db.rollback()
+        logger.error("[%s] Error saving evaluation: %s", tag, e)
+        return {"saved": False, "save_error": str(e)}
+    finally:
+        db.close()
+
+
+@app.post("/evaluate")
+async def evaluate_response(req: EvaluationRequest):
+    """Evaluate an exercise response of any task type."""
+    return await _evaluate_request(req.task_type, req, "evaluate")
+
+
+@app.post("/evaluate-analysis")
+async def evaluate_analysis_response(req: AnalysisResponseRequest):
+    """Evaluate an analysis task response (alias of /evaluate)."""
+    return await _evaluate_request("analysis", req, "evaluate-analysis")
+
+
+@app.post("/evaluate-interpretation")
+async def evaluate_interpretation_response(req: InterpretationResponseRequest):
+    """Evaluate an interpretation task response (alias of /evaluate)."""
+    return await _evaluate_request("interpretation", req, "evaluate-interpretation")
 
 
 @app.post("/evaluate-plan")
-def evaluate_plan_response(req: PlanningResponseRequest):
-    """Evaluate a planning task response."""
-    try:
-        scenario_text = f"{req.scenario}\n\nConstraints: {req.constraints}" if req.constraints else req.scenario
-        result = evaluate_plan(scenario_text, req.response, req.task_title)
-        
-        # Convert plan quality to grade (backend-controlled)
-        plan_quality = result.get("plan_quality", "minimal").lower()
-        grade_map = {
-            "excellent": 5,
-            "good": 4,
-            "acceptable": 3,
-            "weak": 2,
-            "minimal": 1
-        }
-        grade = grade_map.get(plan_quality, 1)
-        
-        # Build feedback text
-        feedback_parts = []
-        coach_message = result.get("coach_message", "")
-        strengths = result.get("strengths", "")
-        gaps = result.get("gaps", "")
-        suggested_refinement = result.get("suggested_refinement", "")
-        
-        if coach_message:
-            feedback_parts.append(f"Coach: {coach_message}")
-        if strengths:
-            feedback_parts.append(f"Strengths: {strengths}")
-        if gaps:
-            feedback_parts.append(f"Areas for Improvement: {gaps}")
-        if suggested_refinement:
-            feedback_parts.append(f"Suggested Refinement: {suggested_refinement}")
-        
-        feedback_text = "\n\n".join(feedback_parts) if feedback_parts else "Plan evaluation complete."
-        
-        return {
-            "feedback": feedback_text,
-            "grade": grade,
-            "plan_quality": plan_quality,
-            "coach_message": coach_message,
-            "strengths": strengths,
-            "gaps": gaps,
-            "suggested_refinement": suggested_refinement,
-            "task_title": req.task_title
-        }
-    except Exception as e:
-        print(f"[evaluate-plan] Error: {e}")
-        return {"error": str(e)}
+async def evaluate_plan_response(req: PlanningResponseRequest):
+    """Evaluate a planning task response (alias of /evaluate)."""
+    return await _evaluate_request("planning", req, "evaluate-plan")
 
 
 @app.post("/evaluate-technique")
-def evaluate_technique_response(req: TechniqueResponseRequest):
-    """Evaluate a technique practice response."""
-    try:
-        result = evaluate_technique(
-            req.technique_name,
-            req.instruction,
-            req.response,
-            req.other_person_statement,
-            req.task_title
-        )
-        
-        # Convert technique quality to grade (backend-controlled)
-        technique_quality = result.get("technique_quality", "minimal").lower()
-        grade_map = {
-            "excellent": 5,
-            "good": 4,
-            "acceptable": 3,
-            "weak": 2,
-            "minimal": 1
-        }
-        grade = grade_map.get(technique_quality, 1)
-        
-        # Build feedback text
-        feedback_parts = []
-        coach_message = result.get("coach_message", "")
-        analysis = result.get("analysis", "")
-        example = result.get("example", "")
-        
-        if coach_message:
-            feedback_parts.append(f"Coach: {coach_message}")
-        if analysis:
-            feedback_parts.append(f"Analysis: {analysis}")
-        if example:
-            feedback_parts.append(f"Example: {example}")
-        
-        feedback_text = "\n\n".join(feedback_parts) if feedback_parts else "Technique evaluation complete."
-        
-        return {
-            "technique_quality": technique_quality,
-            "grade": grade,
-            "feedback": feedback_text,
-            "coach_message": coach_message,
-            "analysis": analysis,
-            "example": example,
-            "task_title": req.task_title
-        }
-    except Exception as e:
-        print(f"[evaluate-technique] Error: {e}")
-        return {"error": str(e)}
+async def evaluate_technique_response(req: TechniqueResponseRequest):
+    """Evaluate a technique practice response (alias of /evaluate)."""
+    return await _evaluate_request("technique", req, "evaluate-technique")
+
+
+# Batch evaluation (e.g. re-grading a cohort after a rubric change)
+EVALUATE_BATCH_MAX_ITEMS = int(os.getenv("EVALUATE_BATCH_MAX_ITEMS", "20000"))
+EVALUATE_BATCH_CONCURRENCY = int(os.getenv("EVALUATE_BATCH_CONCURRENCY", "16"))
+EVALUATE_BATCH_MAX_CONCURRENCY = int(os.getenv("EVALUATE_BATCH_MAX_CONCURRENCY", "64"))
+
 
+class BatchEvaluationItem(EvaluationRequest):
+    id: Optional[str] = None  # caller's reference, echoed back with the result
 
-@app.post("/save-task-grade/{session_id}/{task_id}")
-def save_task_grade(session_id: str, task_id: int, grade: int = 0, feedback: str = ""):
-    """Save the grade and feedback for a completed task."""
+
+class BatchEvaluationRequest(BaseModel):
+    items: list[BatchEvaluationItem]
+    concurrency: int = EVALUATE_BATCH_CONCURRENCY
+
+
+@app.post("/evaluate/batch")
+async def evaluate_batch(req: BatchEvaluationRequest, request: Request):
+    """
+    Grade many responses across task types, streamed back as SSE "result" events
+    ({"index", "id", "result"}) in completion order, then one "done" event.
+    Identical items are graded once; at most `concurrency` LLM calls run at a time.
+    """
+    if not req.items or len(req.items) > EVALUATE_BATCH_MAX_ITEMS:
+        return {"error": f"items must contain between 1 and {EVALUATE_BATCH_MAX_ITEMS} responses"}
+    unknown = sorted({item.task_type for item in req.items} - RUBRICS.keys())
+    if unknown:
+        return {"error": f"Unknown task_type: {', '.join(unknown)}"}
+    concurrency = max(1, min(req.concurrency, EVALUATE_BATCH_MAX_CONCURRENCY))
+
+    # Unique evaluations in first-seen order, each with the indices of the items it grades
+    indices_by_key = {}
+    for index, item in enumerate(req.items):
+        indices_by_key.setdefault(evaluation_key(item.task_type, item.model_dump()), []).append(index)
+    pending = asyncio.Queue()
+    for indices in indices_by_key.values():
+        pending.put_nowait(indices)
+    finished = asyncio.Queue()
+
+    async def worker():
+        while not pending.empty():
+            indices = pending.get_nowait()
+            item = req.items[indices[0]]
+            try:
+                # Cohort re-grades yield to learners' interactive calls
+                with llm_priority(BACKGROUND):
+                    result = await evaluate(item.task_type, item.model_dump())
+            except Exception as e:
+                logger.error("[evaluate-batch] Error grading item %s: %s", indices[0], e)
+                result = {"error": str(e)}
+            await finished.put((indices, result))
+
+    async def events():
+        started = time.perf_counter()
+        workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(indices_by_key)))]
+        errors = 0
+        try:
+            for _ in range(len(indices_by_key)):
+                indices, result = await finished.get()
+                if "error" in result:
+                    errors += len(indices)
+                for index in indices:
+                    yield _sse_event("result", {"index": index, "id": req.items[index].id, "result": result})
+                if await request.is_disconnected():
+                    return
+            yield _sse_event("done", {
+                "items": len(req.items),
+                "evaluated": len(indices_by_key),
+                "errors": errors,
+                "seconds": round(time.perf_counter() - started, 3),
+            })
+        finally:
+            for task in workers:
+                task.cancel()
+
+    logger.info("[evaluate-batch] %s items, %s unique, concurrency %s", len(req.items), len(indices_by_key), concurrency)
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+class TaskSurveyRequest(BaseModel):
+    difficulty: Optional[int] = None  # 1–5
+    confidence: Optional[int] = None  # 1–5
+    comment: str = ""
+
+
+@app.post("/task-survey/{session_id}/{task_id}")
+def task_survey(session_id: str, task_id: int, req: TaskSurveyRequest):
+    """Store the feedback page's survey as a reflection on a task; its grade and status are untouched."""
     db = SessionLocal()
     try:
         task = (
@@ -489,18 +701,21 @@ def save_task_grade(session_id: str, task_id: int, grade: int = 0, feedback: str
             .filter(TimelineItem.session_id == session_id, TimelineItem.id == task_id)
             .first()
         )
-        if task:
-            task.grade = max(0, min(5, grade))  # Clamp grade to 0-5
-            if feedback:
-                task.feedback = feedback
-            db.commit()
-            print(f"[save-task-grade] Saved grade {grade} and feedback for task {task_id}")
-            return {"success": True, "grade": task.grade}
-        else:
+        if not task:
             return {"success": False, "error": "Task not found"}
+        db.add(Reflection(
+            session_id=session_id,
+            task_title=task.title,
+            difficulty=req.difficulty,
+            confidence=req.confidence,
+            comment=req.comment,
+        ))
+        db.commit()
+        logger.info("[task-survey] Saved survey for task %s", task_id)
+        return {"success": True}
     except Exception as e:
         db.rollback()
-        print(f"[save-task-grade] Error: {e}")
+        logger.error("[task-survey] Error: %s", e)
         return {"success": False, "error": str(e)}
     finally:
         db.close()
@@ -508,59 +723,143 @@ def save_task_grade(session_id: str, task_id: int, grade: int = 0, feedback: str
 
 # Session 
 
+def _timeline_rows(session_id: str) -> list:
+    """Initial timeline rows for a new session, one per entry in TASKS."""
+    rows = []
+    for i, task in enumerate(TASKS):
+        status = "in_progress" if i == 0 else "planned"
+
+        # Use task definitions directly 
+        rows.append({
+            "session_id": session_id,
+            "title": task["title"],
+            "coach_summary": task.get("coach_summary", ""),
+            "status": status,
+            "difficulty": task.get("difficulty", "●●"),
+            "skill_focus": task.get("skill_focus", "Negotiation Skills"),
+            "estimated_time": task.get("estimated_time", "~10 min"),
+            "task_type": task.get("type", "simulation"),
+        })
+    return rows
+
+
+def _insert_sessions(db, session_ids: list) -> None:
+    """Insert sessions and their timelines with one executemany per table (caller commits)."""
+    db.execute(insert(UserSession), [{"id": session_id} for session_id in session_ids])
+    db.execute(
+        insert(TimelineItem),
+        [row for session_id in session_ids for row in _timeline_rows(session_id)],
+    )
+
+
 @app.post("/session")
 def create_session():
     db = SessionLocal()
     session_id = str(uuid.uuid4())
 
-    session = UserSession(id=session_id)
-    db.add(session)
+    try:
+        _insert_sessions(db, [session_id])
+        db.commit()
+    finally:
+        db.close()
 
-    for i, task in enumerate(TASKS):
-        status = "in_progress" if i == 0 else "planned"
+    return {"session_id": session_id}
 
-        # Use task definitions directly 
-        difficulty = task.get("difficulty", "●●")
-        skill_focus = task.get("skill_focus", "Negotiation Skills")
-        estimated_time = task.get("estimated_time", "~10 min")
-        coach_summary = task.get("coach_summary", "")
-        task_type = task.get("type", "simulation")
-
-        db.add(
-            TimelineItem(
-                session_id=session_id,
-                title=task["title"],
-                coach_summary=coach_summary,
-                status=status,
-                difficulty=difficulty,
-                skill_focus=skill_focus,
-                estimated_time=estimated_time,
-                task_type=task_type,
-            )
-        )
 
-    db.commit()
-    db.close()
+MAX_BULK_SESSIONS = 5000
+
+
+class BulkSessionRequest(BaseModel):
+    count: int
 
-    return {"session_id": session_id}
+
+@app.post("/sessions/bulk")
+def create_sessions_bulk(req: BulkSessionRequest):
+    """Provision many sessions (e.g. a whole cohort) in a single transaction."""
+    if req.count < 1 or req.count > MAX_BULK_SESSIONS:
+        return {"error": f"count must be between 1 and {MAX_BULK_SESSIONS}"}
+
+    db = SessionLocal()
+    session_ids = [str(uuid.uuid4()) for _ in range(req.count)]
+    try:
+        _insert_sessions(db, session_ids)
+        db.commit()
+        logger.info("[sessions-bulk] Created %s sessions", len(session_ids))
+        return {"session_ids": session_ids}
+    except Exception as e:
+        db.rollback()
+        logger.error("[sessions-bulk] Error: %s", e)
+        return {"error": str(e)}
+    finally:
+        db.close()
+
+
+def _log_timeline_state(db, session_id: str, label: str, *args) -> None:
+    """Debug dump of a session's task statuses; skips the query unless DEBUG is enabled."""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    items = (
+        db.query(TimelineItem)
+        .filter(TimelineItem.session_id == session_id)
+        .order_by(TimelineItem.id)
+        .all()
+    )
+    logger.debug(label + ":", *args)
+    for t in items:
+        logger.debug("  Task %s: %-30s | Status: %s", t.id, t.title[:30], t.status)
 
 
 @app.post("/complete-task/{session_id}/{task_id}")
-def complete_task(session_id: str, task_id: int):
-    """Mark a task as completed and start the next one."""
+def complete_task(session_id: str, task_id: int, wait: bool = True):
+    """Mark a task as completed and start the next one. With wait=false, returns a job (202)."""
+    if not wait:
+        return _job_accepted(job_queue.enqueue(
+            "complete_task", {"session_id": session_id, "task_id": task_id}, dedupe_key=f"complete_task:{session_id}:{task_id}"
+        ))
+    return _complete_task(session_id, task_id)
+
+
+def _mark_completed(db, session_id: str, current_task):
+    """Mark current_task completed and start the first planned task (caller commits). Returns the next task."""
+    if current_task:
+        old_grade = counted_grade(current_task)
+        # Only mark as completed if user actually started it
+        if current_task.has_started == 1:
+            current_task.status = "completed"
+            logger.info("[complete_task] Marked task %s ('%s') as completed (was started)", current_task.id, current_task.title)
+        else:
+            # If somehow we're completing a task that was never started, this is an error case
+            # But mark it as completed anyway since they're finishing it now
+            current_task.status = "completed"
+            current_task.has_started = 1
+            logger.info("[complete_task] Task %s was never marked as started, but completing it now", current_task.id)
+        record_grade(db, current_task, old_grade)
+    return _start_next_task(db, session_id)
+
+
+def _start_next_task(db, session_id: str):
+    """Mark the first planned task in_progress (caller commits). Returns it, or None."""
+    # Find the first PLANNED task (first unstarted task)
+    # Query fresh to get updated status
+    next_task = (
+        db.query(TimelineItem)
+        .filter(TimelineItem.session_id == session_id, TimelineItem.status == "planned")
+        .order_by(TimelineItem.id)
+        .first()
+    )
+    
+    if next_task:
+        next_task.status = "in_progress"
+        logger.info("[complete_task] Marked next task %s ('%s') as in_progress", next_task.id, next_task.title)
+    return next_task
+
+
+@job_handler("complete_task", priority=INTERACTIVE)
+def _complete_task(session_id: str, task_id: int) -> dict:
     db = SessionLocal()
     
     try:
-        # Log state BEFORE
-        all_before = (
-            db.query(TimelineItem)
-            .filter(TimelineItem.session_id == session_id)
-            .order_by(TimelineItem.id)
-            .all()
-        )
-        print(f"\n[complete_task] STATE BEFORE completing task {task_id}:")
-        for t in all_before:
-            print(f"  Task {t.id}: {t.title[:30]:30} | Status: {t.status}")
+        _log_timeline_state(db, session_id, "[complete_task] STATE BEFORE completing task %s", task_id)
         
         # Mark current task as completed only if it was started
         current_task = (
@@ -568,44 +867,12 @@ def complete_task(session_id: str, task_id: int):
             .filter(TimelineItem.session_id == session_id, TimelineItem.id == task_id)
             .first()
         )
-        if current_task:
-            # Only mark as completed if user actually started it
-            if current_task.has_started == 1:
-                current_task.status = "completed"
-                print(f"[complete_task] Marked task {task_id} ('{current_task.title}') as completed (was started)")
-            else:
-                # If somehow we're completing a task that was never started, this is an error case
-                # But mark it as completed anyway since they're finishing it now
-                current_task.status = "completed"
-                current_task.has_started = 1
-                print(f"[complete_task] Task {task_id} was never marked as started, but completing it now")
-        
-        # Find the first PLANNED task (first unstarted task)
-        # Query fresh to get updated status
-        next_task = (
-            db.query(TimelineItem)
-            .filter(TimelineItem.session_id == session_id, TimelineItem.status == "planned")
-            .order_by(TimelineItem.id)
-            .first()
-        )
-        
-        if next_task:
-            next_task.status = "in_progress"
-            print(f"[complete_task] Marked next task {next_task.id} ('{next_task.title}') as in_progress")
-        
+        next_task = _mark_completed(db, session_id, current_task)
         db.commit()
-        print(f"[complete_task] Database committed successfully")
+        logger.debug("[complete_task] Database committed successfully")
         
-        # Log state AFTER
-        all_after = (
-            db.query(TimelineItem)
-            .filter(TimelineItem.session_id == session_id)
-            .order_by(TimelineItem.id)
-            .all()
-        )
-        print(f"[complete_task] STATE AFTER completing task {task_id}:")
-        for t in all_after:
-            print(f"  Task {t.id}: {t.title[:30]:30} | Status: {t.status}")
+        _log_timeline_state(db, session_id, "[complete_task] STATE AFTER completing task %s", task_id)
+        prefetch_task(session_id, next_task)
         
         return {
             "success": True,
@@ -614,7 +881,7 @@ def complete_task(session_id: str, task_id: int):
         }
     except Exception as e:
         db.rollback()
-        print(f"[complete_task] Error: {e}")
+        logger.error("[complete_task] Error: %s", e)
         return {"success": False, "error": str(e)}
     finally:
         db.close()
@@ -639,12 +906,14 @@ def start_task(session_id: str, task_id: int):
         # Mark that user has started/engaged with this task
         task.has_started = 1
         db.commit()
-        print(f"[start_task] Marked task {task_id} ('{task.title}') as has_started=1")
+        logger.info("[start_task] Marked task %s ('%s') as has_started=1", task_id, task.title)
+        # Prepare what the learner is likely to open next while they work on this one
+        prefetch_likely_next(db, session_id, task)
         
         return {"success": True, "message": f"Task '{task.title}' started"}
     except Exception as e:
         db.rollback()
-        print(f"[start_task] Error: {e}")
+        logger.error("[start_task] Error: %s", e)
         return {"success": False, "error": str(e)}
     finally:
         db.close()
@@ -684,7 +953,7 @@ def regenerate_metadata(session_id: str = None):
         updated = []
         for item in items:
             try:
-                print(f"[regenerate] Processing item {item.id}: {item.title}")
+                logger.debug("[regenerate] Processing item %s: %s", item.id, item.title)
                 metadata = analyze_task(item.title, "")
                 item.difficulty = metadata.get("difficulty", item.difficulty or "●●")
                 item.estimated_time = metadata.get("estimated_time", item.estimated_time or "15 mins")
@@ -695,14 +964,14 @@ def regenerate_metadata(session_id: str = None):
                     desc = generate_task_description(item.title, item.difficulty)
                     if desc and desc.strip():
                         item.coach_summary = desc.strip()
-                        print(f"[regenerate] New coach_summary for {item.id}: {item.coach_summary}")
+                        logger.debug("[regenerate] New coach_summary for %s: %s", item.id, item.coach_summary)
                 except Exception as e:
-                    print(f"[regenerate] generate_task_description failed for '{item.title}': {e}")
+                    logger.error("[regenerate] generate_task_description failed for '%s': %s", item.title, e)
 
                 db.commit()
                 updated.append(item.id)
             except Exception as e:
-                print(f"[regenerate] Failed for {item.title}: {e}")
+                logger.error("[regenerate] Failed for %s: %s", item.title, e)
                 db.rollback()
 
         return {"updated": len(updated), "ids": updated}
@@ -715,35 +984,147 @@ class MessageRequest(BaseModel):
     session_id: str
     task_title: str
     text: str
+    coach_mode: str = "inline"  # inline | deferred (see orchestrator.COACH_MODES)
 
 
 @app.post("/message")
-def message(req: MessageRequest):
-    return handle_turn(req.session_id, req.task_title, req.text)
+async def message(req: MessageRequest):
+    coach_mode = req.coach_mode if req.coach_mode in COACH_MODES else "inline"
+    return await handle_turn(req.session_id, req.task_title, req.text, coach_mode)
+
+
+def _sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/message/stream")
+async def message_stream(req: MessageRequest):
+    """Streaming /message: manager tokens as SSE "token" events, then "coach" and "done"."""
+    async def events():
+        async for event, data in stream_turn(req.session_id, req.task_title, req.text):
+            yield _sse_event(event, data)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/coach-tips/{session_id}/{task_title}")
+def get_coach_tips(session_id: str, task_title: str):
+    """Latest coach tips for a task; used to pick up tips delivered with coach_mode=deferred."""
+    return latest_coach_tips(session_id, task_title)
 
 
 
 # Fetch all messages for a session and task
+def _message_etag(db, session_id: str, task_title: str, since_id: Optional[int] = None, limit: Optional[int] = None) -> str:
+    """
+    Version tag for a page of a task conversation: message count and highest id, plus
+    the since_id/limit of the request so different pages never share a tag.
+    Answered from the (session_id, task_title, ...) index without loading any message rows;
+    the count changes on deletes (reset), the max id on inserts.
+    """
+    count, max_id = (
+        db.query(func.count(Message.id), func.max(Message.id))
+        .filter(Message.session_id == session_id, Message.task_title == task_title)
+        .one()
+    )
+    page = "" if since_id is None and limit is None else f"-{since_id or 0}-{limit or 0}"
+    return f'W/"{count}-{max_id or 0}{page}"'
+
+
+def _messages_after(db, session_id: str, task_title: str, since_id: int, limit: Optional[int] = None) -> list:
+    """Messages with id greater than since_id, oldest first."""
+    query = (
+        db.query(Message)
+        .filter(
+            Message.session_id == session_id,
+            Message.task_title == task_title,
+            Message.id > since_id,
+        )
+        .order_by(Message.id.asc())
+    )
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
+MAX_MESSAGES_PAGE = 500
+
+
 @app.get("/messages/{session_id}/{task_title}")
-def get_messages(session_id: str, task_title: str):
-    """Fetch all messages for a session and a specific task, excluding private coach tips."""
+def get_messages(
+    session_id: str,
+    task_title: str,
+    request: Request,
+    response: Response,
+    since_id: Optional[int] = Query(None, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_MESSAGES_PAGE),
+):
+    """
+    Fetch messages for a session and a specific task.
+    With since_id only messages newer than that id are returned (use the last id seen as the
+    next cursor; limit pages through a long backlog). Responses carry an ETag, and a poll
+    sending a matching If-None-Match gets 304 Not Modified without any message rows being read.
+    """
     db = SessionLocal()
-    messages = (
-        db.query(Message)
-        .filter(Message.session_id == session_id, Message.task_title == task_title)
-        .order_by(Message.timestamp.asc())
-        .all()
+    try:
+        etag = _message_etag(db, session_id, task_title, since_id, limit)
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        if since_id is None and limit is None:
+            messages = (
+                db.query(Message)
+                .filter(Message.session_id == session_id, Message.task_title == task_title)
+                .order_by(Message.timestamp.asc())
+                .all()
+            )
+        else:
+            messages = _messages_after(db, session_id, task_title, since_id or 0, limit)
+        response.headers.update(headers)
+        return [format_message(msg) for msg in messages]
+    finally:
+        db.close()
+
+
+# Seconds between database re-checks (and keep-alive comments) on the message stream
+MESSAGE_STREAM_HEARTBEAT_SECONDS = 15
+
+
+@app.get("/messages/{session_id}/{task_title}/stream")
+async def stream_messages(session_id: str, task_title: str, request: Request, since_id: int = Query(0, ge=0)):
+    """
+    Push new messages as SSE "messages" events instead of being polled.
+    Starts after since_id (0 = full history) and wakes on every commit that adds
+    messages to this task; a comment line is sent as a keep-alive while idle.
+    """
+    async def events():
+        cursor = since_id
+        with subscribe(session_id, task_title) as changed:
+            while not await request.is_disconnected():
+                changed.clear()
+                db = SessionLocal()
+                try:
+                    messages = _messages_after(db, session_id, task_title, cursor, MAX_MESSAGES_PAGE)
+                    payload = [format_message(msg) for msg in messages]
+                finally:
+                    db.close()
+                if payload:
+                    cursor = payload[-1]["id"]
+                    yield _sse_event("messages", {"messages": payload, "cursor": cursor})
+                    continue
+                if not await wait_for_change(changed, MESSAGE_STREAM_HEARTBEAT_SECONDS):
+                    yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
-    db.close()
-    return [
-        {
-            "id": msg.id,
-            "sender": msg.sender,
-            "text": msg.text,
-            "timestamp": msg.timestamp.isoformat(),
-        }
-        for msg in messages
-    ]
 
 
 # Clear conversation messages for a task (when user clicks "Try Again")
@@ -758,9 +1139,11 @@ def reset_task_conversation(session_id: str, task_title: str):
         Message.task_title == task_title,
         Message.sender.in_(["user", "manager"])  # Keep system/scenario message
     ).delete()
+    delete_summary(db, session_id, task_title)
     
     db.commit()
     db.close()
+    forget_summary(session_id, task_title)
     
     return {"success": True, "message": "Conversation cleared, ready for new attempt"}
 
@@ -775,13 +1158,21 @@ class ReflectionRequest(BaseModel):
 
 
 @app.post("/reflect")
-def reflect(req: ReflectionRequest):
+def reflect(req: ReflectionRequest, wait: bool = True):
+    """Store a reflection and move on to the next task. With wait=false, returns a job (202)."""
+    if not wait:
+        return _job_accepted(job_queue.enqueue("reflect", req.model_dump(), dedupe_key=f"reflect:{req.session_id}"))
+    return _reflect(**req.model_dump())
+
+
+@job_handler("reflect", priority=INTERACTIVE)
+def _reflect(session_id: str, difficulty: int, confidence: int, comment: str) -> dict:
     db = SessionLocal()
 
     current_task = (
         db.query(TimelineItem)
         .filter(
-            TimelineItem.session_id == req.session_id,
+            TimelineItem.session_id == session_id,
             TimelineItem.status == "in_progress",
         )
         .first()
@@ -792,26 +1183,28 @@ def reflect(req: ReflectionRequest):
         return {"error": "No active task"}
 
     reflection = Reflection(
-        session_id=req.session_id,
+        session_id=session_id,
         task_title=current_task.title,
-        difficulty=req.difficulty,
-        confidence=req.confidence,
-        comment=req.comment,
+        difficulty=difficulty,
+        confidence=confidence,
+        comment=comment,
     )
     db.add(reflection)
 
     # Only mark as completed if user actually started it
     if current_task.has_started == 1:
+        old_grade = counted_grade(current_task)
         current_task.status = "completed"
-        print(f"[reflect] Marking task '{current_task.title}' as completed")
+        record_grade(db, current_task, old_grade)
+        logger.info("[reflect] Marking task '%s' as completed", current_task.title)
     else:
         # Task was never started, don't mark as complete
-        print(f"[reflect] Task '{current_task.title}' was never started, not marking as completed")
+        logger.info("[reflect] Task '%s' was never started, not marking as completed", current_task.title)
 
     next_task = (
         db.query(TimelineItem)
         .filter(
-            TimelineItem.session_id == req.session_id,
+            TimelineItem.session_id == session_id,
             TimelineItem.status == "planned",
         )
         .first()
@@ -820,13 +1213,16 @@ def reflect(req: ReflectionRequest):
     if next_task:
         next_task.status = "in_progress"
 
-    db.commit()
-    db.close()
-
-    return {
+    # Read the titles before commit expires the instances
+    result = {
         "completed_task": current_task.title,
         "next_task": next_task.title if next_task else None,
     }
+    db.commit()
+    prefetch_task(session_id, next_task)
+    db.close()
+
+    return result
 
 
 # Task Generation 
@@ -842,15 +1238,26 @@ def get_task_description(task_title: str, difficulty: str = "●●"):
 
 
 @app.get("/task-insights/{task_title}")
-def get_task_insights(task_title: str, task_description: str = ""):
-    """Generate insights about why this task is important."""
+def get_task_insights(task_title: str, task_description: str = "", wait: bool = True):
+    """Generate insights about why this task is important. With wait=false, returns a job (202)."""
+    if not wait:
+        return _job_accepted(job_queue.enqueue(
+            "task_insights",
+            {"task_title": task_title, "task_description": task_description},
+            dedupe_key=f"task_insights:{task_title}:{task_description}",
+        ))
+    return _task_insights(task_title, task_description)
+
+
+@job_handler("task_insights")
+def _task_insights(task_title: str, task_description: str = "") -> dict:
     try:
         insights = generate_task_insights(task_title, task_description)
         if not insights or not insights.strip():
             raise ValueError("Empty insights from LLM")
         return {"insights": insights}
     except Exception as e:
-        print(f"[task-insights] Error generating insights for '{task_title}': {e}")
+        logger.error("[task-insights] Error generating insights for '%s': %s", task_title, e)
         # Attempt to return the coach_summary from TASKS if available
         for t in TASKS:
             if t.get("title") == task_title:
@@ -875,7 +1282,7 @@ def get_program_length(session_id: str):
         days = int(res.get("days", max(1, len(titles))))
         rationale = res.get("rationale", "")
     except Exception as e:
-        print(f"[program-length] LLM failed: {e}")
+        logger.error("[program-length] LLM failed: %s", e)
         days = max(1, len(titles))
         rationale = ""
 
@@ -925,18 +1332,9 @@ def select_task(session_id: str, task_id: int):
     """Select a specific task to work on."""
     db = SessionLocal()
     try:
-        print(f"\n[select-task] Session: {session_id}, Task ID: {task_id}")
+        logger.debug("[select-task] Session: %s, Task ID: %s", session_id, task_id)
         
-        # Log state BEFORE
-        all_before = (
-            db.query(TimelineItem)
-            .filter(TimelineItem.session_id == session_id)
-            .order_by(TimelineItem.id)
-            .all()
-        )
-        print(f"[select-task] STATE BEFORE:")
-        for t in all_before:
-            print(f"  Task {t.id}: {t.title[:30]:30} | Status: {t.status}")
+        _log_timeline_state(db, session_id, "[select-task] STATE BEFORE")
         
         # Get current in_progress task
         current_task = (
@@ -951,7 +1349,7 @@ def select_task(session_id: str, task_id: int):
         # Mark current as planned (if exists)
         if current_task:
             current_task.status = "planned"
-            print(f"[select-task] Marked task '{current_task.title}' as planned")
+            logger.info("[select-task] Marked task '%s' as planned", current_task.title)
         
         # Mark selected task as in_progress
         new_task = (
@@ -967,20 +1365,16 @@ def select_task(session_id: str, task_id: int):
             db.close()
             return {"error": "Task not found"}
         
+        # Reopening a completed task takes its grade out of the statistics
+        old_grade = counted_grade(new_task)
         new_task.status = "in_progress"
+        record_grade(db, new_task, old_grade)
         db.commit()
-        print(f"[select-task] Set task '{new_task.title}' to in_progress")
+        logger.info("[select-task] Set task '%s' to in_progress", new_task.title)
         
-        # Log state AFTER
-        all_after = (
-            db.query(TimelineItem)
-            .filter(TimelineItem.session_id == session_id)
-            .order_by(TimelineItem.id)
-            .all()
-        )
-        print(f"[select-task] STATE AFTER:")
-        for t in all_after:
-            print(f"  Task {t.id}: {t.title[:30]:30} | Status: {t.status}")
+        _log_timeline_state(db, session_id, "[select-task] STATE AFTER")
+        prefetch_task(session_id, new_task)
+        prefetch_likely_next(db, session_id, new_task)
         
         return {
             "success": True,
@@ -989,7 +1383,7 @@ def select_task(session_id: str, task_id: int):
         }
     except Exception as e:
         db.rollback()
-        print(f"[select-task] ERROR: {e}")
+        logger.error("[select-task] ERROR: %s", e)
         return {"error": str(e)}
     finally:
         db.close()
@@ -999,7 +1393,7 @@ def choose_another_task(req: MessageRequest):
     """Choose another task with similar difficulty."""
     db = SessionLocal()
     try:
-        print(f"[choose-another] Session ID: {req.session_id}")
+        logger.debug("[choose-another] Session ID: %s", req.session_id)
         
         # Get current task
         current_task = (
@@ -1012,10 +1406,10 @@ def choose_another_task(req: MessageRequest):
         )
         
         if not current_task:
-            print("[choose-another] No current task found")
+            logger.warning("[choose-another] No current task found")
             return {"error": "No active task"}
         
-        print(f"[choose-another] Current task: {current_task.title} (ID: {current_task.id}, difficulty: {current_task.difficulty})")
+        logger.debug("[choose-another] Current task: %s (ID: %s, difficulty: %s)", current_task.title, current_task.id, current_task.difficulty)
         
         current_difficulty = current_task.difficulty
         current_task_id = current_task.id
@@ -1027,7 +1421,7 @@ def choose_another_task(req: MessageRequest):
             .all()
         )
         
-        print(f"[choose-another] Found {len(all_tasks)} total tasks")
+        logger.debug("[choose-another] Found %s total tasks", len(all_tasks))
         
         # Convert to dicts for the choose function
         tasks_list = [
@@ -1042,18 +1436,20 @@ def choose_another_task(req: MessageRequest):
         ]
         
         # Choose a similar difficulty task (exclude current)
-        print(f"[choose-another] Calling choose_similar_task with ID {current_task_id}, difficulty {current_difficulty}")
+        logger.debug("[choose-another] Calling choose_similar_task with ID %s, difficulty %s", current_task_id, current_difficulty)
         chosen = choose_similar_task(current_task_id, current_difficulty, tasks_list)
-        print(f"[choose-another] Chosen task: {chosen['title']} (ID: {chosen['id']})")
+        logger.info("[choose-another] Chosen task: %s (ID: %s)", chosen['title'], chosen['id'])
         
         # Update statuses
         # Only mark as completed if user actually started/engaged with it
+        old_grade = counted_grade(current_task)
         if current_task.has_started == 1:
             current_task.status = "completed"
-            print(f"[choose-another] User started this task, marking as 'completed'")
+            logger.debug("[choose-another] User started this task, marking as 'completed'")
         else:
             current_task.status = "planned"
-            print(f"[choose-another] User never started this task, keeping as 'planned' (not counting as done)")
+            logger.debug("[choose-another] User never started this task, keeping as 'planned' (not counting as done)")
+        record_grade(db, current_task, old_grade)
         
         new_task = (
             db.query(TimelineItem)
@@ -1063,29 +1459,21 @@ def choose_another_task(req: MessageRequest):
         
         if new_task:
             new_task.status = "in_progress"
-            print(f"[choose-another] Set new task to 'in_progress'")
+            logger.debug("[choose-another] Set new task to 'in_progress'")
         
         db.commit()
-        print(f"[choose-another] Database committed")
+        logger.debug("[choose-another] Database committed")
         
-        # Log the state after update
-        updated_tasks = (
-            db.query(TimelineItem)
-            .filter(TimelineItem.session_id == req.session_id)
-            .all()
-        )
-        print(f"[choose-another] STATE AFTER UPDATE:")
-        for t in sorted(updated_tasks, key=lambda x: x.id):
-            print(f"  Task {t.id}: {t.title[:30]:30} | Status: {t.status}")
+        _log_timeline_state(db, req.session_id, "[choose-another] STATE AFTER UPDATE")
+        prefetch_task(req.session_id, new_task)
+        prefetch_likely_next(db, req.session_id, new_task)
         
         return {
             "old_task": current_task.title,
             "new_task": new_task.title if new_task else None,
         }
     except Exception as e:
-        import traceback
-        print(f"[choose-another] ERROR: {e}")
-        print(traceback.format_exc())
+        logger.exception("[choose-another] ERROR: %s", e)
         db.rollback()
         return {"error": str(e)}
     finally:
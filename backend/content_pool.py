@@ -0,0 +1,179 @@
+"""
+Shared pool of pre-generated task content.
+Non-simulation tasks are fixed (see tasks.TASKS), so content for a task only depends on
+the learner's performance band. The pool keeps a few variants per (task title, band) so a
+new session can draw content instantly instead of waiting on the LLM, and refills itself
+in the background when it runs low.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Optional
+
+from database import SessionLocal
+from models import TaskContentPool
+from tasks import TASKS
+from llm.performance_analyzer import difficulty_context_for_band
+from llm.prompt_generator import generate_task_content_async
+from llm.client import llm_priority, BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+TASK_CONTENT_POOL_SIZE = int(os.getenv("TASK_CONTENT_POOL_SIZE", "2"))  # 0 disables the pool
+TASK_CONTENT_POOL_LOW_WATER = int(os.getenv("TASK_CONTENT_POOL_LOW_WATER", "1"))
+
+# Bands pre-built at startup; other bands are filled on demand the first time they are drawn
+STARTUP_BANDS = ("new", "same", "harder")
+
+# (task_title, band) pairs with a refill in flight
+_refilling = set()
+# Strong references to background refill tasks
+_background_tasks = set()
+# Event loop refills run on (the app's, set by build_pool)
+_loop = None
+
+
+def _pooled_tasks() -> list:
+    return [t for t in TASKS if t.get("type", "simulation") != "simulation"]
+
+
+def _task_definition(task_title: str) -> Optional[dict]:
+    for task in _pooled_tasks():
+        if task["title"] == task_title:
+            return task
+    return None
+
+
+def pool_size(db, task_title: str, band: str) -> int:
+    return (
+        db.query(TaskContentPool)
+        .filter(TaskContentPool.task_title == task_title, TaskContentPool.band == band)
+        .count()
+    )
+
+
+def draw_pooled_content(db, task_title: str, band: str) -> Optional[str]:
+    """
+    Take one pooled variant for a task and band, removing it from the pool.
+    The removal is flushed but not committed, so it commits with the caller's
+    TimelineItem update. Returns the JSON content string, or None when the pool is empty.
+    """
+    if TASK_CONTENT_POOL_SIZE <= 0 or _task_definition(task_title) is None:
+        return None
+
+    candidates = (
+        db.query(TaskContentPool)
+        .filter(TaskContentPool.task_title == task_title, TaskContentPool.band == band)
+        .order_by(TaskContentPool.id)
+        .limit(max(3, TASK_CONTENT_POOL_LOW_WATER + 1))
+        .all()
+    )
+    content = None
+    for row in candidates:
+        # Another request may have drawn the same row; only use it if we deleted it
+        deleted = (
+            db.query(TaskContentPool)
+            .filter(TaskContentPool.id == row.id)
+            .delete(synchronize_session=False)
+        )
+        if deleted:
+            content = row.task_content
+            break
+    db.flush()
+
+    if len(candidates) - (1 if content else 0) < TASK_CONTENT_POOL_LOW_WATER:
+        schedule_refill(task_title, band)
+    return content
+
+
+def _missing_variants(task_title: str, band: str) -> int:
+    db = SessionLocal()
+    try:
+        return TASK_CONTENT_POOL_SIZE - pool_size(db, task_title, band)
+    finally:
+        db.close()
+
+
+def _add_variant(task_title: str, band: str, task_content: str) -> None:
+    db = SessionLocal()
+    try:
+        db.add(TaskContentPool(task_title=task_title, band=band, task_content=task_content))
+        db.commit()
+    finally:
+        db.close()
+
+
+async def refill_pool(task_title: str, band: str) -> int:
+    """
+    Generate variants until the pool for (task_title, band) is full. Returns how many were added.
+    Database work runs in worker threads with short-lived sessions; none is open during generation.
+    """
+    task = _task_definition(task_title)
+    if task is None:
+        return 0
+
+    added = 0
+    missing = await asyncio.to_thread(_missing_variants, task_title, band)
+    performance_context = difficulty_context_for_band(band)
+    for _ in range(max(0, missing)):
+        content = await generate_task_content_async(
+            task.get("type"),
+            task["title"],
+            task.get("coach_summary", ""),
+            performance_context,
+            use_fallback=False,
+        )
+        if not content:
+            logger.warning("[content_pool] Generation failed for '%s' (%s), stopping refill", task_title, band)
+            break
+        await asyncio.to_thread(_add_variant, task_title, band, json.dumps(content))
+        added += 1
+    if added:
+        logger.info("[content_pool] Added %s variant(s) for '%s' (%s)", added, task_title, band)
+    return added
+
+
+async def _refill_once(task_title: str, band: str) -> None:
+    key = (task_title, band)
+    try:
+        with llm_priority(BACKGROUND):
+            await refill_pool(task_title, band)
+    except Exception as e:
+        logger.error("[content_pool] Refill failed for '%s' (%s): %s", task_title, band, e)
+    finally:
+        _refilling.discard(key)
+
+
+def schedule_refill(task_title: str, band: str) -> None:
+    """Start a background refill for (task_title, band) unless one is already running."""
+    key = (task_title, band)
+    if TASK_CONTENT_POOL_SIZE <= 0 or key in _refilling:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Worker thread (threaded DB work, sync endpoints): start it on the app's loop
+        if _loop is not None and not _loop.is_closed():
+            _loop.call_soon_threadsafe(schedule_refill, task_title, band)
+        return
+    _refilling.add(key)
+    task = loop.create_task(_refill_once(task_title, band))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def build_pool(bands: tuple = STARTUP_BANDS) -> None:
+    """Fill the pool for every non-simulation task and the given bands (run at startup)."""
+    global _loop
+    _loop = asyncio.get_running_loop()
+    if TASK_CONTENT_POOL_SIZE <= 0:
+        return
+    for task in _pooled_tasks():
+        for band in bands:
+            key = (task["title"], band)
+            if key in _refilling:
+                continue
+            _refilling.add(key)
+            await _refill_once(task["title"], band)
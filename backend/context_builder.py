@@ -0,0 +1,198 @@
+"""
+Token-budgeted conversation context for the manager and coach agents.
+Each agent gets a fixed budget: the scenario is always kept, recent turns are added newest
+first until the budget is used, and anything older is represented by a compact rolling
+summary, so prompt size stays flat as a conversation grows. That summary is the persisted
+LLM summary (see conversation_summary.py) followed by one short line per message it does
+not cover yet. Those lines are cached per (session_id, task_title) and only extended with
+the messages that left the history window since the previous turn.
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from models import Message
+from metrics import Histogram
+
+MANAGER_CONTEXT_TOKENS = int(os.getenv("MANAGER_CONTEXT_TOKENS", "1000"))
+COACH_CONTEXT_TOKENS = int(os.getenv("COACH_CONTEXT_TOKENS", "1500"))
+# Longest single message kept verbatim in the context
+CONTEXT_MAX_MESSAGE_TOKENS = int(os.getenv("CONTEXT_MAX_MESSAGE_TOKENS", "250"))
+# Length of one summary line, and how many lines a cached summary keeps
+SUMMARY_LINE_TOKENS = 30
+SUMMARY_MAX_LINES = 60
+SUMMARY_CACHE_ENTRIES = int(os.getenv("CONTEXT_SUMMARY_CACHE_ENTRIES", "1000"))
+
+SUMMARY_HEADER = "EARLIER TURNS (summarized):"
+
+CONTEXT_TOKENS = Histogram(
+    "context_tokens", "Estimated tokens of conversation context sent per agent call",
+    buckets=(64, 128, 256, 512, 1024, 2048, 4096),
+)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast local token estimate (about 4 characters per token for English text)."""
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to roughly max_tokens, marking the cut."""
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    return text[: max_chars - 1].rstrip() + "…"
+
+
+def _line(sender: str, text: str) -> str:
+    return f"{sender.upper()}: {truncate_to_tokens(text, CONTEXT_MAX_MESSAGE_TOKENS)}"
+
+
+def _summary_line(sender: str, text: str) -> str:
+    """One compact line per message: its first sentence, capped at SUMMARY_LINE_TOKENS."""
+    first_sentence = _SENTENCE_END.split(text.strip(), 1)[0]
+    return f"{sender.upper()}: {truncate_to_tokens(first_sentence, SUMMARY_LINE_TOKENS)}"
+
+
+def _opening_index(lines: list) -> int:
+    """Index of the first MANAGER line (the counterpart's initial position), else 0."""
+    return next((i for i, line in enumerate(lines) if line.startswith("MANAGER:")), 0)
+
+
+class _SummaryCache:
+    """LRU of (session_id, task_title) -> (last summarized message id, [(message id, summary line)])."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def forget(self, key) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+_summaries = _SummaryCache(SUMMARY_CACHE_ENTRIES)
+
+
+def forget_summary(session_id: str, task_title: str) -> None:
+    """Drop the cached summary for a task (call when its messages are deleted)."""
+    _summaries.forget((session_id, task_title))
+
+
+def rolling_summary(db, session_id: str, task_title: str, before_id: int, after_id: int = 0) -> list:
+    """
+    Summary lines for the user/manager messages of a task with after_id < id < before_id
+    (those no longer in the history window and not covered by the persisted summary).
+    Only messages not summarized on a previous turn are read from the database.
+    """
+    key = (session_id, task_title)
+    last_id, entries = _summaries.get(key) or (0, [])
+    if entries and entries[0][0] <= after_id:
+        entries = [entry for entry in entries if entry[0] > after_id]
+        _summaries.set(key, (last_id, entries))
+    if before_id - 1 > last_id:
+        rows = (
+            db.query(Message.id, Message.sender, Message.text)
+            .filter(
+                Message.session_id == session_id,
+                Message.task_title == task_title,
+                Message.id > max(last_id, after_id),
+                Message.id < before_id,
+                Message.sender.in_(("user", "manager")),
+            )
+            .order_by(Message.id.asc())
+            .all()
+        )
+        entries = entries + [(message_id, _summary_line(sender, text)) for message_id, sender, text in rows]
+        if len(entries) > SUMMARY_MAX_LINES:
+            opening = _opening_index([line for _, line in entries])
+            entries = entries[: opening + 1] + entries[-(SUMMARY_MAX_LINES - opening - 1):]
+        _summaries.set(key, (before_id - 1, entries))
+    return [line for _, line in entries]
+
+
+def build_history(
+    turns: list,
+    budget: int,
+    scenario: Message = None,
+    summary: str = "",
+    summary_lines: list = (),
+    agent: str = "",
+) -> str:
+    """
+    Render the conversation for one agent within `budget` estimated tokens:
+    scenario first (at most half the budget), then as many recent turns as fit (newest
+    first), and the summary of older turns in whatever budget is left: the persisted
+    summary text (at most a third of the budget) followed by the per-message lines.
+    Turns that do not fit are folded into the summary lines.
+    """
+    remaining = budget
+    head = []
+    if scenario is not None:
+        scenario_line = f"SYSTEM: {truncate_to_tokens(scenario.text, budget // 2)}"
+        head.append(scenario_line)
+        remaining -= estimate_tokens(scenario_line) + 1
+
+    recent = []
+    overflow = []
+    for index in range(len(turns) - 1, -1, -1):
+        msg = turns[index]
+        line = _line(msg.sender, msg.text)
+        cost = estimate_tokens(line) + 1
+        if cost > remaining:
+            overflow = [m for m in turns[: index + 1] if m.sender in ("user", "manager")]
+            break
+        recent.append(line)
+        remaining -= cost
+    recent.reverse()
+
+    older = list(summary_lines) + [_summary_line(m.sender, m.text) for m in overflow]
+    kept = []
+    if summary or older:
+        remaining -= estimate_tokens(SUMMARY_HEADER) + 1
+    if summary and remaining > 0:
+        summary = truncate_to_tokens(summary, min(budget // 3, remaining))
+        kept.append(summary)
+        remaining -= estimate_tokens(summary) + 1
+    if older:
+        # The counterpart's opening position comes first unless the summary text already
+        # covers it, then the newest lines that still fit
+        pinned = []
+        if not summary:
+            opening = _opening_index(older)
+            pinned, older = [older[opening]], older[opening + 1:]
+            remaining -= estimate_tokens(pinned[0]) + 1
+        if remaining >= 0:
+            newest = []
+            for line in reversed(older):
+                cost = estimate_tokens(line) + 1
+                if cost > remaining:
+                    break
+                newest.append(line)
+                remaining -= cost
+            kept += pinned + newest[::-1]
+
+    lines = head + ([SUMMARY_HEADER] + kept if kept else []) + recent
+    history = "\n".join(lines)
+    if agent:
+        CONTEXT_TOKENS.observe(estimate_tokens(history), agent=agent)
+    return history
@@ -0,0 +1,152 @@
+"""
+Persisted rolling summary of long simulations.
+Once enough user/manager messages have left the history window, a background job asks the
+LLM to fold them into a short per-task summary (ConversationSummary). The agents then get
+that summary plus the recent tail; only messages newer than the summary still need the
+per-message summary lines of context_builder.rolling_summary.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal
+from models import ConversationSummary, Message
+from context_builder import truncate_to_tokens, CONTEXT_MAX_MESSAGE_TOKENS
+from llm.summary_agent import summarize_conversation_async
+from llm.client import llm_priority, BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+# Refresh the summary once this many turns (user + manager message pairs) have left the
+# history window without being summarized; 0 disables the persisted summary
+CONVERSATION_SUMMARY_EVERY_TURNS = int(os.getenv("CONVERSATION_SUMMARY_EVERY_TURNS", "4"))
+# Most messages folded into the summary by one job; a longer backlog takes several jobs
+SUMMARY_BATCH_MESSAGES = 40
+
+# (session_id, task_title) pairs with an update in flight
+_updating = set()
+# Strong references to background update tasks
+_background_tasks = set()
+
+
+def load_summary(db, session_id: str, task_title: str) -> Optional[ConversationSummary]:
+    """Return the stored summary for a task, or None if none has been written yet."""
+    return (
+        db.query(ConversationSummary)
+        .filter(
+            ConversationSummary.session_id == session_id,
+            ConversationSummary.task_title == task_title,
+        )
+        .first()
+    )
+
+
+def delete_summary(db, session_id: str, task_title: str) -> None:
+    """Drop the stored summary for a task (call when its messages are deleted)."""
+    db.query(ConversationSummary).filter(
+        ConversationSummary.session_id == session_id,
+        ConversationSummary.task_title == task_title,
+    ).delete()
+
+
+def summary_due(unsummarized_messages: int) -> bool:
+    """True when enough messages outside the history window are not yet in the summary."""
+    return (
+        CONVERSATION_SUMMARY_EVERY_TURNS > 0
+        and unsummarized_messages >= 2 * CONVERSATION_SUMMARY_EVERY_TURNS
+    )
+
+
+def _load_new_turns(session_id: str, task_title: str, before_id: int):
+    """Return (stored summary text, last summarized id, new user/manager rows) for a task."""
+    db = SessionLocal()
+    try:
+        stored = load_summary(db, session_id, task_title)
+        last_id = stored.last_message_id if stored else 0
+        rows = (
+            db.query(Message.id, Message.sender, Message.text)
+            .filter(
+                Message.session_id == session_id,
+                Message.task_title == task_title,
+                Message.id > last_id,
+                Message.id < before_id,
+                Message.sender.in_(("user", "manager")),
+            )
+            .order_by(Message.id.asc())
+            .limit(SUMMARY_BATCH_MESSAGES)
+            .all()
+        )
+        return (stored.summary if stored else ""), last_id, rows
+    finally:
+        db.close()
+
+
+def _save_summary(session_id: str, task_title: str, summary: str, based_on_id: int, last_message_id: int) -> bool:
+    """Upsert the summary unless another update has moved it past based_on_id meanwhile."""
+    db = SessionLocal()
+    try:
+        stored = load_summary(db, session_id, task_title)
+        if stored is None:
+            if based_on_id:
+                return False  # the summary we extended was deleted with its messages
+            stored = ConversationSummary(session_id=session_id, task_title=task_title)
+            db.add(stored)
+        elif stored.last_message_id != based_on_id:
+            return False
+        stored.summary = summary
+        stored.last_message_id = last_message_id
+        stored.updated_at = datetime.utcnow()
+        db.commit()
+        return True
+    except IntegrityError:
+        db.rollback()  # another process wrote the first summary; the next turn extends it
+        return False
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def _update_summary(session_id: str, task_title: str, before_id: int) -> None:
+    """Fold the user/manager messages older than before_id into the stored summary."""
+    # Database work runs in worker threads with short-lived sessions, so no connection is
+    # held during the LLM call
+    try:
+        previous, last_id, rows = await asyncio.to_thread(_load_new_turns, session_id, task_title, before_id)
+        if not rows:
+            return
+        new_turns = "\n".join(
+            f"{sender.upper()}: {truncate_to_tokens(text, CONTEXT_MAX_MESSAGE_TOKENS)}" for _, sender, text in rows
+        )
+        with llm_priority(BACKGROUND):
+            summary = await summarize_conversation_async(previous, new_turns, task_title)
+        if not summary:
+            return
+
+        if await asyncio.to_thread(_save_summary, session_id, task_title, summary, last_id, rows[-1][0]):
+            logger.info("[conversation_summary] Summary for task '%s' now covers %s messages", task_title, len(rows))
+    except Exception as e:
+        logger.error("[conversation_summary] Error updating summary for task '%s': %s", task_title, e)
+    finally:
+        _updating.discard((session_id, task_title))
+
+
+def schedule_summary_update(session_id: str, task_title: str, before_id: int) -> None:
+    """Start a background summary update for a task unless one is already running."""
+    key = (session_id, task_title)
+    if key in _updating:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return  # no event loop; the next turn schedules it
+    _updating.add(key)
+    task = loop.create_task(_update_summary(session_id, task_title, before_id))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
@@ -0,0 +1,41 @@
+"""
+Rubric-driven grading of exercise responses.
+Every task type is graded by the same code path: its rubric (llm/evaluation_agent.RUBRICS)
+supplies the prompts, reply schema and level -> grade map, and this module adds what all
+types share: coalescing identical in-flight evaluations, timing and the graded result.
+POST /evaluate, the /evaluate-* aliases and /evaluate/batch all call evaluate().
+"""
+
+import json
+
+from metrics import EVALUATION_SECONDS
+from single_flight import SingleFlight
+from llm.evaluation_agent import RUBRICS, run_rubric_async, grade_result
+
+# Request fields that do not change the grade
+_UNGRADED_FIELDS = ("id", "session_id", "task_type", "task_id", "save")
+
+_flights = SingleFlight("evaluation")
+
+
+def evaluation_key(task_type: str, inputs: dict) -> str:
+    """Evaluations with the same task type, prompt fields and response get the same grade."""
+    fields = {key: value for key, value in inputs.items() if key not in _UNGRADED_FIELDS}
+    return json.dumps({"task_type": task_type, **fields}, sort_keys=True)
+
+
+async def _grade(task_type: str, inputs: dict) -> dict:
+    with EVALUATION_SECONDS.time(task_type=task_type):
+        result = await run_rubric_async(task_type, inputs)
+    return grade_result(task_type, result)
+
+
+async def evaluate(task_type: str, inputs: dict) -> dict:
+    """
+    Grade one response. inputs holds task_title, response and the task type's prompt
+    fields (question, position, scenario, ...). Raises ValueError for an unknown task type.
+    """
+    if task_type not in RUBRICS:
+        raise ValueError(f"Unknown task_type: {task_type}")
+    result = await _flights.run(evaluation_key(task_type, inputs), _grade, task_type, inputs)
+    return {**result, "task_title": inputs.get("task_title", "")}
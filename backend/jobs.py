@@ -0,0 +1,300 @@
+"""
+In-process background job queue for work the learner should not wait on: grading,
+task bookkeeping, insights generation and prefetching the next task's content.
+Handlers are registered by kind with @job_handler; enqueue() records a job and returns
+at once, and a fixed pool of asyncio workers runs it. GET /jobs/{job_id} reports status
+and result, /jobs/{job_id}/stream pushes every status change.
+Backends: in-process memory (the default), or a local SQLite file so jobs that were
+queued or running at shutdown run again on the next startup.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional
+
+from metrics import Gauge, Histogram
+from llm.client import llm_priority, BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "memory")  # memory | sqlite
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "./jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# How long finished jobs stay queryable
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+
+JOB_QUEUE_DEPTH = Gauge("job_queue_depth", "Background jobs waiting for a worker")
+JOB_SECONDS = Histogram("job_seconds", "Background job run time by kind and outcome")
+
+ACTIVE_STATUSES = ("queued", "running")
+
+# kind -> (handler, LLM priority); async handlers run on the event loop, plain functions in a worker thread
+_handlers = {}
+
+
+def job_handler(kind: str, priority: str = BACKGROUND):
+    """
+    Register the function that runs jobs of this kind (called with the job payload as kwargs).
+    Its LLM calls run at `priority`; use INTERACTIVE for work a learner is waiting on.
+    """
+    def register(fn):
+        _handlers[kind] = (fn, priority)
+        return fn
+    return register
+
+
+def public_job(job: dict) -> dict:
+    """Job fields returned by the API (the payload may hold learner text and is left out)."""
+    return {key: value for key, value in job.items() if key not in ("payload", "dedupe_key")}
+
+
+class MemoryJobStore:
+    """Job records in a dict; lost on restart."""
+
+    def __init__(self):
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, job: dict) -> None:
+        with self._lock:
+            self._jobs[job["id"]] = dict(job)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def find_active(self, dedupe_key: str) -> Optional[dict]:
+        with self._lock:
+            for job in reversed(self._jobs.values()):
+                if job["dedupe_key"] == dedupe_key and job["status"] in ACTIVE_STATUSES:
+                    return dict(job)
+        return None
+
+    def unfinished(self) -> list:
+        return []
+
+    def prune(self, finished_before: float) -> None:
+        with self._lock:
+            # Jobs finish out of creation order, so check every one (like SQLiteJobStore.prune)
+            for job_id in list(self._jobs):
+                job = self._jobs[job_id]
+                if job["status"] in ACTIVE_STATUSES or (job["finished_at"] or 0) >= finished_before:
+                    continue
+                del self._jobs[job_id]
+
+
+class SQLiteJobStore:
+    """Job records in a local SQLite file; unfinished jobs are resumed after a restart."""
+
+    COLUMNS = ("id", "kind", "payload", "dedupe_key", "status", "result", "error", "created_at", "started_at", "finished_at")
+
+    def __init__(self, path: str = JOB_QUEUE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, dedupe_key TEXT, "
+            "status TEXT NOT NULL, result TEXT, error TEXT, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status ON jobs (status)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_dedupe_key ON jobs (dedupe_key)")
+        self._conn.commit()
+
+    def _row_to_job(self, row) -> dict:
+        job = dict(zip(self.COLUMNS, row))
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def add(self, job: dict) -> None:
+        row = dict(job, payload=json.dumps(job["payload"]), result=None)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO jobs ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                tuple(row[column] for column in self.COLUMNS),
+            )
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row is not None else None
+
+    def update(self, job_id: str, **fields) -> None:
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {', '.join(f'{column} = ?' for column in fields)} WHERE id = ?",
+                (*fields.values(), job_id),
+            )
+            self._conn.commit()
+
+    def find_active(self, dedupe_key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE dedupe_key = ? AND status IN (?, ?) "
+                "ORDER BY created_at DESC LIMIT 1",
+                (dedupe_key, *ACTIVE_STATUSES),
+            ).fetchone()
+        return self._row_to_job(row) if row is not None else None
+
+    def unfinished(self) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                ACTIVE_STATUSES,
+            ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def prune(self, finished_before: float) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE finished_at < ?", (finished_before,))
+            self._conn.commit()
+
+
+class JobQueue:
+    """Runs registered jobs on `workers` asyncio tasks; start() and stop() follow the app lifespan."""
+
+    def __init__(self, store, workers: int = JOB_WORKERS):
+        self.store = store
+        self.workers = workers
+        self._loop = None
+        self._queue = None
+        self._tasks = []
+        self._watchers = {}  # job_id -> set of asyncio.Event
+        self._enqueue_lock = threading.Lock()
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        # Durable store: jobs interrupted by the last shutdown run again
+        for job in self.store.unfinished():
+            logger.info("[jobs] Resuming %s job %s", job["kind"], job["id"])
+            self.store.update(job["id"], status="queued", started_at=None)
+            self._queue.put_nowait(job["id"])
+        JOB_QUEUE_DEPTH.set(self._queue.qsize())
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def enqueue(self, kind: str, payload: dict, dedupe_key: str = None) -> dict:
+        """
+        Record a job and hand it to the workers; returns the job without waiting for it.
+        With dedupe_key, a queued or running job with the same key is returned instead of
+        starting another. Safe to call from worker threads (sync endpoints).
+        """
+        if kind not in _handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if self._queue is None:
+            raise RuntimeError("Job queue is not running")
+        with self._enqueue_lock:
+            if dedupe_key:
+                existing = self.store.find_active(dedupe_key)
+                if existing is not None:
+                    return existing
+            job = self._new_job(kind, payload, dedupe_key)
+            self.store.add(job)
+        self.store.prune(time.time() - JOB_RETENTION_SECONDS)
+        self._loop.call_soon_threadsafe(self._put, job["id"])
+        return job
+
+    @staticmethod
+    def _new_job(kind: str, payload: dict, dedupe_key: str) -> dict:
+        return {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "payload": payload,
+            "dedupe_key": dedupe_key,
+            "status": "queued",
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self.store.get(job_id)
+
+    @contextmanager
+    def watch(self, job_id: str):
+        """Yield an asyncio.Event set on every status change of a job (event loop only)."""
+        changed = asyncio.Event()
+        self._watchers.setdefault(job_id, set()).add(changed)
+        try:
+            yield changed
+        finally:
+            watchers = self._watchers.get(job_id)
+            if watchers is not None:
+                watchers.discard(changed)
+                if not watchers:
+                    del self._watchers[job_id]
+
+    def _put(self, job_id: str) -> None:
+        if self._queue is not None:
+            self._queue.put_nowait(job_id)
+            JOB_QUEUE_DEPTH.set(self._queue.qsize())
+
+    def _update(self, job_id: str, **fields) -> None:
+        self.store.update(job_id, **fields)
+        for changed in self._watchers.get(job_id, ()):
+            changed.set()
+
+    async def _work(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            JOB_QUEUE_DEPTH.set(self._queue.qsize())
+            job = self.store.get(job_id)
+            if job is not None and job["status"] == "queued":
+                await self._run(job)
+
+    async def _run(self, job: dict) -> None:
+        handler, priority = _handlers.get(job["kind"], (None, BACKGROUND))
+        self._update(job["id"], status="running", started_at=time.time())
+        started = time.perf_counter()
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown job kind: {job['kind']}")
+            with llm_priority(priority):
+                if asyncio.iscoroutinefunction(handler):
+                    result = await handler(**job["payload"])
+                else:
+                    result = await asyncio.to_thread(handler, **job["payload"])
+            error = result.get("error") if isinstance(result, dict) else None
+        except Exception as e:
+            logger.exception("[jobs] %s job %s failed: %s", job["kind"], job["id"], e)
+            result, error = None, str(e)
+        outcome = "failed" if error else "succeeded"
+        JOB_SECONDS.observe(time.perf_counter() - started, kind=job["kind"], outcome=outcome)
+        self._update(job["id"], status=outcome, result=result, error=error, finished_at=time.time())
+
+
+def _make_store():
+    if JOB_QUEUE_BACKEND == "sqlite":
+        return SQLiteJobStore()
+    return MemoryJobStore()
+
+
+job_queue = JobQueue(_make_store())
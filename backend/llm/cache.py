@@ -0,0 +1,163 @@
+"""
+Content-addressed cache for LLM responses.
+Entries are keyed on (model, system prompt hash, user prompt hash, temperature, max_tokens)
+and evicted by TTL and least-recent use. Backends: in-process memory, on-disk SQLite,
+or memory in front of SQLite (the default).
+Lookups only read: SQLite hit times are batched and written with the next store or
+once LLM_CACHE_TOUCH_BATCH entries have been hit; expired rows are purged when storing.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "sqlite")  # sqlite | memory | off
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./llm_cache.db")
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "1000"))
+# SQLite entries whose hit times are buffered before they are written
+LLM_CACHE_TOUCH_BATCH = int(os.getenv("LLM_CACHE_TOUCH_BATCH", "64"))
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_cache_key(model: str, system_prompt: str, user_prompt: str, temperature: float, max_tokens: int) -> str:
+    """Build the content address for one LLM call."""
+    parts = [model, _sha256(system_prompt), _sha256(user_prompt), f"{temperature:.3f}", str(max_tokens)]
+    return _sha256("|".join(parts))
+
+
+class MemoryCache:
+    """In-process LRU cache with a per-entry TTL."""
+
+    def __init__(self, max_entries: int = LLM_CACHE_MEMORY_ENTRIES, ttl_seconds: float = LLM_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, expires_at: float = None) -> None:
+        """Store value until expires_at (default: the TTL from now)."""
+        with self._lock:
+            self._entries[key] = (expires_at or time.time() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class SQLiteCache:
+    """On-disk cache shared across processes and restarts, with TTL and LRU eviction."""
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_entries: int = LLM_CACHE_MAX_ENTRIES, ttl_seconds: float = LLM_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._touched = {}  # key -> last hit time not written yet
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_last_used ON llm_cache (last_used)")
+        self._conn.commit()
+
+    def get_entry(self, key: str) -> Optional[tuple]:
+        """(value, expires_at) of a live entry, or None."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] < now:
+                return None
+            self._touched[key] = now
+            if len(self._touched) >= LLM_CACHE_TOUCH_BATCH:
+                self._write_touched()
+                self._conn.commit()
+            return row
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def _write_touched(self) -> None:
+        """Write the buffered hit times (caller holds the lock and commits)."""
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE llm_cache SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._write_touched()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, now + self.ttl_seconds, now),
+            )
+            self._conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (now,))
+            # Drop least recently used entries beyond the size limit
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+
+class TieredCache:
+    """Memory cache in front of a persistent cache; hits from disk are promoted to memory until they expire."""
+
+    def __init__(self, front: MemoryCache, back: SQLiteCache):
+        self.front = front
+        self.back = back
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.front.get(key)
+        if value is None:
+            entry = self.back.get_entry(key)
+            if entry is not None:
+                value, expires_at = entry
+                self.front.set(key, value, expires_at)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self.front.set(key, value)
+        self.back.set(key, value)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the configured cache backend, or None when caching is off."""
+    global _cache
+    if _cache is None and LLM_CACHE_BACKEND != "off":
+        with _cache_lock:
+            if _cache is None:
+                if LLM_CACHE_BACKEND == "memory":
+                    _cache = MemoryCache()
+                else:
+                    _cache = TieredCache(MemoryCache(), SQLiteCache())
+    return _cache
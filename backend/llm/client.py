@@ -1,24 +1,534 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
 import os
-from groq import Groq
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import httpx
+from groq import Groq, AsyncGroq, APIConnectionError, APIStatusError, APITimeoutError, RateLimitError
 from dotenv import load_dotenv
+from llm.cache import get_cache, make_cache_key
+from metrics import (
+    LLM_CALL_SECONDS, LLM_CALLS, LLM_TOKENS, LLM_PROMPT_TOKENS,
+    LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT_SECONDS, LLM_IN_FLIGHT, LLM_RETRIES,
+)
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Point GROQ_BASE_URL at a compatible server (e.g. loadtest/fake_groq.py) to run without the real API
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+
+# Retries are handled by the scheduler below, not by the SDK
 client = Groq(
-    api_key=os.getenv("GROQ_API_KEY")
+    api_key=os.getenv("GROQ_API_KEY"),
+    base_url=GROQ_BASE_URL,
+    max_retries=0,
 )
 
 MODEL_NAME = "llama-3.1-8b-instant"
 
-def call_llm(system_prompt: str, user_prompt: str) -> str:
-    response = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ],
-        temperature=0.7,
-        max_tokens=400,
-    )
-
-    return response.choices[0].message.content.strip()
+# Connection pool shared by every async LLM call in this process.
+# Keep-alive connections let concurrent learner turns reuse TLS sessions
+# instead of opening a new connection per request.
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "200"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "50"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+
+_async_client = None
+
+
+def get_async_client() -> AsyncGroq:
+    """Return the process-wide AsyncGroq client, creating it on first use."""
+    global _async_client
+    if _async_client is None:
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE,
+            ),
+            timeout=LLM_TIMEOUT_SECONDS,
+        )
+        _async_client = AsyncGroq(
+            api_key=os.getenv("GROQ_API_KEY"),
+            base_url=GROQ_BASE_URL,
+            http_client=http_client,
+            max_retries=0,
+        )
+    return _async_client
+
+
+async def close_async_client() -> None:
+    """Close the pooled async client (called on app shutdown)."""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+
+
+# Scheduler. Every API call is admitted through one priority queue that enforces a
+# concurrency limit and request/token-per-minute budgets. Interactive calls (chat turns,
+# grading the learner waits for) go ahead of background work (prefetch, pool refills,
+# summaries, batch grading). Transient failures are retried with jittered exponential
+# backoff, and each call gives up at its deadline (queueing and retries included).
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "0"))  # requests per minute, 0 = no limit
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "0"))  # tokens per minute, 0 = no limit
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "0.5"))
+LLM_RETRY_MAX_SECONDS = 20.0
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "90"))
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+_PRIORITY_RANKS = {INTERACTIVE: 0, BACKGROUND: 1}
+
+_priority = contextvars.ContextVar("llm_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def llm_priority(priority: str):
+    """Run the LLM calls made in this block (and in tasks started from it) at a priority class."""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    """An LLM call could not complete before its deadline."""
+
+
+class TokenBucket:
+    """Budget of `per_minute` units refilled continuously; per_minute=0 means unlimited."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` units are available (a call larger than the bucket waits for a full one)."""
+        if self.capacity <= 0:
+            return 0.0
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+        amount = min(amount, self.capacity)
+        return 0.0 if self.level >= amount else (amount - self.level) * 60 / self.capacity
+
+    def take(self, amount: float) -> None:
+        if self.capacity > 0:
+            self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount: float) -> None:
+        if self.capacity > 0 and amount > 0:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class _Waiter:
+    def __init__(self, priority: str, tokens: int, loop=None):
+        self.priority = priority
+        self.tokens = tokens
+        self.loop = loop
+        self.event = asyncio.Event() if loop is not None else threading.Event()
+        self.granted = False
+
+    def wake(self) -> None:
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.event.set)
+        else:
+            self.event.set()
+
+
+class LLMScheduler:
+    """
+    Admission control for LLM calls from both the event loop and worker threads.
+    Waiters are admitted strictly by (priority, arrival); the head of the queue is granted
+    once a concurrency slot, a request and its estimated tokens are available.
+    """
+
+    def __init__(self, max_concurrency: int, rpm: int, tpm: int):
+        self.max_concurrency = max_concurrency
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._lock = threading.Lock()
+        self._waiting = []  # heap of (rank, seq, waiter)
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+
+    def _grant(self) -> float:
+        """
+        Admit queued calls while capacity allows (lock held). Returns the seconds until
+        the head of the queue can be admitted, or 0 if it waits for a free slot instead.
+        """
+        while self._waiting:
+            waiter = self._waiting[0][2]
+            if self._in_flight >= self.max_concurrency:
+                return 0.0
+            now = time.monotonic()
+            delay = max(
+                self._paused_until - now,
+                self.requests.wait_time(1, now),
+                self.tokens.wait_time(waiter.tokens, now),
+            )
+            if delay > 0:
+                return delay
+            heapq.heappop(self._waiting)
+            self.requests.take(1)
+            self.tokens.take(waiter.tokens)
+            self._in_flight += 1
+            LLM_QUEUE_DEPTH.dec(priority=waiter.priority)
+            LLM_IN_FLIGHT.set(self._in_flight)
+            waiter.granted = True
+            waiter.wake()
+        return 0.0
+
+    def _enqueue(self, waiter: _Waiter) -> float:
+        with self._lock:
+            heapq.heappush(self._waiting, (_PRIORITY_RANKS.get(waiter.priority, 0), next(self._seq), waiter))
+            LLM_QUEUE_DEPTH.inc(priority=waiter.priority)
+            return self._grant()
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        """Take a waiter that gave up (deadline, cancellation) out of the queue."""
+        with self._lock:
+            if waiter.granted:
+                self._release_locked(waiter.tokens)
+                return
+            self._waiting = [entry for entry in self._waiting if entry[2] is not waiter]
+            heapq.heapify(self._waiting)
+            LLM_QUEUE_DEPTH.dec(priority=waiter.priority)
+            self._grant()
+
+    def _timeout(self, deadline: float, delay: float) -> float:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMDeadlineExceeded("LLM call deadline passed while queued")
+        return min(remaining, delay) if delay > 0 else remaining
+
+    async def acquire_async(self, priority: str, tokens: int, deadline: float) -> None:
+        waiter = _Waiter(priority, tokens, asyncio.get_running_loop())
+        started = time.monotonic()
+        delay = self._enqueue(waiter)
+        try:
+            while not waiter.granted:
+                timeout = self._timeout(deadline, delay)
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                waiter.event.clear()
+                with self._lock:
+                    delay = self._grant()
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        LLM_QUEUE_WAIT_SECONDS.observe(time.monotonic() - started, priority=priority)
+
+    def acquire(self, priority: str, tokens: int, deadline: float) -> None:
+        waiter = _Waiter(priority, tokens)
+        started = time.monotonic()
+        delay = self._enqueue(waiter)
+        try:
+            while not waiter.granted:
+                waiter.event.wait(self._timeout(deadline, delay))
+                waiter.event.clear()
+                with self._lock:
+                    delay = self._grant()
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        LLM_QUEUE_WAIT_SECONDS.observe(time.monotonic() - started, priority=priority)
+
+    def _release_locked(self, unused_tokens: int) -> None:
+        self._in_flight -= 1
+        self.tokens.give_back(unused_tokens)
+        LLM_IN_FLIGHT.set(self._in_flight)
+        self._grant()
+
+    def release(self, unused_tokens: int = 0) -> None:
+        """Free a slot; unused_tokens returns an over-estimate to the token budget."""
+        with self._lock:
+            self._release_locked(unused_tokens)
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every queued call (e.g. after a 429 with Retry-After)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+scheduler = LLMScheduler(LLM_MAX_CONCURRENCY, LLM_RPM_LIMIT, LLM_TPM_LIMIT)
+
+
+def _estimate_tokens(system_prompt: str, user_prompt: str, max_tokens: int) -> int:
+    """Tokens reserved against the TPM budget: prompt (about 4 characters per token) plus max_tokens."""
+    return (len(system_prompt) + len(user_prompt)) // 4 + max_tokens
+
+
+def _used_tokens(usage, estimate: int) -> int:
+    if usage is None:
+        return estimate
+    return (usage.prompt_tokens or 0) + (usage.completion_tokens or 0)
+
+
+def _retry_reason(error: Exception) -> Optional[str]:
+    """Metrics label for a retryable error, None if the call should not be retried."""
+    if isinstance(error, RateLimitError):
+        return "rate_limit"
+    if isinstance(error, APITimeoutError):
+        return "timeout"
+    if isinstance(error, APIConnectionError):
+        return "connection"
+    if isinstance(error, APIStatusError) and error.status_code >= 500:
+        return "server"
+    return None
+
+
+def _retry_after(error: Exception) -> float:
+    """Seconds the API asked us to wait (Retry-After header on 429), else 0."""
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after", 0)) if response is not None else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _retry_delay(error: Exception, caller: str, attempt: int, deadline: float) -> Optional[float]:
+    """
+    Backoff before the next attempt (full jitter, at least the server's Retry-After),
+    or None if the error is not retryable, retries are used up or the deadline is too close.
+    """
+    reason = _retry_reason(error)
+    if reason is None or attempt >= LLM_MAX_RETRIES:
+        return None
+    retry_after = _retry_after(error)
+    delay = max(retry_after, random.uniform(0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2 ** attempt)))
+    if time.monotonic() + delay >= deadline:
+        return None
+    if reason == "rate_limit":
+        scheduler.pause(retry_after or delay)
+    LLM_RETRIES.inc(caller=caller, reason=reason)
+    logger.warning("[llm] %s failed (%s), retry %s in %.2fs", caller, reason, attempt + 1, delay)
+    return delay
+
+
+def _deadline(deadline_seconds: Optional[float]) -> float:
+    return time.monotonic() + (deadline_seconds or LLM_DEADLINE_SECONDS)
+
+
+def _request_timeout(deadline: float) -> float:
+    return max(0.1, deadline - time.monotonic())
+
+
+def _build_messages(system_prompt: str, user_prompt: str) -> list:
+    messages = []
+    if system_prompt:
+        messages.append({"role": "system", "content": system_prompt})
+    messages.append({"role": "user", "content": user_prompt})
+    return messages
+
+
+def _response_format(json_mode: bool) -> dict:
+    return {"response_format": {"type": "json_object"}} if json_mode else {}
+
+
+def _caller_name(depth: int = 2) -> str:
+    """module.function of the code calling into this module, used as the metrics label."""
+    frame = sys._getframe(depth)
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}"
+
+
+def _record_call(caller: str, started: float, response=None, error: bool = False) -> None:
+    """Record latency, outcome and token usage for one completed LLM call."""
+    LLM_CALL_SECONDS.observe(time.perf_counter() - started, caller=caller)
+    LLM_CALLS.inc(caller=caller, outcome="error" if error else "ok")
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        LLM_TOKENS.inc(usage.prompt_tokens or 0, caller=caller, kind="prompt")
+        LLM_TOKENS.inc(usage.completion_tokens or 0, caller=caller, kind="completion")
+        LLM_PROMPT_TOKENS.observe(usage.prompt_tokens or 0, caller=caller)
+
+
+def _cache_lookup(system_prompt: str, user_prompt: str, temperature: float, max_tokens: int):
+    """Return (cache, key, cached_value) for a cacheable call."""
+    cache = get_cache()
+    if cache is None:
+        return None, None, None
+    key = make_cache_key(MODEL_NAME, system_prompt, user_prompt, temperature, max_tokens)
+    return cache, key, cache.get(key)
+
+
+def call_llm(
+    system_prompt: str,
+    user_prompt: str,
+    temperature: float = 0.7,
+    max_tokens: int = 400,
+    cache: bool = False,
+    caller: str = None,
+    deadline_seconds: float = None,
+    json_mode: bool = False,
+) -> str:
+    """
+    Call the LLM and return the stripped reply text.
+    With cache=True the reply is served from / stored in the LLM response cache,
+    so only use it for calls that are pure functions of their prompts.
+    The call goes through the scheduler at the current llm_priority and is retried on
+    rate limits and transient errors until deadline_seconds (LLM_DEADLINE_SECONDS) pass.
+    With json_mode=True the API constrains the reply to a JSON object (the prompt must ask for JSON).
+    Latency and token usage are recorded per caller (defaults to the calling function).
+    """
+    caller = caller or _caller_name()
+    if cache:
+        llm_cache, key, cached = _cache_lookup(system_prompt, user_prompt, temperature, max_tokens)
+        if cached is not None:
+            LLM_CALLS.inc(caller=caller, outcome="cache_hit")
+            return cached
+
+    estimate = _estimate_tokens(system_prompt, user_prompt, max_tokens)
+    deadline = _deadline(deadline_seconds)
+    attempt = 0
+    while True:
+        scheduler.acquire(_priority.get(), estimate, deadline)
+        started = time.perf_counter()
+        try:
+            response = client.chat.completions.create(
+                model=MODEL_NAME,
+                messages=_build_messages(system_prompt, user_prompt),
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=_request_timeout(deadline),
+                **_response_format(json_mode),
+            )
+        except Exception as e:
+            scheduler.release()
+            _record_call(caller, started, error=True)
+            delay = _retry_delay(e, caller, attempt, deadline)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            attempt += 1
+            continue
+        scheduler.release(estimate - _used_tokens(getattr(response, "usage", None), estimate))
+        _record_call(caller, started, response)
+        break
+
+    text = response.choices[0].message.content.strip()
+    if cache and llm_cache is not None and text:
+        llm_cache.set(key, text)
+    return text
+
+
+async def call_llm_async(
+    system_prompt: str,
+    user_prompt: str,
+    temperature: float = 0.7,
+    max_tokens: int = 400,
+    cache: bool = False,
+    caller: str = None,
+    deadline_seconds: float = None,
+    json_mode: bool = False,
+) -> str:
+    """
+    Non-blocking version of call_llm that uses the pooled async client.
+    Cache reads and writes (SQLite) run in a worker thread.
+    """
+    caller = caller or _caller_name()
+    if cache:
+        llm_cache, key, cached = await asyncio.to_thread(_cache_lookup, system_prompt, user_prompt, temperature, max_tokens)
+        if cached is not None:
+            LLM_CALLS.inc(caller=caller, outcome="cache_hit")
+            return cached
+
+    estimate = _estimate_tokens(system_prompt, user_prompt, max_tokens)
+    deadline = _deadline(deadline_seconds)
+    attempt = 0
+    while True:
+        await scheduler.acquire_async(_priority.get(), estimate, deadline)
+        started = time.perf_counter()
+        try:
+            response = await get_async_client().chat.completions.create(
+                model=MODEL_NAME,
+                messages=_build_messages(system_prompt, user_prompt),
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=_request_timeout(deadline),
+                **_response_format(json_mode),
+            )
+        except BaseException as e:
+            scheduler.release()
+            if not isinstance(e, Exception):
+                raise  # cancelled
+            _record_call(caller, started, error=True)
+            delay = _retry_delay(e, caller, attempt, deadline)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        scheduler.release(estimate - _used_tokens(getattr(response, "usage", None), estimate))
+        _record_call(caller, started, response)
+        break
+
+    text = response.choices[0].message.content.strip()
+    if cache and llm_cache is not None and text:
+        await asyncio.to_thread(llm_cache.set, key, text)
+    return text
+
+
+async def stream_llm_async(system_prompt: str, user_prompt: str, caller: str = None, deadline_seconds: float = None):
+    """
+    Stream a completion from the pooled async client, yielding text deltas as they arrive.
+    The call holds a scheduler slot for the whole stream; it is only retried if it fails
+    before the first delta.
+    """
+    caller = caller or _caller_name()
+    estimate = _estimate_tokens(system_prompt, user_prompt, 400)
+    deadline = _deadline(deadline_seconds)
+    attempt = 0
+    while True:
+        await scheduler.acquire_async(_priority.get(), estimate, deadline)
+        started = time.perf_counter()
+        usage = None
+        streamed = False
+        try:
+            stream = await get_async_client().chat.completions.create(
+                model=MODEL_NAME,
+                messages=_build_messages(system_prompt, user_prompt),
+                temperature=0.7,
+                max_tokens=400,
+                stream=True,
+                timeout=_request_timeout(deadline),
+            )
+            async for chunk in stream:
+                # Groq reports token usage on the final chunk
+                x_groq = getattr(chunk, "x_groq", None)
+                if x_groq is not None and getattr(x_groq, "usage", None) is not None:
+                    usage = x_groq
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    streamed = True
+                    yield delta
+        except BaseException as e:
+            scheduler.release()
+            if not isinstance(e, Exception):
+                raise  # cancelled, or the consumer closed the stream
+            _record_call(caller, started, error=True)
+            delay = None if streamed else _retry_delay(e, caller, attempt, deadline)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        scheduler.release(estimate - _used_tokens(getattr(usage, "usage", None), estimate))
+        _record_call(caller, started, usage)
+        return
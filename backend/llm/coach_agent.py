@@ -1,4 +1,9 @@
-from llm.client import call_llm
+from llm.client import call_llm_async
+from llm.tip_cache import get_tip_cache, turn_vector
+from metrics import PARSE_SECONDS
+import logging
+
+logger = logging.getLogger(__name__)
 
 SYSTEM_PROMPT = """
 You are a negotiation coach using deliberate practice and metacognitive principles.
@@ -50,57 +55,60 @@ Grading scale:
 - 5/5: Excellent negotiation (strong strategy, creative solutions, active problem-solving)
 """
 
-def coach_feedback(
+def _counterpart_name(conversation_history: str = None) -> str:
+    """Name of the other party from the conversation history, or "the other party"."""
+    counterpart_name = "the other party"  # Default fallback
+    if not conversation_history:
+        return counterpart_name
+
+    # Try to extract counterpart name from conversation history
+    # Look for patterns like "Your counterpart is [Name], [Role]" in the text
+    
+    # First, search the entire conversation history for the pattern
+    import re
+    counterpart_match = re.search(r"[Yy]our counterpart is\s+(\w+)", conversation_history)
+    if counterpart_match:
+        counterpart_name = counterpart_match.group(1)
+        logger.debug("[coach_feedback] Found counterpart name via 'Your counterpart is' pattern: %s", counterpart_name)
+    
+    # If not found, try to extract from lines starting with a name followed by colon
+    if counterpart_name == "the other party":
+        lines = conversation_history.split("\n")
+        logger.debug("[coach_feedback] Looking for NAME: pattern in %s lines...", len(lines))
+        for line in lines:
+            # Look for "NAME:" pattern (but not MANAGER, USER, COACH, SYSTEM, etc.)
+            match = re.match(r"^([A-Z][a-z]+):\s", line)
+            if match:
+                name = match.group(1)
+                # Skip generic role names
+                if name not in ["Manager", "User", "Coach", "System"]:
+                    counterpart_name = name
+                    logger.debug("[coach_feedback] Found counterpart name via 'NAME:' pattern: %s", counterpart_name)
+                    break
+    
+    if counterpart_name == "the other party":
+        logger.debug("[coach_feedback] No counterpart name found, using default: 'the other party'")
+    return counterpart_name
+
+
+def _coach_prompt(
     user_message: str,
     manager_reply: str,
     task_context: dict = None,
     conversation_history: str = None,
-) -> list[str]:
-    """
-    Generate coach suggestions with optional task context and conversation history.
-    Extracts counterpart name from conversation history if available.
-    """
+    counterpart_name: str = "the other party",
+) -> str:
+    """Build the coach user prompt."""
     task_info = ""
-    counterpart_name = "the other party"  # Default fallback
-    
     if task_context:
         task_info = f"\n[TASK]: {task_context.get('title', '')}\n[OBJECTIVE]: {task_context.get('objective', '')}"
     
     history_info = ""
     if conversation_history:
-        print(f"\n[coach_feedback] Full conversation history:\n{conversation_history}\n")
-        
-        # Try to extract counterpart name from conversation history
-        # Look for patterns like "Your counterpart is [Name], [Role]" in the text
-        
-        # First, search the entire conversation history for the pattern
-        import re
-        counterpart_match = re.search(r"[Yy]our counterpart is\s+(\w+)", conversation_history)
-        if counterpart_match:
-            counterpart_name = counterpart_match.group(1)
-            print(f"[coach_feedback] Found counterpart name via 'Your counterpart is' pattern: {counterpart_name}")
-        
-        # If not found, try to extract from lines starting with a name followed by colon
-        if counterpart_name == "the other party":
-            lines = conversation_history.split("\n")
-            print(f"[coach_feedback] Looking for NAME: pattern in {len(lines)} lines...")
-            for line in lines:
-                # Look for "NAME:" pattern (but not MANAGER, USER, COACH, SYSTEM, etc.)
-                match = re.match(r"^([A-Z][a-z]+):\s", line)
-                if match:
-                    name = match.group(1)
-                    # Skip generic role names
-                    if name not in ["Manager", "User", "Coach", "System"]:
-                        counterpart_name = name
-                        print(f"[coach_feedback] Found counterpart name via 'NAME:' pattern: {counterpart_name}")
-                        break
-        
-        if counterpart_name == "the other party":
-            print(f"[coach_feedback] No counterpart name found, using default: 'the other party'")
-        
+        logger.debug("[coach_feedback] Full conversation history:\n%s", conversation_history)
         history_info = f"\n[CONVERSATION SO FAR]\n{conversation_history}\n"
     
-    print(f"[coach_feedback] Final counterpart name: {counterpart_name}")
+    logger.debug("[coach_feedback] Final counterpart name: %s", counterpart_name)
     
     user_prompt = f"""
 {task_info}
@@ -115,9 +123,11 @@ Provide exactly 3 tips to help the user reflect on their next move. IMPORTANT: E
 Make tips specific to this scenario—reference {counterpart_name} by their actual name, and reference the actual topic being negotiated.
 Focus on practical actions the user can take in the next response.
 """
+    return user_prompt
 
-    raw_output = call_llm(SYSTEM_PROMPT, user_prompt)
 
+@PARSE_SECONDS.time(parser="parse_tips")
+def _parse_tips(raw_output: str) -> list[str]:
     # Parse bullets safely
     tips = []
     for line in raw_output.split("\n"):
@@ -127,10 +137,41 @@ Focus on practical actions the user can take in the next response.
     # Enforce exactly 3 tips
     return tips[:3]
 
-def generate_task_feedback(chat_history: list, task_title: str = "") -> dict:
+
+def _cached_tips(user_message: str, manager_reply: str, task_context: dict, counterpart_name: str):
+    """(cache, partition, turn vector, tips of a similar earlier turn or None); cache is None when disabled."""
+    cache = get_tip_cache()
+    if cache is None:
+        return None, None, None, None
+    partition = ((task_context or {}).get("title", ""), counterpart_name)
+    vector = turn_vector(user_message, manager_reply)
+    return cache, partition, vector, cache.lookup(*partition, vector)
+
+
+async def coach_feedback_async(
+    user_message: str,
+    manager_reply: str,
+    task_context: dict = None,
+    conversation_history: str = None,
+) -> list[str]:
     """
-    Use the LLM to analyze the chat history and provide outcome-based feedback and a grade (1-5).
+    Generate coach suggestions with optional task context and conversation history.
+    Tips of a near-identical earlier turn of the same task and counterpart are reused
+    without an LLM call (see llm/tip_cache.py).
     """
+    counterpart_name = _counterpart_name(conversation_history)
+    cache, partition, vector, tips = _cached_tips(user_message, manager_reply, task_context, counterpart_name)
+    if tips is not None:
+        return tips
+    user_prompt = _coach_prompt(user_message, manager_reply, task_context, conversation_history, counterpart_name)
+    raw_output = await call_llm_async(SYSTEM_PROMPT, user_prompt)
+    tips = _parse_tips(raw_output)
+    if cache is not None and len(tips) == 3:
+        cache.store(*partition, vector, tips)
+    return tips
+
+
+def _task_feedback_prompt(chat_history: list, task_title: str = "") -> str:
     history_text = "\n".join([
         f"{msg['sender'].capitalize()}: {msg['text']}" for msg in chat_history
     ])
@@ -142,9 +183,21 @@ Chat History:
 
 Provide outcome summary, feedback, one improvement, and a numeric grade (1-5) for negotiation performance. Format: Outcome Summary, Feedback, Actionable Improvement, Grade: <number>.
 """
-    raw = call_llm(FEEDBACK_PROMPT, user_prompt)
+    return user_prompt
+
+
+@PARSE_SECONDS.time(parser="parse_task_feedback")
+def _parse_task_feedback(raw: str) -> dict:
     # Extract grade from LLM output
     import re
     match = re.search(r"Grade[:\s]+(\d)", raw)
     grade = int(match.group(1)) if match else None
     return {"feedback": raw, "grade": grade}
+
+
+async def generate_task_feedback_async(chat_history: list, task_title: str = "") -> dict:
+    """
+    Use the LLM to analyze the chat history and provide outcome-based feedback and a grade (1-5).
+    """
+    raw = await call_llm_async(FEEDBACK_PROMPT, _task_feedback_prompt(chat_history, task_title))
+    return _parse_task_feedback(raw)
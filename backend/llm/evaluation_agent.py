@@ -1,4 +1,4 @@
-from llm.client import call_llm
+from llm.structured import call_structured_async, LEVELS
 
 # ANALYSIS TASK 
 ANALYSIS_EVALUATION_PROMPT = """
@@ -24,11 +24,8 @@ ASSESSMENT LEVELS:
 - weak: Incorrect but showed some analytical effort
 - minimal: Completely wrong or no real engagement
 
-IMPORTANT: You MUST return your response in EXACTLY this format (with the labels):
-CORRECTNESS_LEVEL: [excellent/good/acceptable/weak/minimal]
-FEEDBACK: [Your feedback paragraph here]
-
-Do not add any other text or explanation. Just these two lines.
+IMPORTANT: Respond with ONLY a JSON object with exactly these keys:
+{{"correctness_level": "excellent | good | acceptable | weak | minimal", "feedback": "Your feedback paragraph"}}
 
 {task_specific_context}
 
@@ -39,15 +36,11 @@ EVALUATION CRITERIA:
 - If the question asks to "identify an excuse", evaluate ONLY whether they identified an excuse
 """
 
-def evaluate_analysis(
-    question: str,
-    user_answer: str,
-    task_title: str = ""
-) -> dict:
-    """
-    Evaluate a student's analysis answer (for analysis tasks).
-    Returns: {correctness_level: str, feedback: str}
-    """
+ANALYSIS_SCHEMA = {"correctness_level": LEVELS, "feedback": str}
+
+def _analysis_prompts(inputs: dict) -> tuple:
+    """Build (system_prompt, user_prompt) for an analysis evaluation."""
+    task_title = inputs.get("task_title", "")
     # Determine task-specific context based on task title
     task_specific_context = ""
     
@@ -76,19 +69,16 @@ Do NOT evaluate based on whether something is an "excuse" - that's not what this
 Task: {task_title}
 
 Question:
-{question}
+{inputs.get("question", "")}
 
 Student's Answer:
-{user_answer}
+{inputs.get("response", "")}
 
 Evaluate this answer based ONLY on what the question asked for.
 """
     
     prompt = ANALYSIS_EVALUATION_PROMPT.format(task_specific_context=task_specific_context)
-    raw = call_llm(prompt, user_prompt)
-    result = parse_evaluation_response(raw)
-    
-    return result
+    return prompt, user_prompt
 
 
 # INTERPRETATION TASK 
@@ -122,37 +112,30 @@ Rules:
 - Celebrate genuine insights and guide them to deeper thinking
 - Coach message should NOT include generic greetings (no "Hi there") - that's added separately
 
-Output format (REQUIRED - MUST output all of these):
-INSIGHT_LEVEL: [excellent/good/acceptable/weak/minimal]
-COACH_MESSAGE: [1-2 sentence personal message about their learning]
-FEEDBACK: [Your thoughts on their interpretation]
-SUGGESTION: [A way to deepen or refine their thinking]
+Output format (REQUIRED): ONLY a JSON object with all of these keys:
+{
+  "insight_level": "excellent | good | acceptable | weak | minimal",
+  "coach_message": "1-2 sentence personal message about their learning",
+  "feedback": "Your thoughts on their interpretation",
+  "suggestion": "A way to deepen or refine their thinking"
+}
 """
 
-def evaluate_interpretation(
-    position: str,
-    user_answer: str,
-    task_title: str = ""
-) -> dict:
-    """
-    Evaluate a student's interpretation of position into interests.
-    Returns: {insight_level: str, coach_message: str, feedback: str, suggestion: str}
-    """
-    user_prompt = f"""
-Task: {task_title}
+INTERPRETATION_SCHEMA = {"insight_level": LEVELS, "coach_message": str, "feedback": str, "suggestion": str}
+
+def _interpretation_prompts(inputs: dict) -> tuple:
+    """Build (system_prompt, user_prompt) for an interpretation evaluation."""
+    return INTERPRETATION_EVALUATION_PROMPT, f"""
+Task: {inputs.get("task_title", "")}
 
 The position stated is:
-"{position}"
+"{inputs.get("position", "")}"
 
 Student's interpretation of underlying needs:
-"{user_answer}"
+"{inputs.get("response", "")}"
 
 Evaluate this interpretation. Does it show good understanding of human needs behind the position?
 """
-    raw = call_llm(INTERPRETATION_EVALUATION_PROMPT, user_prompt)
-    result = parse_interpretation_response(raw)
-    
-    return result
 
 
 # PLANNING TASK 
@@ -200,37 +183,34 @@ Rules:
 - Celebrate genuine strategic insight ONLY when truly earned
 - Coach message should NOT include generic greetings (no "Hi there") - that's added separately
 
-Output format:
-PLAN_QUALITY: [excellent/good/acceptable/weak/minimal]
-COACH_MESSAGE: [1-2 sentence personal message about their planning. Acknowledge their effort and focus on their learning.]
-STRENGTHS: [What shows good strategic thinking in your plan]
-GAPS: [What you could strengthen in your approach]
-SUGGESTED_REFINEMENT: [One specific way for you to strengthen your plan]
+Output format: ONLY a JSON object with all of these keys:
+{
+  "plan_quality": "excellent | good | acceptable | weak | minimal",
+  "coach_message": "1-2 sentence personal message about their planning. Acknowledge their effort and focus on their learning.",
+  "strengths": "What shows good strategic thinking in your plan",
+  "gaps": "What you could strengthen in your approach",
+  "suggested_refinement": "One specific way for you to strengthen your plan"
+}
 """
 
-def evaluate_plan(
-    scenario: str,
-    user_plan: str,
-    task_title: str = ""
-) -> dict:
-    """
-    Evaluate a student's planning answer.
-    Returns: {plan_quality: str, coach_message: str, strengths: str, gaps: str, suggested_refinement: str}
-    """
-    user_prompt = f"""
-Task: {task_title}
+PLAN_SCHEMA = {"plan_quality": LEVELS, "coach_message": str, "strengths": str, "gaps": str, "suggested_refinement": str}
+
+def _plan_prompts(inputs: dict) -> tuple:
+    """Build (system_prompt, user_prompt) for a planning evaluation."""
+    scenario = inputs.get("scenario", "")
+    if inputs.get("constraints"):
+        scenario = f"{scenario}\n\nConstraints: {inputs['constraints']}"
+    return PLANNING_EVALUATION_PROMPT, f"""
+Task: {inputs.get("task_title", "")}
 
 Scenario:
 {scenario}
 
 Student's Plan:
-{user_plan}
+{inputs.get("response", "")}
 
 Evaluate this plan for realism, specificity, and strength.
 """
-    raw = call_llm(PLANNING_EVALUATION_PROMPT, user_prompt)
-    result = parse_plan_response(raw)
-    return result
 
 
 # TECHNIQUE TASK
@@ -258,142 +238,123 @@ Rules:
 - For other techniques: evaluate if the response follows the technique rules
 - Coach message should NOT include generic greetings (no "Hi there") - that's added separately
 
-Output format:
-TECHNIQUE_QUALITY: [excellent/good/acceptable/weak/minimal]
-COACH_MESSAGE: [1-2 sentence personal message about your technique practice. Acknowledge what you're learning.]
-ANALYSIS: [Your analysis of how well you applied the technique]
-EXAMPLE: [If incorrect, provide a better example for you to learn from. If correct, show how you could deepen it.]
+Output format: ONLY a JSON object with all of these keys:
+{
+  "technique_quality": "excellent | good | acceptable | weak | minimal",
+  "coach_message": "1-2 sentence personal message about your technique practice. Acknowledge what you're learning.",
+  "analysis": "Your analysis of how well you applied the technique",
+  "example": "If incorrect, provide a better example for you to learn from. If correct, show how you could deepen it."
+}
 """
 
-def evaluate_technique(
-    technique_name: str,
-    instruction: str,
-    user_response: str,
-    other_person_statement: str,
-    task_title: str = ""
-) -> dict:
-    """
-    Evaluate if a student correctly applied a negotiation technique.
-    Returns: {technique_quality: str, coach_message: str, analysis: str, example: str}
-    """
-    user_prompt = f"""
-Task: {task_title}
+TECHNIQUE_SCHEMA = {"technique_quality": LEVELS, "coach_message": str, "analysis": str, "example": str}
+
+def _technique_prompts(inputs: dict) -> tuple:
+    """Build (system_prompt, user_prompt) for a technique evaluation."""
+    technique_name = inputs.get("technique_name", "")
+    return TECHNIQUE_EVALUATION_PROMPT, f"""
+Task: {inputs.get("task_title", "")}
 Technique: {technique_name}
 
 Instruction:
-{instruction}
+{inputs.get("instruction", "")}
 
 The other person said:
-"{other_person_statement}"
+"{inputs.get("other_person_statement", "")}"
 
 Student's response:
-"{user_response}"
+"{inputs.get("response", "")}"
 
 Evaluate if this response correctly applies the {technique_name} technique.
 """
-    raw = call_llm(TECHNIQUE_EVALUATION_PROMPT, user_prompt)
-    result = parse_technique_response(raw)
-    return result
-
-
-# PARSING HELPERS 
-def parse_evaluation_response(raw: str) -> dict:
-    """Parse analysis evaluation response."""
-    result = {
-        "correctness_level": "minimal",
-        "feedback": ""
-    }
-    
-    # Find the CORRECTNESS_LEVEL line
-    for line in raw.split("\n"):
-        if line.startswith("CORRECTNESS_LEVEL:"):
-            level = line.replace("CORRECTNESS_LEVEL:", "").strip().lower()
-            if level in ["excellent", "good", "acceptable", "weak", "minimal"]:
-                result["correctness_level"] = level
-            break
-    
-    feedback_start = raw.find("FEEDBACK:")
-    
-    if feedback_start != -1:
-        feedback_text = raw[feedback_start + len("FEEDBACK:"):].strip()
-        result["feedback"] = feedback_text.strip()
-    
-    return result
 
 
-def parse_interpretation_response(raw: str) -> dict:
-    """Parse interpretation evaluation response."""
-    result = {
-        "insight_level": "minimal",
-        "coach_message": "",
-        "feedback": "",
-        "suggestion": ""
-    }
-    
-    lines = raw.split("\n")
-    for line in lines:
-        if line.startswith("INSIGHT_LEVEL:"):
-            level = line.replace("INSIGHT_LEVEL:", "").strip().lower()
-            if level in ["excellent", "good", "acceptable", "weak", "minimal"]:
-                result["insight_level"] = level
-        elif line.startswith("COACH_MESSAGE:"):
-            result["coach_message"] = line.replace("COACH_MESSAGE:", "").strip()
-        elif line.startswith("FEEDBACK:"):
-            result["feedback"] = line.replace("FEEDBACK:", "").strip()
-        elif line.startswith("SUGGESTION:"):
-            result["suggestion"] = line.replace("SUGGESTION:", "").strip()
-    
-    return result
-
-
-def parse_plan_response(raw: str) -> dict:
-    """Parse planning evaluation response."""
-    result = {
-        "plan_quality": "minimal",
-        "coach_message": "",
-        "strengths": "",
-        "gaps": "",
-        "suggested_refinement": ""
-    }
-    
-    lines = raw.split("\n")
-    for line in lines:
-        if line.startswith("PLAN_QUALITY:"):
-            quality = line.replace("PLAN_QUALITY:", "").strip().lower()
-            if quality in ["excellent", "good", "acceptable", "weak", "minimal"]:
-                result["plan_quality"] = quality
-        elif line.startswith("COACH_MESSAGE:"):
-            result["coach_message"] = line.replace("COACH_MESSAGE:", "").strip()
-        elif line.startswith("STRENGTHS:"):
-            result["strengths"] = line.replace("STRENGTHS:", "").strip()
-        elif line.startswith("GAPS:"):
-            result["gaps"] = line.replace("GAPS:", "").strip()
-        elif line.startswith("SUGGESTED_REFINEMENT:"):
-            result["suggested_refinement"] = line.replace("SUGGESTED_REFINEMENT:", "").strip()
-    
-    return result
+# RUBRICS
+# Grade given for each assessment level (backend-controlled, not left to the LLM)
+LEVEL_GRADES = {"excellent": 5, "good": 4, "acceptable": 3, "weak": 2, "minimal": 1}
 
 
-def parse_technique_response(raw: str) -> dict:
-    """Parse technique evaluation response."""
-    result = {
-        "technique_quality": "minimal",
-        "coach_message": "",
-        "analysis": "",
-        "example": ""
-    }
-    
-    lines = raw.split("\n")
-    for line in lines:
-        if line.startswith("TECHNIQUE_QUALITY:"):
-            quality = line.replace("TECHNIQUE_QUALITY:", "").strip().lower()
-            if quality in ["excellent", "good", "acceptable", "weak", "minimal"]:
-                result["technique_quality"] = quality
-        elif line.startswith("COACH_MESSAGE:"):
-            result["coach_message"] = line.replace("COACH_MESSAGE:", "").strip()
-        elif line.startswith("ANALYSIS:"):
-            result["analysis"] = line.replace("ANALYSIS:", "").strip()
-        elif line.startswith("EXAMPLE:"):
-            result["example"] = line.replace("EXAMPLE:", "").strip()
-    
-    return result
+class Rubric:
+    """
+    How one task type is graded: a prompt builder taking the request fields, the reply
+    schema, the schema field holding the assessment level and its level -> grade map,
+    and the (field, label) sections the learner-facing feedback text is assembled from.
+    """
+
+    def __init__(
+        self,
+        build_prompts,
+        schema: dict,
+        level_field: str,
+        feedback_sections: list,
+        empty_feedback: str = "",
+        grade_map: dict = LEVEL_GRADES,
+    ):
+        self.build_prompts = build_prompts
+        self.schema = schema
+        self.level_field = level_field
+        self.feedback_sections = feedback_sections
+        self.empty_feedback = empty_feedback
+        self.grade_map = grade_map
+        # Unusable replies get the lowest level and empty text
+        self.defaults = {field: "" for field in schema}
+        self.defaults[level_field] = min(grade_map, key=grade_map.get)
+
+
+# task type -> rubric; adding a task type only needs an entry here
+RUBRICS = {
+    "analysis": Rubric(
+        _analysis_prompts, ANALYSIS_SCHEMA, "correctness_level",
+        feedback_sections=[("feedback", None)],
+    ),
+    "interpretation": Rubric(
+        _interpretation_prompts, INTERPRETATION_SCHEMA, "insight_level",
+        feedback_sections=[("coach_message", "Coach"), ("feedback", "Feedback"), ("suggestion", "Suggestion")],
+        empty_feedback="Interpretation evaluation complete.",
+    ),
+    "planning": Rubric(
+        _plan_prompts, PLAN_SCHEMA, "plan_quality",
+        feedback_sections=[
+            ("coach_message", "Coach"), ("strengths", "Strengths"),
+            ("gaps", "Areas for Improvement"), ("suggested_refinement", "Suggested Refinement"),
+        ],
+        empty_feedback="Plan evaluation complete.",
+    ),
+    "technique": Rubric(
+        _technique_prompts, TECHNIQUE_SCHEMA, "technique_quality",
+        feedback_sections=[("coach_message", "Coach"), ("analysis", "Analysis"), ("example", "Example")],
+        empty_feedback="Technique evaluation complete.",
+    ),
+}
+
+
+async def run_rubric_async(task_type: str, inputs: dict) -> dict:
+    """Ask the LLM to assess a response with the task type's rubric. Returns the reply fields."""
+    rubric = RUBRICS[task_type]
+    prompt, user_prompt = rubric.build_prompts(inputs)
+    return await call_structured_async(
+        prompt, user_prompt, rubric.schema, f"evaluate_{task_type}", rubric.defaults, caller=f"{__name__}.{task_type}"
+    )
+
+
+def grade_result(task_type: str, result: dict) -> dict:
+    """
+    Turn the rubric's reply fields into the API result: the level, its grade, the
+    assembled feedback text and the remaining reply fields.
+    """
+    rubric = RUBRICS[task_type]
+    level = result.get(rubric.level_field, "").lower()
+    if level not in rubric.grade_map:
+        level = rubric.defaults[rubric.level_field]
+    feedback_parts = [
+        f"{label}: {result[field]}" if label else result[field]
+        for field, label in rubric.feedback_sections
+        if result.get(field)
+    ]
+    graded = {field: value for field, value in result.items() if field in rubric.schema}
+    graded.update({
+        rubric.level_field: level,
+        "grade": rubric.grade_map[level],
+        "feedback": "\n\n".join(feedback_parts) if feedback_parts else rubric.empty_feedback,
+    })
+    return graded
@@ -1,5 +1,9 @@
-from llm.client import call_llm
+from llm.client import call_llm_async, stream_llm_async
 import re
+import logging
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
 
 # Comprehensive agreement signal patterns
 AGREEMENT_PATTERNS = [
@@ -44,18 +48,62 @@ AGREEMENT_PATTERNS = [
     r"\blet['']?s\s+make\s+it\s+official\b",
 ]
 
+def _compile_agreement_matcher(patterns: list) -> tuple:
+    """
+    Compile the patterns into one regex, one named group per rule, so a message is
+    checked in a single scan instead of one search per pattern.
+    The leading word boundary is factored out and rules are grouped by their first
+    letter, so the engine only tries the rules that can start at each position.
+    Returns (regex, {group name: pattern}).
+    """
+    rules = {}
+    by_first_char = {}
+    for i, pattern in enumerate(patterns):
+        body = pattern[2:] if pattern.startswith(r"\b") else pattern
+        first_char = body.lstrip("^")[:1]
+        if not first_char.isalpha():
+            raise ValueError(f"Agreement pattern must start with \\b or ^ and a letter: {pattern}")
+        name = f"rule{i}"
+        rules[name] = pattern
+        by_first_char.setdefault(first_char, []).append(f"(?P<{name}>{body})")
+
+    branches = "|".join(f"(?={char})(?:{'|'.join(alts)})" for char, alts in by_first_char.items())
+    regex = re.compile(f"(?=[{''.join(by_first_char)}])\\b(?:{branches})")
+    return regex, rules
+
+
+_AGREEMENT_REGEX, _AGREEMENT_RULES = _compile_agreement_matcher(AGREEMENT_PATTERNS)
+
+
+def match_agreement(user_message: str) -> Optional[str]:
+    """
+    Return the AGREEMENT_PATTERNS rule found in a message, or None.
+    When several rules apply, the one matching earliest in the message is returned.
+    """
+    match = _AGREEMENT_REGEX.search(user_message.lower().strip())
+    return _AGREEMENT_RULES[match.lastgroup] if match else None
+
+
+def classify_agreements(messages: Iterable[str]) -> list:
+    """Bulk form of match_agreement for analytics: the matched rule (or None) per message."""
+    search = _AGREEMENT_REGEX.search
+    results = []
+    for message in messages:
+        match = search(message.lower().strip())
+        results.append(_AGREEMENT_RULES[match.lastgroup] if match else None)
+    return results
+
+
 def detect_agreement(user_message: str) -> bool:
     """
     Detect if the user has explicitly agreed to end the negotiation.
     Returns True if agreement is detected, False otherwise.
     """
-    message_lower = user_message.lower().strip()
-    
-    for pattern in AGREEMENT_PATTERNS:
-        if re.search(pattern, message_lower):
-            print(f"[Agreement Detected] Pattern matched: {pattern}")
-            print(f"[Agreement Detected] User message: {message_lower}")
-            return True
+    pattern = match_agreement(user_message)
+    if pattern:
+        logger.debug("[Agreement Detected] Pattern matched: %s", pattern)
+        logger.debug("[Agreement Detected] User message: %s", user_message.lower().strip())
+        return True
     
     return False
 
@@ -310,21 +358,12 @@ Rules:
 - Output only the scenario, no instructions or extra text.
 """
 
-def manager_reply(
+def _manager_prompts(
     user_message: str,
     task_context: dict = None,
     conversation_history: str = None,
-) -> str:
-    """
-    Generate manager response with optional task context and conversation history.
-    IMPORTANT: Checks for agreement FIRST before calling LLM.
-    """
-    # Check if user has explicitly agreed
-    if detect_agreement(user_message):
-        print(f"[manager_reply] AGREEMENT DETECTED - returning closing response")
-        return get_closing_response(task_context)
-    
-    # No agreement detected, proceed with normal negotiation response
+) -> tuple:
+    """Build (system_prompt, user_prompt) for a manager reply."""
     system_prompt = get_system_prompt(task_context)
     
     task_info = ""
@@ -358,13 +397,46 @@ def manager_reply(
 
 CRITICAL: Do NOT repeat or echo the user's message. Respond ONLY as your character would naturally respond. Output ONLY your direct reply.
 """
-    return call_llm(system_prompt, user_prompt)
+    return system_prompt, user_prompt
+
 
-def generate_scenario_example(task_title: str, coach_summary: str = "") -> str:
+async def manager_reply_async(
+    user_message: str,
+    task_context: dict = None,
+    conversation_history: str = None,
+) -> str:
     """
-    Generate a scenario example for the given task using the LLM.
+    Generate manager response with optional task context and conversation history.
+    IMPORTANT: Checks for agreement FIRST before calling LLM.
     """
-    user_prompt = f"""
+    # Check if user has explicitly agreed
+    if detect_agreement(user_message):
+        logger.info("[manager_reply] AGREEMENT DETECTED - returning closing response")
+        return get_closing_response(task_context)
+
+    # No agreement detected, proceed with normal negotiation response
+    system_prompt, user_prompt = _manager_prompts(user_message, task_context, conversation_history)
+    return await call_llm_async(system_prompt, user_prompt)
+
+
+async def manager_reply_stream(
+    user_message: str,
+    task_context: dict = None,
+    conversation_history: str = None,
+):
+    """Streaming version of manager_reply_async: yields the reply text in chunks as the LLM produces it."""
+    if detect_agreement(user_message):
+        logger.info("[manager_reply] AGREEMENT DETECTED - returning closing response")
+        yield get_closing_response(task_context)
+        return
+
+    system_prompt, user_prompt = _manager_prompts(user_message, task_context, conversation_history)
+    async for delta in stream_llm_async(system_prompt, user_prompt):
+        yield delta
+
+
+def _scenario_prompt(task_title: str, coach_summary: str = "") -> str:
+    return f"""
 Task Title: {task_title}
 Task Objective: {coach_summary}
 
@@ -373,4 +445,10 @@ Generate a realistic scenario example for this negotiation skill task. Format:
 - Your counterpart is [Name], [Role].
 - [Counterpart's opening line for the user to respond to.]
 """
-    return call_llm(SCENARIO_PROMPT, user_prompt)
+
+
+async def generate_scenario_example_async(task_title: str, coach_summary: str = "") -> str:
+    """
+    Generate a scenario example for the given task using the LLM.
+    """
+    return await call_llm_async(SCENARIO_PROMPT, _scenario_prompt(task_title, coach_summary), cache=True)
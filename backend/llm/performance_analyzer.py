@@ -1,60 +1,178 @@
 """
 Performance analyzer for adaptive difficulty.
 Tracks grades and feedback to adjust task difficulty for better learning.
+Each session keeps running statistics (PerformanceStats) over the grades of its completed
+tasks; record_grade updates them whenever a task's grade or completion changes, so
+reading the history does not scan the timeline.
 """
 
+import json
+import logging
+from datetime import datetime
+
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
-from models import TimelineItem
+from models import TimelineItem, PerformanceStats
 from typing import Optional, Tuple
 
+logger = logging.getLogger(__name__)
+
+# Grades kept in the recent-grades ring buffer of PerformanceStats
+RECENT_GRADES = 5
+# Compare-and-set attempts when concurrent requests update the same session's statistics
+STATS_UPDATE_ATTEMPTS = 5
+
+
+def _graded_rows(db: Session, session_id: str) -> list:
+    """(task_id, grade) of the session's completed, graded tasks, oldest first."""
+    return (
+        db.query(TimelineItem.id, TimelineItem.grade)
+        .filter(
+            TimelineItem.session_id == session_id,
+            TimelineItem.status == "completed",
+            TimelineItem.grade.isnot(None),
+        )
+        .order_by(TimelineItem.id)
+        .all()
+    )
+
+
+def _stats_values(session_id: str, rows: list) -> dict:
+    grades = [grade for _, grade in rows]
+    return {
+        "session_id": session_id,
+        "grade_count": len(grades),
+        "grade_sum": sum(grades),
+        "grade_sumsq": sum(g * g for g in grades),
+        "recent_grades": _recent_from_rows(rows),
+        "updated_at": datetime.utcnow(),
+    }
+
+
+def _recent_from_rows(rows: list) -> str:
+    return json.dumps([[task_id, grade] for task_id, grade in reversed(rows[-RECENT_GRADES:])])
+
+
+def _insert_stats(db: Session, values: dict) -> bool:
+    """Insert a session's PerformanceStats unless another request already did. Returns whether it was inserted."""
+    insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    statement = insert(PerformanceStats).values(**values).on_conflict_do_nothing(index_elements=["session_id"])
+    return db.execute(statement).rowcount == 1
+
+
+def counted_grade(task: TimelineItem) -> Optional[int]:
+    """The grade a task contributes to its session's statistics: its grade once completed, else None."""
+    return task.grade if task.status == "completed" else None
+
+
+def _updated_recent(db: Session, task: TimelineItem, recent: list, old_grade: Optional[int], new_grade: Optional[int]) -> str:
+    entry = next((entry for entry in recent if entry[0] == task.id), None)
+    if new_grade is None:
+        if entry is None:
+            return json.dumps(recent)
+        # No longer counted: refill the ring from the stored rows
+        return _recent_from_rows(_graded_rows(db, task.session_id))
+    if entry is not None:
+        entry[1] = new_grade  # a regrade keeps the task's place among the recent grades
+    elif old_grade is None:
+        recent = [[task.id, new_grade]] + recent[:RECENT_GRADES - 1]
+    return json.dumps(recent)
+
+
+def record_grade(db: Session, task: TimelineItem, old_grade: Optional[int]) -> None:
+    """
+    Fold a change of task's counted grade into the session's running statistics (caller commits).
+    old_grade is counted_grade(task) taken before the task's grade or status was changed;
+    call this after changing them.
+    Safe against concurrent updates: the row is created with an insert that ignores
+    conflicts, and counters are incremented in SQL with the recent-grades ring as a
+    compare-and-set guard.
+    """
+    new_grade = counted_grade(task)
+    if new_grade == old_grade:
+        return
+    session_id = task.session_id
+    db.flush()  # the queries below must see the change
+
+    exists = db.query(PerformanceStats.session_id).filter(PerformanceStats.session_id == session_id).first()
+    # First change since the record was introduced: start from the stored rows, which include this one
+    if exists is None and _insert_stats(db, _stats_values(session_id, _graded_rows(db, session_id))):
+        return
+
+    for _ in range(STATS_UPDATE_ATTEMPTS):
+        recent_json = (
+            db.query(PerformanceStats.recent_grades).filter(PerformanceStats.session_id == session_id).scalar()
+        )
+        result = db.execute(
+            update(PerformanceStats)
+            .where(PerformanceStats.session_id == session_id, PerformanceStats.recent_grades == recent_json)
+            .values(
+                grade_count=PerformanceStats.grade_count + (new_grade is not None) - (old_grade is not None),
+                grade_sum=PerformanceStats.grade_sum + (new_grade or 0) - (old_grade or 0),
+                grade_sumsq=PerformanceStats.grade_sumsq + (new_grade or 0) ** 2 - (old_grade or 0) ** 2,
+                recent_grades=_updated_recent(db, task, json.loads(recent_json or "[]"), old_grade, new_grade),
+                updated_at=datetime.utcnow(),
+            )
+        )
+        if result.rowcount:
+            return
+    logger.warning("[performance] Could not update grade statistics of session %s; run manage.py rebuild-stats", session_id)
+
+
+def rebuild_performance_stats(db: Session) -> int:
+    """Recompute every session's PerformanceStats from the timeline. Returns the number of sessions."""
+    rows_by_session = {}
+    for session_id, task_id, grade in (
+        db.query(TimelineItem.session_id, TimelineItem.id, TimelineItem.grade)
+        .filter(TimelineItem.status == "completed", TimelineItem.grade.isnot(None))
+        .order_by(TimelineItem.session_id, TimelineItem.id)
+    ):
+        rows_by_session.setdefault(session_id, []).append((task_id, grade))
+
+    db.query(PerformanceStats).delete()
+    db.add_all(PerformanceStats(**_stats_values(session_id, rows)) for session_id, rows in rows_by_session.items())
+    db.commit()
+    return len(rows_by_session)
+
 
 def get_performance_history(session_id: str, db: Session) -> dict:
     """
-    Analyze performance history for a session.
+    Performance history for a session, read from its running statistics.
     Returns: {
         avg_grade: float (0-5),
         recent_grades: list of last 5 grades,
-        feedback_themes: str (summary of common issues),
-        consistency: str ('high' | 'medium' | 'low')
+        std_dev: float (over all grades),
+        consistency: str ('high' | 'medium' | 'low'),
+        total_completed: int
     }
     """
-    # Get all completed tasks with grades
-    completed_tasks = (
-        db.query(TimelineItem)
-        .filter(
-            TimelineItem.session_id == session_id,
-            TimelineItem.status == "completed",
-            TimelineItem.grade.isnot(None)
-        )
-        .order_by(TimelineItem.created_at.desc())
-        .all()
-    )
+    stats = db.query(PerformanceStats).filter(PerformanceStats.session_id == session_id).first()
+    if stats is None:
+        # Not graded since the record was introduced (or not rebuilt yet)
+        stats = PerformanceStats(**_stats_values(session_id, _graded_rows(db, session_id)))
 
-    if not completed_tasks:
+    if not stats.grade_count:
         return {
             "avg_grade": None,
             "recent_grades": [],
-            "feedback_themes": None,
+            "std_dev": None,
             "consistency": None,
             "total_completed": 0
         }
 
-    # Calculate average and recent grades
-    grades = [t.grade for t in completed_tasks]
-    recent_grades = grades[:5]  
-    avg_grade = sum(grades) / len(grades)
-
-    # Collect feedback text from last 5 tasks
-    feedback_texts = [t.feedback for t in completed_tasks[:5] if t.feedback]
-    feedback_summary = " ".join(feedback_texts) if feedback_texts else None
+    count = stats.grade_count
+    avg_grade = stats.grade_sum / count
+    std_dev = max(stats.grade_sumsq / count - avg_grade ** 2, 0) ** 0.5
+    recent_grades = [grade for _, grade in json.loads(stats.recent_grades or "[]")]
 
-    # Calculate consistency 
+    # Consistency: spread of the recent grades around the overall average
     if len(recent_grades) > 1:
         variance = sum((g - avg_grade) ** 2 for g in recent_grades) / len(recent_grades)
-        std_dev = variance ** 0.5
-        if std_dev < 0.8:
+        recent_std_dev = variance ** 0.5
+        if recent_std_dev < 0.8:
             consistency = "high"
-        elif std_dev < 1.5:
+        elif recent_std_dev < 1.5:
             consistency = "medium"
         else:
             consistency = "low"
@@ -64,9 +182,9 @@ def get_performance_history(session_id: str, db: Session) -> dict:
     return {
         "avg_grade": avg_grade,
         "recent_grades": recent_grades,
-        "feedback_themes": feedback_summary,
+        "std_dev": std_dev,
         "consistency": consistency,
-        "total_completed": len(grades)
+        "total_completed": count
     }
 
 
@@ -143,22 +261,35 @@ def adjust_difficulty_string(original_difficulty: str, adjustment: str) -> str:
     return original_difficulty
 
 
-def create_difficulty_context(session_id: str, db: Session) -> str:
-    """
-    Create a prompt context string that informs task generation about
-    the user's performance level and what kind of task to generate.
-    
-    Returns: A string to be added to the task generation prompt
-    """
-    performance = get_performance_history(session_id, db)
+# Performance bands used to share pre-generated task content between sessions.
+# "new" means no graded history yet (empty difficulty context).
+PERFORMANCE_BANDS = ("new", "same", "harder", "easier")
+
+# Representative average grade per band, used when generating content for a band
+# rather than for one specific learner
+BAND_REPRESENTATIVE_GRADES = {"same": 3.5, "harder": 4.5, "easier": 2.0}
+
 
+def get_performance_band(performance: dict) -> str:
+    """Map a performance history to one of PERFORMANCE_BANDS."""
     if not performance.get("total_completed"):
-        return ""  # Not enough data yet, return empty string
+        return "new"
+    adjustment, _ = calculate_difficulty_adjustment(performance)
+    return adjustment
 
-    adjustment, reason = calculate_difficulty_adjustment(performance)
-    avg_grade = performance.get("avg_grade")
 
-    if adjustment == "harder":
+def difficulty_context_for_band(band: str, avg_grade: Optional[float] = None) -> str:
+    """
+    Build the task generation prompt context for a performance band.
+    Returns an empty string for the "new" band.
+    """
+    if band == "new":
+        return ""
+
+    if avg_grade is None:
+        avg_grade = BAND_REPRESENTATIVE_GRADES.get(band, 3.5)
+
+    if band == "harder":
         return f"""
 USER PERFORMANCE CONTEXT: High Achiever (Avg Grade: {avg_grade:.1f}/5)
 - User is consistently performing very well
@@ -171,7 +302,7 @@ USER PERFORMANCE CONTEXT: High Achiever (Avg Grade: {avg_grade:.1f}/5)
   * Make information asymmetry realistic
 """
 
-    elif adjustment == "easier":
+    elif band == "easier":
         return f"""
 USER PERFORMANCE CONTEXT: Needs Practice (Avg Grade: {avg_grade:.1f}/5)
 - User is still developing foundational skills
@@ -195,3 +326,15 @@ USER PERFORMANCE CONTEXT: In Learning Zone (Avg Grade: {avg_grade:.1f}/5)
   * Realistic but not overwhelming
   * Opportunity to practice multiple skills
 """
+
+
+def create_difficulty_context(session_id: str, db: Session) -> str:
+    """
+    Create a prompt context string that informs task generation about
+    the user's performance level and what kind of task to generate.
+    
+    Returns: A string to be added to the task generation prompt
+    """
+    performance = get_performance_history(session_id, db)
+    band = get_performance_band(performance)
+    return difficulty_context_for_band(band, performance.get("avg_grade"))
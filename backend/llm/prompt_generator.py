@@ -1,4 +1,7 @@
-from llm.client import call_llm
+from llm.structured import call_structured_async
+import logging
+
+logger = logging.getLogger(__name__)
 
 # ANALYSIS TASK PROMPTS 
 GENERATE_ANALYSIS_PROMPT = """
@@ -12,43 +15,49 @@ Based on the task title, objective, and user performance level, generate:
 
 Keep the transcript realistic and concise.
 
-Output format:
-TRANSCRIPT:
-[The dialogue or text]
+Output format: ONLY a JSON object with these keys:
+{{"transcript": "The dialogue or text", "question": "What should the student identify or mark?"}}
+"""
+
+ANALYSIS_SCHEMA = {"transcript": str, "question": str}
+
+
+def _analysis_task_prompts(task_title: str, task_objective: str, performance_context: str) -> tuple:
+    user_prompt = f"""
+Task Title: {task_title}
+Task Objective: {task_objective}
 
-QUESTION:
-[What should the student identify or mark?]
+Generate a realistic analysis exercise for this task.
 """
+    prompt = GENERATE_ANALYSIS_PROMPT.format(performance_context=performance_context or "")
+    return prompt, user_prompt
+
+
+def _analysis_task_fallback(task_title: str) -> dict:
+    return {
+        "transcript": f"Conversation about {task_title}:\n\nPerson A: I have a proposal I'd like to discuss.\n\nPerson B: That sounds interesting, but I'm not sure we have time right now.\n\nPerson A: I understand, but this is quite important.",
+        "question": "Identify one statement or reason that indicates a position rather than the underlying interest."
+    }
+
 
-def generate_analysis_task(task_title: str, task_objective: str, performance_context: str = "") -> dict:
+async def generate_analysis_task_async(task_title: str, task_objective: str, performance_context: str = "", use_fallback: bool = True) -> dict:
     """
     Generate content for an analysis task.
     Args:
         task_title: Title of the task
         task_objective: Learning objective
         performance_context: Performance data to adjust complexity (optional)
+        use_fallback: Return fallback content when the LLM fails (otherwise {})
     Returns: {transcript: str, question: str}
     """
-    user_prompt = f"""
-Task Title: {task_title}
-Task Objective: {task_objective}
-
-Generate a realistic analysis exercise for this task.
-"""
     try:
-        prompt = GENERATE_ANALYSIS_PROMPT.format(performance_context=performance_context or "")
-        raw = call_llm(prompt, user_prompt)
-        result = parse_task_response(raw)
-        if result and "transcript" in result and "question" in result:
+        prompt, user_prompt = _analysis_task_prompts(task_title, task_objective, performance_context)
+        result = await call_structured_async(prompt, user_prompt, ANALYSIS_SCHEMA, "analysis_task")
+        if result:
             return result
     except Exception as e:
-        print(f"[generate_analysis_task] LLM error: {e}")
-    
-    # Fallback content
-    return {
-        "transcript": f"Conversation about {task_title}:\n\nPerson A: I have a proposal I'd like to discuss.\n\nPerson B: That sounds interesting, but I'm not sure we have time right now.\n\nPerson A: I understand, but this is quite important.",
-        "question": "Identify one statement or reason that indicates a position rather than the underlying interest."
-    }
+        logger.error("[generate_analysis_task_async] LLM error: %s", e)
+    return _analysis_task_fallback(task_title) if use_fallback else {}
 
 
 # INTERPRETATION TASK PROMPTS 
@@ -63,43 +72,49 @@ The statement should be realistic and clearly express a position without showing
 
 {performance_context}
 
-Output format:
-STATEMENT:
-[The position/statement]
+Output format: ONLY a JSON object with these keys:
+{{"statement": "The position/statement", "instruction": "What the student should do - identify hidden needs"}}
+"""
+
+INTERPRETATION_SCHEMA = {"statement": str, "instruction": str}
 
-INSTRUCTION:
-[What the student should do - identify hidden needs]
+
+def _interpretation_task_prompts(task_title: str, task_objective: str, performance_context: str) -> tuple:
+    user_prompt = f"""
+Task Title: {task_title}
+Task Objective: {task_objective}
+
+Generate an interpretation exercise asking students to identify hidden needs behind a position.
 """
+    prompt = GENERATE_INTERPRETATION_PROMPT.format(performance_context=performance_context or "")
+    return prompt, user_prompt
+
 
-def generate_interpretation_task(task_title: str, task_objective: str, performance_context: str = "") -> dict:
+def _interpretation_task_fallback(task_title: str) -> dict:
+    return {
+        "statement": f"I absolutely refuse to {task_title.lower() if 'refuse' in task_title.lower() else 'work on weekends'}. That's non-negotiable.",
+        "instruction": "What do you think is the underlying need or concern behind this statement? What might the person actually care about?"
+    }
+
+
+async def generate_interpretation_task_async(task_title: str, task_objective: str, performance_context: str = "", use_fallback: bool = True) -> dict:
     """
     Generate content for an interpretation task.
     Args:
         task_title: Title of the task
         task_objective: Learning objective
         performance_context: Performance data to adjust complexity (optional)
+        use_fallback: Return fallback content when the LLM fails (otherwise {})
     Returns: {statement: str, instruction: str}
     """
-    user_prompt = f"""
-Task Title: {task_title}
-Task Objective: {task_objective}
-
-Generate an interpretation exercise asking students to identify hidden needs behind a position.
-"""
     try:
-        prompt = GENERATE_INTERPRETATION_PROMPT.format(performance_context=performance_context or "")
-        raw = call_llm(prompt, user_prompt)
-        result = parse_task_response(raw)
-        if result and "statement" in result and "instruction" in result:
+        prompt, user_prompt = _interpretation_task_prompts(task_title, task_objective, performance_context)
+        result = await call_structured_async(prompt, user_prompt, INTERPRETATION_SCHEMA, "interpretation_task")
+        if result:
             return result
     except Exception as e:
-        print(f"[generate_interpretation_task] LLM error: {e}")
-    
-    # Fallback content
-    return {
-        "statement": f"I absolutely refuse to {task_title.lower() if 'refuse' in task_title.lower() else 'work on weekends'}. That's non-negotiable.",
-        "instruction": "What do you think is the underlying need or concern behind this statement? What might the person actually care about?"
-    }
+        logger.error("[generate_interpretation_task_async] LLM error: %s", e)
+    return _interpretation_task_fallback(task_title) if use_fallback else {}
 
 
 # PLANNING TASK PROMPTS
@@ -117,15 +132,12 @@ Keep scenarios concrete and relatable - use real job titles, realistic numbers,
 
 {performance_context}
 
-CRITICAL: Output EXACTLY in this format with NO extra text:
-SCENARIO:
-[2-3 sentences describing the specific negotiation situation]
-
-CONSTRAINTS:
-[2-3 realistic constraints or challenges they face]
-
-INSTRUCTION:
-[Clear instruction on developing a BATNA - what they'll do if negotiation fails]
+CRITICAL: Output ONLY a JSON object with these keys and NO extra text:
+{{
+  "scenario": "2-3 sentences describing the specific negotiation situation",
+  "constraints": "2-3 realistic constraints or challenges they face",
+  "instruction": "Clear instruction on developing a BATNA - what they'll do if negotiation fails"
+}}
 """
 
 GENERATE_LOGROLLING_PROMPT = """
@@ -142,26 +154,19 @@ Keep scenarios realistic with 3-4 negotiable issues.
 
 {performance_context}
 
-CRITICAL: Output EXACTLY in this format with NO extra text:
-SCENARIO:
-[2-3 sentences describing negotiation with multiple issues at stake]
+CRITICAL: Output ONLY a JSON object with these keys and NO extra text:
+{{
+  "scenario": "2-3 sentences describing negotiation with multiple issues at stake",
+  "constraints": "What each party cares about most/least - show conflicting priorities",
+  "instruction": "Clear instruction to identify what you'll concede to gain what you want"
+}}
+"""
 
-CONSTRAINTS:
-[What each party cares about most/least - show conflicting priorities]
+PLANNING_SCHEMA = {"scenario": str, "constraints": str, "instruction": str}
 
-INSTRUCTION:
-[Clear instruction to identify what you'll concede to gain what you want]
-"""
 
-def generate_planning_task(task_title: str, task_objective: str, performance_context: str = "") -> dict:
-    """
-    Generate content for a planning task.
-    Args:
-        task_title: Title of the task
-        task_objective: Learning objective
-        performance_context: Performance data to adjust complexity (optional)
-    Returns: {scenario: str, constraints: str, instruction: str}
-    """
+def _planning_task_prompts(task_title: str, task_objective: str, performance_context: str) -> tuple:
+    """Pick the planning template from the task title. Returns (prompt, user_prompt, task_type)."""
     # Determine task type from title
     title_lower = task_title.lower()
     if "batna" in title_lower:
@@ -192,25 +197,13 @@ Task Objective: {task_objective}
 
 Generate a realistic planning exercise for negotiation preparation.
 """
-    
-    try:
-        prompt = prompt_template.format(performance_context=performance_context or "")
-        raw = call_llm(prompt, user_prompt)
-        print(f"[generate_planning_task] Task type: {task_type}")
-        print(f"[generate_planning_task] LLM raw response:\n{raw}")
-        result = parse_task_response(raw)
-        print(f"[generate_planning_task] Parsed result: {result}")
-        if result and "scenario" in result and "constraints" in result and "instruction" in result:
-            return result
-        else:
-            print(f"[generate_planning_task] Missing keys in result. Got keys: {list(result.keys())}")
-    except Exception as e:
-        print(f"[generate_planning_task] LLM error: {e}")
-        import traceback
-        traceback.print_exc()
-    
+    prompt = prompt_template.format(performance_context=performance_context or "")
+    return prompt, user_prompt, task_type
+
+
+def _planning_task_fallback(task_title: str) -> dict:
     # Fallback content - task-specific
-    print("[generate_planning_task] Using fallback content")
+    logger.warning("[generate_planning_task] Using fallback content")
     if "log-rolling" in task_title.lower() or "value creation" in task_title.lower():
         return {
             "scenario": "You're negotiating a new job offer. There are 4 issues on the table: base salary, signing bonus, vacation days, and remote work days per week.",
@@ -225,6 +218,27 @@ Generate a realistic planning exercise for negotiation preparation.
         }
 
 
+async def generate_planning_task_async(task_title: str, task_objective: str, performance_context: str = "", use_fallback: bool = True) -> dict:
+    """
+    Generate content for a planning task.
+    Args:
+        task_title: Title of the task
+        task_objective: Learning objective
+        performance_context: Performance data to adjust complexity (optional)
+        use_fallback: Return fallback content when the LLM fails (otherwise {})
+    Returns: {scenario: str, constraints: str, instruction: str}
+    """
+    try:
+        prompt, user_prompt, task_type = _planning_task_prompts(task_title, task_objective, performance_context)
+        logger.debug("[generate_planning_task_async] Task type: %s", task_type)
+        result = await call_structured_async(prompt, user_prompt, PLANNING_SCHEMA, "planning_task")
+        if result:
+            return result
+    except Exception:
+        logger.exception("[generate_planning_task_async] LLM error")
+    return _planning_task_fallback(task_title) if use_fallback else {}
+
+
 # TECHNIQUE TASK PROMPTS 
 GENERATE_TECHNIQUE_PROMPT = """
 You are creating a technique practice exercise for a negotiation skills app.
@@ -238,18 +252,39 @@ The other person's statement should be realistic and challenging.
 
 {performance_context}
 
-Output format:
-CONTEXT:
-[Brief context]
+Output format: ONLY a JSON object with these keys:
+{{
+  "context": "Brief context",
+  "other_person_says": "What they say - usually angry or frustrated",
+  "technique_instruction": "Which technique and how to apply it"
+}}
+"""
 
-OTHER_PERSON_SAYS:
-[What they say - usually angry or frustrated]
+TECHNIQUE_SCHEMA = {"context": str, "other_person_says": str, "technique_instruction": str}
+
+
+def _technique_task_prompts(task_title: str, task_objective: str, technique_name: str, performance_context: str) -> tuple:
+    technique_info = f" Technique to practice: {technique_name}." if technique_name else ""
+    user_prompt = f"""
+Task Title: {task_title}
+Task Objective: {task_objective}{technique_info}
 
-TECHNIQUE_INSTRUCTION:
-[Which technique and how to apply it]
+Generate a technique practice exercise.
 """
+    prompt = GENERATE_TECHNIQUE_PROMPT.format(performance_context=performance_context or "")
+    return prompt, user_prompt
+
+
+def _technique_task_fallback(task_title: str, technique_name: str) -> dict:
+    return {
+        "context": f"You are in a negotiation about {task_title}. The other person seems frustrated.",
+        "other_person_says": "I'm really frustrated with how this is going. You don't seem to understand my concerns at all!",
+        "technique_instruction": f"Respond using the {technique_name} technique: repeat back what you heard in your own words to show understanding and validate their feelings.",
+        "technique_name": technique_name
+    }
+
 
-def generate_technique_task(task_title: str, task_objective: str, technique_name: str = "", performance_context: str = "") -> dict:
+async def generate_technique_task_async(task_title: str, task_objective: str, technique_name: str = "", performance_context: str = "", use_fallback: bool = True) -> dict:
     """
     Generate content for a technique practice task.
     Args:
@@ -257,54 +292,31 @@ def generate_technique_task(task_title: str, task_objective: str, technique_name
         task_objective: Learning objective
         technique_name: Name of the technique to practice
         performance_context: Performance data to adjust complexity (optional)
+        use_fallback: Return fallback content when the LLM fails (otherwise {})
     Returns: {context: str, other_person_says: str, technique_instruction: str}
     """
-    technique_info = f" Technique to practice: {technique_name}." if technique_name else ""
-    user_prompt = f"""
-Task Title: {task_title}
-Task Objective: {task_objective}{technique_info}
-
-Generate a technique practice exercise.
-"""
     try:
-        prompt = GENERATE_TECHNIQUE_PROMPT.format(performance_context=performance_context or "")
-        raw = call_llm(prompt, user_prompt)
-        result = parse_task_response(raw)
-        if result and "context" in result and "other_person_says" in result and "technique_instruction" in result:
+        prompt, user_prompt = _technique_task_prompts(task_title, task_objective, technique_name, performance_context)
+        result = await call_structured_async(prompt, user_prompt, TECHNIQUE_SCHEMA, "technique_task")
+        if result:
             result["technique_name"] = technique_name
             return result
     except Exception as e:
-        print(f"[generate_technique_task] LLM error: {e}")
-    
-    # Fallback content
-    return {
-        "context": f"You are in a negotiation about {task_title}. The other person seems frustrated.",
-        "other_person_says": "I'm really frustrated with how this is going. You don't seem to understand my concerns at all!",
-        "technique_instruction": f"Respond using the {technique_name} technique: repeat back what you heard in your own words to show understanding and validate their feelings.",
-        "technique_name": technique_name
-    }
+        logger.error("[generate_technique_task_async] LLM error: %s", e)
+    return _technique_task_fallback(task_title, technique_name) if use_fallback else {}
 
 
-# PARSING HELPER 
-def parse_task_response(raw: str) -> dict:
-    """Generic parser for task generation responses."""
-    result = {}
-    lines = raw.split("\n")
-    current_key = None
-    current_value = ""
-    
-    for line in lines:
-        if ":" in line and line.split(":")[0].strip().replace("*", "").isupper():
-            if current_key and current_value:
-                result[current_key.lower()] = current_value.strip()
-            # Strip markdown formatting and get clean key
-            key_part = line.split(":")[0].strip().replace("*", "")
-            current_key = key_part
-            current_value = ":".join(line.split(":")[1:]).strip()
-        elif current_key:
-            current_value += "\n" + line
-    
-    if current_key and current_value:
-        result[current_key.lower()] = current_value.strip()
-    
-    return result
+async def generate_task_content_async(task_type: str, task_title: str, task_objective: str, performance_context: str = "", use_fallback: bool = True) -> dict:
+    """
+    Generate content for any task type. Simulation tasks have no generated content.
+    Returns the task-type specific content dict (see the generators above).
+    """
+    if task_type == "analysis":
+        return await generate_analysis_task_async(task_title, task_objective, performance_context, use_fallback)
+    elif task_type == "interpretation":
+        return await generate_interpretation_task_async(task_title, task_objective, performance_context, use_fallback)
+    elif task_type == "planning":
+        return await generate_planning_task_async(task_title, task_objective, performance_context, use_fallback)
+    elif task_type == "technique":
+        return await generate_technique_task_async(task_title, task_objective, "", performance_context, use_fallback)
+    return {}
@@ -0,0 +1,142 @@
+"""
+Schema-constrained JSON replies for the evaluators and task generators.
+The model is asked for one JSON object (API JSON mode) and the reply is validated by
+parse_structured against a schema mapping each field to its allowed values (a tuple)
+or to str (any non-empty text). Fields that are missing or invalid are asked for again
+in one short follow-up call; whatever is still invalid falls back to the caller's
+defaults. Outcomes and per-field failures are counted in metrics.
+"""
+
+import json
+import logging
+
+from llm.client import call_llm_async, _caller_name
+from metrics import PARSE_SECONDS, STRUCTURED_OUTPUTS, PARSE_FAILURES
+
+logger = logging.getLogger(__name__)
+
+# Assessment levels shared by the evaluators
+LEVELS = ("excellent", "good", "acceptable", "weak", "minimal")
+
+REPAIR_PROMPT = """
+You fix a JSON reply in which some keys were missing or invalid.
+Return ONLY a JSON object with exactly the requested keys, following the rule given for each key.
+"""
+
+# Most characters of the previous reply quoted back in a repair request
+REPAIR_CONTEXT_CHARS = 2000
+REPAIR_MAX_TOKENS = 300
+
+
+def _load_object(raw: str) -> dict:
+    """The JSON object in a reply (code fences and surrounding text ignored), keys lowercased."""
+    text = raw or ""
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        return {}
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    return {str(key).strip().lower(): value for key, value in data.items()}
+
+
+def _field_value(value, spec):
+    """The validated value of one field, or None if it is missing or invalid."""
+    if isinstance(value, list) and spec is str:
+        value = "\n".join(str(item) for item in value if item not in (None, ""))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    if isinstance(spec, tuple):
+        value = value.lower()
+        return value if value in spec else None
+    return value or None
+
+
+def parse_structured(raw: str, schema: dict, parser: str) -> tuple:
+    """Validate a JSON reply against schema. Returns (valid fields, names of invalid fields)."""
+    with PARSE_SECONDS.time(parser=parser):
+        data = _load_object(raw)
+        result, invalid = {}, []
+        for field, spec in schema.items():
+            value = _field_value(data.get(field), spec)
+            if value is None:
+                invalid.append(field)
+            else:
+                result[field] = value
+    return result, invalid
+
+
+def _repair_prompt(user_prompt: str, raw: str, schema: dict, invalid: list) -> str:
+    rules = "\n".join(
+        f'- "{field}": one of {", ".join(schema[field])}' if isinstance(schema[field], tuple)
+        else f'- "{field}": non-empty text'
+        for field in invalid
+    )
+    return f"""
+{user_prompt.strip()}
+
+Your previous reply:
+{(raw or "(empty)")[:REPAIR_CONTEXT_CHARS]}
+
+These keys were missing or invalid:
+{rules}
+
+Return a JSON object with only these keys.
+"""
+
+
+def _record_failures(parser: str, invalid: list, raw: str) -> None:
+    for field in invalid:
+        PARSE_FAILURES.inc(parser=parser, field=field)
+    logger.warning("[structured] %s reply missing or invalid %s; repairing", parser, invalid)
+    logger.debug("[structured] %s raw reply:\n%s", parser, raw)
+
+
+def _finish(result: dict, invalid: list, repaired: bool, parser: str, defaults: dict) -> dict:
+    """Apply defaults for fields still invalid after repair and count the outcome."""
+    if not invalid:
+        STRUCTURED_OUTPUTS.inc(parser=parser, outcome="repaired" if repaired else "ok")
+        return result
+    STRUCTURED_OUTPUTS.inc(parser=parser, outcome="fallback")
+    logger.warning("[structured] %s still missing %s after repair; using fallback", parser, invalid)
+    if defaults is None:
+        return {}
+    return {**defaults, **result}
+
+
+async def call_structured_async(
+    system_prompt: str,
+    user_prompt: str,
+    schema: dict,
+    parser: str,
+    defaults: dict = None,
+    caller: str = None,
+    **llm_kwargs,
+) -> dict:
+    """
+    Call the LLM in JSON mode and return the fields of schema, repairing invalid fields once.
+    Fields still invalid take their value from defaults; with defaults=None an incomplete
+    reply returns {} so the caller can use its own fallback.
+    """
+    caller = caller or _caller_name()
+    raw = await call_llm_async(system_prompt, user_prompt, caller=caller, json_mode=True, **llm_kwargs)
+    result, invalid = parse_structured(raw, schema, parser)
+    repaired = bool(invalid)
+    if invalid:
+        _record_failures(parser, invalid, raw)
+        try:
+            fixed_raw = await call_llm_async(
+                REPAIR_PROMPT, _repair_prompt(user_prompt, raw, schema, invalid),
+                temperature=0, max_tokens=REPAIR_MAX_TOKENS, caller=f"{caller}.repair", json_mode=True,
+            )
+            fixed, invalid = parse_structured(fixed_raw, {field: schema[field] for field in invalid}, parser)
+            result.update(fixed)
+        except Exception as e:
+            logger.error("[structured] %s repair call failed: %s", parser, e)
+    return _finish(result, invalid, repaired, parser, defaults)
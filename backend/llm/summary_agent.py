@@ -0,0 +1,31 @@
+from llm.client import call_llm_async
+
+SUMMARY_PROMPT = """
+You keep a running summary of a negotiation practice chat between a learner (USER)
+and their AI counterpart (MANAGER). Merge the new turns into the existing summary.
+Keep: the counterpart's opening position, each side's offers and concessions, stated
+interests and constraints, open questions, and any agreement reached.
+Drop greetings and repetition. Write plain prose, at most 120 words, no headings.
+"""
+
+
+def _summary_prompt(previous_summary: str, new_turns: str, task_title: str = "") -> str:
+    return f"""
+Task: {task_title}
+
+Existing summary:
+{previous_summary or "(none yet)"}
+
+New turns:
+{new_turns}
+
+Updated summary:
+"""
+
+
+async def summarize_conversation_async(previous_summary: str, new_turns: str, task_title: str = "") -> str:
+    """Extend a running conversation summary with the turns that happened since it was written."""
+    summary = await call_llm_async(
+        SUMMARY_PROMPT, _summary_prompt(previous_summary, new_turns, task_title), temperature=0.2, max_tokens=250
+    )
+    return summary.strip()
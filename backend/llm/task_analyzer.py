@@ -3,7 +3,7 @@ LLM agent to analyze and generate task metadata.
 Interprets difficulty level, skill focus, and time estimates from task descriptions.
 """
 
-from groq import Groq
+from llm.client import call_llm
 import json
 
 def analyze_task(task_title: str, task_summary: str) -> dict:
@@ -11,9 +11,6 @@ def analyze_task(task_title: str, task_summary: str) -> dict:
     Analyze a negotiation task and generate metadata.
     Returns: dict with difficulty, skill_focus, estimated_time
     """
-    
-    client = Groq()
-    
     prompt = f"""Analyze this negotiation practice task and extract key metadata.
 
 Task Title: {task_title}
@@ -28,18 +25,7 @@ Respond with ONLY a JSON object (no markdown, no code blocks) with these exact k
 
 Return ONLY valid JSON."""
 
-    message = client.messages.create(
-        model="llama-3.1-8b-instant",
-        max_tokens=200,
-        messages=[
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ]
-    )
-    
-    response_text = message.content[0].text.strip()
+    response_text = call_llm("", prompt, max_tokens=200, cache=True)
     
     # Remove markdown code blocks if present
     if response_text.startswith("```"):
@@ -64,9 +50,6 @@ def generate_task_description(task_title: str, difficulty_level: str) -> str:
     """
     Generate a detailed, engaging description for a negotiation task.
     """
-    
-    client = Groq()
-    
     prompt = f"""Generate a short, engaging description for this negotiation practice task.
 
 Task Title: {task_title}
@@ -80,27 +63,13 @@ The description should:
 
 Return ONLY the description text, nothing else."""
 
-    message = client.messages.create(
-        model="llama-3.1-8b-instant",
-        max_tokens=100,
-        messages=[
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ]
-    )
-    
-    return message.content[0].text.strip()
+    return call_llm("", prompt, max_tokens=100, cache=True)
 
 
 def generate_task_insights(task_title: str, task_description: str) -> str:
     """
     Generate insights about why this task is important and how it helps.
     """
-    
-    client = Groq()
-    
     prompt = f"""Generate a brief, motivating insight about why this negotiation task is important and how practicing it will help.
 
 Task Title: {task_title}
@@ -115,28 +84,14 @@ The insight should:
 
 Return ONLY the insight text, nothing else."""
 
-    message = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        max_tokens=120,
-        messages=[
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ]
-    )
-    
-    return message.choices[0].message.content.strip()
+    return call_llm("", prompt, max_tokens=120, cache=True)
 
 
-def choose_similar_task(current_task_id: int, current_difficulty: str, all_tasks: list) -> dict:
+def similar_task_candidates(current_task_id: int, current_difficulty: str, all_tasks: list) -> list:
     """
-    Choose another task with similar difficulty level.
-    Excludes the current task.
-    Returns a random task from the same difficulty band.
+    Tasks choose_similar_task picks from: incomplete tasks in the current task's
+    difficulty band, else any incomplete task, else any task. Excludes the current task.
     """
-    import random
-    
     # Map difficulty to bands
     difficulty_map = {
         "●": "beginner",
@@ -165,6 +120,18 @@ def choose_similar_task(current_task_id: int, current_difficulty: str, all_tasks
     if not similar_tasks:
         similar_tasks = [t for t in all_tasks if t.get("id") != current_task_id]
     
+    return similar_tasks
+
+
+def choose_similar_task(current_task_id: int, current_difficulty: str, all_tasks: list) -> dict:
+    """
+    Choose another task with similar difficulty level.
+    Excludes the current task.
+    Returns a random task from the same difficulty band.
+    """
+    import random
+    
+    similar_tasks = similar_task_candidates(current_task_id, current_difficulty, all_tasks)
     if similar_tasks:
         return random.choice(similar_tasks)
     
@@ -177,8 +144,6 @@ def estimate_program_length(task_titles: list) -> dict:
     Ask the LLM to estimate how many days of deliberate practice it would take to accomplish the learning goal represented by the list of task titles.
     Returns a dict with keys: days (int) and rationale (str).
     """
-    client = Groq()
-
     titles_text = "\n".join([f"- {t}" for t in task_titles]) if task_titles else ""
 
     prompt = f"""Estimate how many days of deliberate practice it would reasonably take for a learner to achieve meaningful progress toward mastering these negotiation skills based on the task list below. Assume 10–30 mins of practice per day. Return a JSON object with exact keys: {{"days": <integer>, "rationale": <string>}} and nothing else.
@@ -187,18 +152,7 @@ Tasks:\n{titles_text}
 
 Return ONLY valid JSON."""
 
-    message = client.messages.create(
-        model="llama-3.1-8b-instant",
-        max_tokens=150,
-        messages=[
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ]
-    )
-
-    response_text = message.content[0].text.strip()
+    response_text = call_llm("", prompt, max_tokens=150, cache=True)
 
     # Remove markdown if present
     if response_text.startswith("```"):
@@ -0,0 +1,131 @@
+"""
+Approximate cache of coach tips.
+Many turns across sessions of the same task are near-identical ("ok", "I want a raise")
+and would get interchangeable tips. Each (user message, counterpart reply) pair is turned
+into a hashed bag-of-words vector on the CPU; a new turn whose cosine similarity to a
+cached turn of the same task and counterpart reaches COACH_TIP_CACHE_THRESHOLD reuses
+that turn's tips instead of calling the coach LLM.
+Partitioning by counterpart name keeps names in reused tips right. In-process only.
+"""
+
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+from metrics import Counter
+
+# Most cached turns per (task title, counterpart); 0 disables the cache
+COACH_TIP_CACHE_ENTRIES = int(os.getenv("COACH_TIP_CACHE_ENTRIES", "256"))
+# Cosine similarity a new turn needs with a cached one to reuse its tips
+COACH_TIP_CACHE_THRESHOLD = float(os.getenv("COACH_TIP_CACHE_THRESHOLD", "0.9"))
+# (task title, counterpart) partitions kept; least recently used are dropped
+COACH_TIP_CACHE_PARTITIONS = 64
+# Hashed features per text; the user message and the reply each get this many
+VECTOR_DIM = 512
+
+COACH_TIP_CACHE = Counter("coach_tip_cache_total", "Coach tip cache lookups by outcome (hit, miss)")
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def _text_vector(text: str) -> np.ndarray:
+    """L2-normalized signed hashing of the word unigrams and bigrams of text."""
+    vector = np.zeros(VECTOR_DIM, dtype=np.float32)
+    words = _WORD_RE.findall(text.lower())
+    for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+        h = zlib.crc32(feature.encode("utf-8"))
+        vector[h % VECTOR_DIM] += 1.0 if h & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def turn_vector(user_message: str, manager_reply: str) -> np.ndarray:
+    """
+    Unit vector for a turn: the message and reply vectors side by side, so the cosine of
+    two turns is the mean of their message and reply similarities.
+    """
+    return np.concatenate([_text_vector(user_message), _text_vector(manager_reply)]) / np.sqrt(2)
+
+
+class _Partition:
+    """Turn vectors (rows of a matrix that grows up to max_entries) and their tips; oldest overwritten first."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.vectors = np.zeros((min(16, max_entries), 2 * VECTOR_DIM), dtype=np.float32)
+        self.tips = []
+        self.next_slot = 0
+
+    def search(self, vector: np.ndarray) -> tuple:
+        """(best similarity, its tips), or (0.0, None) when empty."""
+        if not self.tips:
+            return 0.0, None
+        scores = self.vectors[:len(self.tips)] @ vector
+        best = int(np.argmax(scores))
+        return float(scores[best]), self.tips[best]
+
+    def add(self, vector: np.ndarray, tips: list) -> None:
+        slot = self.next_slot
+        if slot >= len(self.vectors):
+            grown = np.zeros((min(2 * len(self.vectors), self.max_entries), self.vectors.shape[1]), dtype=np.float32)
+            grown[:len(self.vectors)] = self.vectors
+            self.vectors = grown
+        self.vectors[slot] = vector
+        if slot < len(self.tips):
+            self.tips[slot] = tips
+        else:
+            self.tips.append(tips)
+        self.next_slot = (slot + 1) % self.max_entries
+
+
+class CoachTipCache:
+    """Coach tips of earlier turns, searched by cosine similarity per (task title, counterpart)."""
+
+    def __init__(
+        self,
+        max_entries: int = COACH_TIP_CACHE_ENTRIES,
+        threshold: float = COACH_TIP_CACHE_THRESHOLD,
+        max_partitions: int = COACH_TIP_CACHE_PARTITIONS,
+    ):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.max_partitions = max_partitions
+        self._partitions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, task_title: str, counterpart: str, vector: np.ndarray) -> Optional[list]:
+        """Tips of the most similar cached turn if it reaches the threshold, else None."""
+        with self._lock:
+            partition = self._partitions.get((task_title, counterpart))
+            if partition is not None:
+                self._partitions.move_to_end((task_title, counterpart))
+                score, tips = partition.search(vector)
+                if tips is not None and score >= self.threshold:
+                    COACH_TIP_CACHE.inc(outcome="hit")
+                    return list(tips)
+        COACH_TIP_CACHE.inc(outcome="miss")
+        return None
+
+    def store(self, task_title: str, counterpart: str, vector: np.ndarray, tips: list) -> None:
+        with self._lock:
+            key = (task_title, counterpart)
+            partition = self._partitions.get(key)
+            if partition is None:
+                partition = self._partitions[key] = _Partition(self.max_entries)
+                while len(self._partitions) > self.max_partitions:
+                    self._partitions.popitem(last=False)
+            self._partitions.move_to_end(key)
+            partition.add(vector, list(tips))
+
+
+_cache = CoachTipCache() if COACH_TIP_CACHE_ENTRIES > 0 else None
+
+
+def get_tip_cache() -> Optional[CoachTipCache]:
+    """The process-wide coach tip cache, or None when disabled."""
+    return _cache
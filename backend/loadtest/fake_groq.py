@@ -0,0 +1,219 @@
+"""
+Local stand-in for the Groq chat completions API, for load tests that must not spend API quota.
+Replies are canned per prompt type (coach tips, evaluations, task content, ...) and delayed by a
+configurable first-token latency plus a token generation rate, so the backend sees realistic timing.
+
+Usage:
+    python -m loadtest.fake_groq --port 9000 --latency 0.3 --tokens-per-second 250
+    GROQ_BASE_URL=http://127.0.0.1:9000 GROQ_API_KEY=fake uvicorn app:app
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+# (marker found in the prompt, prompt type) checked in order; the first match wins
+PROMPT_TYPES = [
+    ("running summary of a negotiation", "conversation_summary"),
+    ('"correctness_level"', "evaluate_analysis"),
+    ('"insight_level"', "evaluate_interpretation"),
+    ('"plan_quality"', "evaluate_plan"),
+    ('"technique_quality"', "evaluate_technique"),
+    ('"other_person_says"', "technique_task"),
+    ('"transcript"', "analysis_task"),
+    ('"statement"', "interpretation_task"),
+    ('"constraints"', "planning_task"),
+    ("scenario generator", "scenario"),
+    ("exactly 3 tips", "coach_tips"),
+    ("STRICT negotiation coach. Analyze", "task_feedback"),
+    ("days of deliberate practice", "program_length"),
+    ("extract key metadata", "task_metadata"),
+    ("engaging description", "task_description"),
+    ("motivating insight", "task_insights"),
+]
+
+CANNED_REPLIES = {
+    "evaluate_analysis": json.dumps({
+        "correctness_level": "good",
+        "feedback": "You spotted the main excuse and explained why it deflects responsibility.",
+    }),
+    "evaluate_interpretation": json.dumps({
+        "insight_level": "acceptable",
+        "coach_message": "Good start.",
+        "feedback": "You named one underlying need.",
+        "suggestion": "Look for the fear behind the demand.",
+    }),
+    "evaluate_plan": json.dumps({
+        "plan_quality": "good",
+        "coach_message": "Solid plan.",
+        "strengths": "Clear BATNA.",
+        "gaps": "No concession order.",
+        "suggested_refinement": "Rank what you can trade.",
+    }),
+    "evaluate_technique": json.dumps({
+        "technique_quality": "good",
+        "coach_message": "Nice mirroring.",
+        "analysis": "You reflected their words back.",
+        "example": "It sounds like the deadline worries you.",
+    }),
+    "technique_task": json.dumps({
+        "context": "A colleague is upset about a missed handoff.",
+        "other_person_says": "You always leave me to clean up your mess!",
+        "technique_instruction": "Mirror their last words and label the emotion.",
+    }),
+    "analysis_task": json.dumps({
+        "transcript": "Alex: Can we move the launch up a week?\nJordan: The team is stretched, and QA is out.",
+        "question": "Which excuse does Jordan use to avoid committing?",
+    }),
+    "interpretation_task": json.dumps({
+        "statement": "I'm not signing anything until you cut the price by 30%.",
+        "instruction": "Translate this position into the interests behind it.",
+    }),
+    "planning_task": json.dumps({
+        "scenario": "You are negotiating a contract renewal with a long-time vendor.",
+        "constraints": "Budget is flat; the renewal is due in two weeks.",
+        "instruction": "Write a step-by-step plan including your BATNA.",
+    }),
+    "scenario": (
+        "You are Sam, a team lead. Your counterpart is Maya, your manager. "
+        "Maya says: 'I can't approve a bigger budget this quarter.'"
+    ),
+    "coach_tips": (
+        "- Ask Maya which constraint matters most this quarter so you can shape an option around it.\n"
+        "- Restate Maya's concern in your own words before adding your proposal to show you listened.\n"
+        "- Offer a small trial that lowers Maya's risk while still moving toward what you need."
+    ),
+    "task_feedback": (
+        "Outcome: Partial agreement on a trial.\n"
+        "Feedback: You explained your position and explored one interest.\n"
+        "Improvement: Ask more questions before proposing.\nGrade: 3/5"
+    ),
+    "program_length": '{"days": 21, "rationale": "Three weeks of short daily practice covers every task twice."}',
+    "task_metadata": '{"difficulty": "medium", "skill_focus": "active listening", "estimated_time": "15 min"}',
+    "task_description": "Practice turning a tense exchange into a joint problem.",
+    "task_insights": "Naming the other side's interests turns a standoff into a trade.",
+    "conversation_summary": (
+        "Maya opened by refusing a bigger budget this quarter. The learner proposed a small trial; "
+        "Maya asked what makes it worth the risk. No agreement yet."
+    ),
+    "manager": "I hear you, but I still think the other option fits better. What makes yours worth it?",
+}
+
+
+def prompt_type(messages: list) -> str:
+    """Classify a chat request by markers in its prompts; anything else is a manager turn."""
+    text = "\n".join(m.get("content") or "" for m in messages)
+    for marker, kind in PROMPT_TYPES:
+        if marker in text:
+            return kind
+    return "manager"
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def create_app(latency: float = 0.3, tokens_per_second: float = 250.0, jitter: float = 0.2, replies: dict = None) -> FastAPI:
+    """
+    Build the fake API. Each call waits latency (+/- jitter fraction) before the first token,
+    then emits the reply at tokens_per_second.
+    """
+    app = FastAPI(title="Fake Groq")
+    canned = dict(CANNED_REPLIES, **(replies or {}))
+    app.state.calls = {}
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        kind = prompt_type(messages)
+        app.state.calls[kind] = app.state.calls.get(kind, 0) + 1
+
+        reply = canned.get(kind, canned["manager"])
+        prompt_tokens = sum(estimate_tokens(m.get("content") or "") for m in messages)
+        words = reply.split(" ")
+        completion_tokens = estimate_tokens(reply)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        model = body.get("model", "fake")
+
+        await asyncio.sleep(max(0.0, latency * (1 + random.uniform(-jitter, jitter))))
+
+        if not body.get("stream"):
+            await asyncio.sleep(completion_tokens / tokens_per_second)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        async def chunks():
+            per_word = completion_tokens / tokens_per_second / len(words)
+            for i, word in enumerate(words):
+                delta = {"content": word if i == 0 else " " + word}
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(per_word)
+            final = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                "x_groq": {"id": completion_id, "usage": usage},
+            }
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    def stats():
+        """Calls served per prompt type."""
+        return app.state.calls
+
+    return app
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake Groq chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=250.0)
+    parser.add_argument("--jitter", type=float, default=0.2, help="Latency jitter as a fraction of --latency")
+    parser.add_argument("--replies", help="JSON file of {prompt type: reply} overriding the canned replies")
+    args = parser.parse_args()
+
+    replies = None
+    if args.replies:
+        with open(args.replies, encoding="utf-8") as f:
+            replies = json.load(f)
+    app = create_app(args.latency, args.tokens_per_second, args.jitter, replies)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Scripted learners for the load test. Each persona works through tasks the way a class of
+real users does: how many chat turns they take, what they write, and how long they pause.
+"""
+
+PERSONAS = [
+    {
+        # Short answers, agrees quickly (exercises the agreement shortcut in the manager agent)
+        "name": "terse",
+        "turns": 2,
+        "messages": ["I'd rather watch the comedy.", "ok fine, let's do that"],
+        "answer": "They blame the team.",
+        "think_time": 0.5,
+        "reflection": {"difficulty": 2, "confidence": 4, "comment": "Quick one."},
+    },
+    {
+        # Longer, argumentative turns; the conversation history grows every turn
+        "name": "engaged",
+        "turns": 5,
+        "messages": [
+            "I see why you like the thriller, but I had a long week and want something lighter tonight.",
+            "What if we pick a comedy now and save the thriller for the weekend when we both have more energy?",
+            "I'm hearing that the plot matters to you. Would a mystery-comedy give you the twists you want?",
+            "I can compromise on the runtime if you can compromise on the genre. Does that feel fair?",
+            "Let's go with that choice, I think it works for both of us.",
+        ],
+        "answer": (
+            "Jordan deflects by citing team capacity and QA availability instead of discussing the date. "
+            "The underlying issue is risk: Jordan does not want to own a launch that might slip."
+        ),
+        "think_time": 1.5,
+        "reflection": {"difficulty": 4, "confidence": 3, "comment": "Hard to keep the conversation on interests."},
+    },
+    {
+        # Middle of the road
+        "name": "steady",
+        "turns": 3,
+        "messages": [
+            "I'd like us to choose together. What are you in the mood for?",
+            "That makes sense. Could we alternate picks each week?",
+            "Sounds good, you pick tonight.",
+        ],
+        "answer": "The excuse is that QA is out, which avoids committing to the earlier date.",
+        "think_time": 1.0,
+        "reflection": {"difficulty": 3, "confidence": 3, "comment": "Getting more comfortable."},
+    },
+]
+
+# Evaluation endpoint per task type for non-simulation tasks
+EVALUATE_ENDPOINTS = {
+    "analysis": "/evaluate-analysis",
+    "interpretation": "/evaluate-interpretation",
+    "planning": "/evaluate-plan",
+    "technique": "/evaluate-technique",
+}
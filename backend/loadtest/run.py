@@ -0,0 +1,257 @@
+"""
+Load test: scripted learners drive the backend concurrently and latency is reported per endpoint.
+
+Each learner creates a session and, for each task, follows the frontend's calls:
+/timeline -> /start-task -> /task-content, then /message x N -> /task-feedback for simulations
+or /evaluate-* with save=true for the other task types (both complete the task and start
+the next one). A /reflect closes the session. The summary gives p50/p95/p99 latency and
+requests/sec per endpoint.
+
+Usage (from backend/):
+    # Start a fake Groq server and a backend on a throwaway database, then run the load
+    python -m loadtest.run --spawn --learners 50 --tasks 3
+
+    # Against an already running backend (point it at the fake with GROQ_BASE_URL)
+    python -m loadtest.run --base-url http://127.0.0.1:8000 --learners 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import httpx
+
+from loadtest.personas import PERSONAS, EVALUATE_ENDPOINTS
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Stats:
+    """Latencies and failures per endpoint label."""
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, label: str, seconds: float, ok: bool) -> None:
+        self.latencies.setdefault(label, []).append(seconds)
+        if not ok:
+            self.errors[label] = self.errors.get(label, 0) + 1
+
+    def summary(self, wall_seconds: float) -> list:
+        rows = []
+        for label, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            rows.append({
+                "endpoint": label,
+                "requests": len(values),
+                "errors": self.errors.get(label, 0),
+                "rps": len(values) / wall_seconds if wall_seconds else 0.0,
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+                "max": values[-1],
+            })
+        return rows
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+async def call(client: httpx.AsyncClient, stats: Stats, label: str, method: str, url: str, **kwargs):
+    """Issue one request, timing it under label; returns the decoded JSON body or None on failure."""
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+        body = response.json()
+        ok = response.status_code < 400 and not (isinstance(body, dict) and body.get("error"))
+    except (httpx.HTTPError, ValueError):
+        body, ok = None, False
+    stats.record(label, time.perf_counter() - started, ok)
+    return body
+
+
+async def run_learner(client: httpx.AsyncClient, stats: Stats, persona: dict, tasks: int, think_scale: float, coach_mode: str) -> None:
+    """One scripted learner working through `tasks` tasks of a fresh session."""
+    pause = persona["think_time"] * think_scale
+    session = await call(client, stats, "/session", "POST", "/session")
+    if not session:
+        return
+    session_id = session["session_id"]
+
+    for _ in range(tasks):
+        timeline = await call(client, stats, "/timeline", "GET", f"/timeline/{session_id}")
+        current = next((t for t in timeline or [] if t.get("status") == "in_progress"), None)
+        if current is None:
+            return
+        title = current["title"]
+        task_type = current.get("task_type") or "simulation"
+
+        await call(client, stats, "/start-task", "POST", f"/start-task/{session_id}/{current['id']}")
+        content = await call(client, stats, "/task-content", "GET", f"/task-content/{session_id}", params={"task_title": title})
+        await asyncio.sleep(pause)
+
+        if task_type == "simulation":
+            for text in persona["messages"][: persona["turns"]]:
+                await call(
+                    client, stats, "/message", "POST", "/message",
+                    json={"session_id": session_id, "task_title": title, "text": text, "coach_mode": coach_mode},
+                )
+                await asyncio.sleep(pause)
+            await call(client, stats, "/task-feedback", "GET", f"/task-feedback/{session_id}")
+        else:
+            task_content = (content or {}).get("task_content") or {}
+            if isinstance(task_content, str):
+                try:
+                    task_content = json.loads(task_content)
+                except ValueError:
+                    task_content = {}
+            endpoint = EVALUATE_ENDPOINTS.get(task_type, "/evaluate-analysis")
+            payload = {
+                "session_id": session_id,
+                "task_title": title,
+                "response": persona["answer"],
+                "question": task_content.get("question", ""),
+                "position": task_content.get("statement", ""),
+                "scenario": task_content.get("scenario", ""),
+                "constraints": task_content.get("constraints", ""),
+                "other_person_statement": task_content.get("other_person_says", ""),
+                "instruction": task_content.get("instruction") or task_content.get("technique_instruction", ""),
+                "task_id": current["id"],
+                "save": True,
+            }
+            await call(client, stats, endpoint, "POST", endpoint, json=payload)
+
+    await call(client, stats, "/reflect", "POST", "/reflect", json=dict(persona["reflection"], session_id=session_id))
+
+
+async def run_load(base_url: str, learners: int, tasks: int, think_scale: float, ramp_up: float, coach_mode: str) -> tuple:
+    """Run all learners concurrently; returns (stats, wall seconds)."""
+    stats = Stats()
+    limits = httpx.Limits(max_connections=learners, max_keepalive_connections=learners)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        async def learner(i: int):
+            await asyncio.sleep(ramp_up * i / max(1, learners))
+            await run_learner(client, stats, PERSONAS[i % len(PERSONAS)], tasks, think_scale, coach_mode)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(learner(i) for i in range(learners)))
+        wall = time.perf_counter() - started
+    return stats, wall
+
+
+def format_report(rows: list, wall_seconds: float) -> str:
+    lines = [
+        f"{'endpoint':<26}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}",
+    ]
+    for row in rows:
+        lines.append(
+            f"{row['endpoint']:<26}{row['requests']:>9}{row['errors']:>8}{row['rps']:>9.1f}"
+            f"{row['p50'] * 1000:>10.1f}{row['p95'] * 1000:>10.1f}{row['p99'] * 1000:>10.1f}{row['max'] * 1000:>10.1f}"
+        )
+    total = sum(row["requests"] for row in rows)
+    lines.append(f"{total} requests in {wall_seconds:.1f}s ({total / wall_seconds:.1f} req/s)")
+    return "\n".join(lines)
+
+
+def _wait_for(url: str, process: subprocess.Popen, timeout: float = 30) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Process for {url} exited with code {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+@contextmanager
+def spawn_stack(args):
+    """Start the fake Groq server and a backend wired to it on a throwaway database."""
+    workdir = tempfile.mkdtemp(prefix="skillbuilder-loadtest-")
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    base_url = f"http://127.0.0.1:{args.port}"
+    env = dict(
+        os.environ,
+        GROQ_BASE_URL=fake_url,
+        GROQ_API_KEY="fake",
+        DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'loadtest.db')}",
+        LLM_CACHE_PATH=os.path.join(workdir, "llm_cache.db"),
+        LLM_CACHE_BACKEND=args.llm_cache,
+        LOG_LEVEL="WARNING",
+    )
+    fake = subprocess.Popen(
+        [sys.executable, "-m", "loadtest.fake_groq", "--port", str(args.fake_port),
+         "--latency", str(args.fake_latency), "--tokens-per-second", str(args.fake_tps)],
+        cwd=BACKEND_DIR, env=env,
+    )
+    backend = None
+    try:
+        _wait_for(f"{fake_url}/stats", fake)
+        backend = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app:app", "--port", str(args.port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env,
+        )
+        _wait_for(f"{base_url}/metrics", backend, timeout=60)
+        yield base_url, fake_url
+    finally:
+        for process in (backend, fake):
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=10)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="SkillBuilder load test")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="Backend to test (ignored with --spawn)")
+    parser.add_argument("--spawn", action="store_true", help="Start a fake Groq server and a backend for the run")
+    parser.add_argument("--port", type=int, default=8100, help="Backend port with --spawn")
+    parser.add_argument("--fake-port", type=int, default=9100, help="Fake Groq port with --spawn")
+    parser.add_argument("--fake-latency", type=float, default=0.3, help="Fake Groq seconds to first token")
+    parser.add_argument("--fake-tps", type=float, default=250.0, help="Fake Groq tokens per second")
+    parser.add_argument("--llm-cache", default="off", help="LLM_CACHE_BACKEND for the spawned backend")
+    parser.add_argument("--learners", type=int, default=20, help="Concurrent learners")
+    parser.add_argument("--tasks", type=int, default=3, help="Tasks each learner completes")
+    parser.add_argument("--think-scale", type=float, default=1.0, help="Multiplier on persona think times (0 = no pauses)")
+    parser.add_argument("--ramp-up", type=float, default=2.0, help="Seconds over which learners start")
+    parser.add_argument("--coach-mode", default="inline", choices=["inline", "deferred"])
+    parser.add_argument("--json", help="Also write the per-endpoint summary to this file")
+    args = parser.parse_args()
+
+    def run(base_url: str):
+        stats, wall = asyncio.run(
+            run_load(base_url, args.learners, args.tasks, args.think_scale, args.ramp_up, args.coach_mode)
+        )
+        rows = stats.summary(wall)
+        print(format_report(rows, wall))
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({"wall_seconds": wall, "endpoints": rows}, f, indent=2)
+        return rows
+
+    if args.spawn:
+        with spawn_stack(args) as (base_url, fake_url):
+            rows = run(base_url)
+            print(f"Fake Groq calls by prompt type: {httpx.get(f'{fake_url}/stats').json()}")
+    else:
+        rows = run(args.base_url)
+
+    if any(row["errors"] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Maintenance commands for the backend database.
+
+Usage:
+    python manage.py migrate
+    python manage.py agreement-report
+    python manage.py bench-agreement [--corpus FILE] [--repeat N]
+    python manage.py rebuild-stats
+"""
+
+import argparse
+import re
+import time
+from collections import Counter
+
+from database import engine, SessionLocal
+from models import Base, Message
+from migrations import run_migrations
+from llm.manager_agent import AGREEMENT_PATTERNS, classify_agreements
+from llm.performance_analyzer import rebuild_performance_stats
+
+
+def migrate(args) -> None:
+    Base.metadata.create_all(bind=engine)
+    applied = run_migrations(engine)
+    print(f"Applied {len(applied)} migration(s)" if applied else "Database is up to date")
+
+
+def _user_messages() -> list:
+    db = SessionLocal()
+    try:
+        return [text for (text,) in db.query(Message.text).filter(Message.sender == "user")]
+    finally:
+        db.close()
+
+
+def agreement_report(args) -> None:
+    """Classify every stored user message and count which agreement rule fired."""
+    messages = _user_messages()
+    counts = Counter(classify_agreements(messages))
+    no_match = counts.pop(None, 0)
+    print(f"{len(messages)} user message(s), {len(messages) - no_match} agreement(s)")
+    for pattern, count in counts.most_common():
+        print(f"{count:8d}  {pattern}")
+
+
+def _legacy_detect(message: str) -> bool:
+    """The previous detector: one re.search per pattern."""
+    message_lower = message.lower().strip()
+    return any(re.search(pattern, message_lower) for pattern in AGREEMENT_PATTERNS)
+
+
+def bench_agreement(args) -> None:
+    """Time the per-pattern loop against the compiled single-pass matcher."""
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            messages = [line.strip() for line in f if line.strip()]
+    else:
+        messages = _user_messages()
+    if not messages:
+        print("No user messages found; pass --corpus FILE (one message per line)")
+        return
+
+    legacy = [_legacy_detect(m) for m in messages]
+    compiled = [rule is not None for rule in classify_agreements(messages)]
+    mismatches = sum(a != b for a, b in zip(legacy, compiled))
+
+    def timed(fn) -> float:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            fn()
+        return time.perf_counter() - start
+
+    legacy_s = timed(lambda: [_legacy_detect(m) for m in messages])
+    compiled_s = timed(lambda: classify_agreements(messages))
+    scanned = len(messages) * args.repeat
+    print(f"{len(messages)} message(s) x {args.repeat}, {sum(compiled)} agreement(s), {mismatches} mismatch(es)")
+    print(f"per-pattern loop: {legacy_s / scanned * 1e6:8.2f} us/message")
+    print(f"single pass:      {compiled_s / scanned * 1e6:8.2f} us/message ({legacy_s / compiled_s:.1f}x)")
+
+
+def rebuild_stats(args) -> None:
+    """Recompute the running performance statistics of every session from graded tasks."""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        sessions = rebuild_performance_stats(db)
+    finally:
+        db.close()
+    print(f"Rebuilt performance stats for {sessions} session(s)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="SkillBuilder backend maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("migrate", help="Create missing tables and apply pending migrations").set_defaults(func=migrate)
+
+    commands.add_parser("agreement-report", help="Count agreement rules matched by stored user messages").set_defaults(func=agreement_report)
+    bench = commands.add_parser("bench-agreement", help="Benchmark the agreement detector over user messages")
+    bench.add_argument("--corpus", help="Text file with one message per line (default: user messages in the database)")
+    bench.add_argument("--repeat", type=int, default=20)
+    bench.set_defaults(func=bench_agreement)
+    commands.add_parser("rebuild-stats", help="Backfill per-session performance stats from completed, graded tasks").set_defaults(func=rebuild_stats)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Change notifications for conversation messages.
+Every commit that adds messages wakes the /messages/.../stream subscribers of the
+affected (session_id, task_title), so new messages are pushed instead of polled.
+Notifications are in-process; subscribers also re-check the database on a timer,
+which covers writes made by other worker processes.
+"""
+
+import asyncio
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from database import SessionLocal
+from models import Message
+
+# (session_id, task_title) -> set of (event loop, asyncio.Event)
+_subscribers = {}
+_lock = threading.Lock()
+
+
+def notify(session_id: str, task_title: str) -> None:
+    """Wake every subscriber of a task conversation. Safe to call from any thread."""
+    with _lock:
+        subscribers = list(_subscribers.get((session_id, task_title), ()))
+    for loop, changed in subscribers:
+        loop.call_soon_threadsafe(changed.set)
+
+
+@contextmanager
+def subscribe(session_id: str, task_title: str):
+    """
+    Register for change notifications on a task conversation; yields an asyncio.Event.
+    Clear the event before reading from the database so no commit can be missed.
+    """
+    key = (session_id, task_title)
+    entry = (asyncio.get_running_loop(), asyncio.Event())
+    with _lock:
+        _subscribers.setdefault(key, set()).add(entry)
+    try:
+        yield entry[1]
+    finally:
+        with _lock:
+            subscribers = _subscribers.get(key)
+            if subscribers is not None:
+                subscribers.discard(entry)
+                if not subscribers:
+                    del _subscribers[key]
+
+
+async def wait_for_change(changed: asyncio.Event, timeout: float) -> bool:
+    """Wait until the subscription fires; returns False on timeout."""
+    try:
+        await asyncio.wait_for(changed.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _collect_message_keys(session, flush_context):
+    keys = session.info.setdefault("message_keys", set())
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, Message):
+            keys.add((obj.session_id, obj.task_title))
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _notify_committed(session):
+    for session_id, task_title in session.info.pop("message_keys", ()):
+        notify(session_id, task_title)
+
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _discard_rolled_back(session, previous_transaction):
+    session.info.pop("message_keys", None)
@@ -0,0 +1,192 @@
+"""
+In-process instrumentation: counters, gauges and latency histograms, rendered in the
+Prometheus text exposition format at GET /metrics.
+Observations are a dict lookup and a few additions under a lock, cheap enough to
+leave on for every request.
+"""
+
+import functools
+import threading
+import time
+from bisect import bisect_left
+from typing import Optional
+
+# Upper bounds (seconds) for latency histograms: sub-millisecond DB queries up to slow LLM calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: tuple, extra: Optional[tuple] = None) -> str:
+    pairs = key + (extra or ())
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    """Monotonically increasing value per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, key, value
+
+
+class Gauge(Counter):
+    """Value that can go up and down per label set."""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}  # label key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def time(self, **labels) -> "Timer":
+        """Context manager / decorator that observes the elapsed wall time."""
+        return Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f"{self.name}_bucket", key + (("le", repr(bound)),), cumulative
+            yield f"{self.name}_bucket", key + (("le", "+Inf"),), series[-1]
+            yield f"{self.name}_sum", key, series[-2]
+            yield f"{self.name}_count", key, series[-1]
+
+
+class Timer:
+    """Times a block or a function into a histogram."""
+
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self._start, **self.labels)
+        return False
+
+    def __call__(self, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.histogram.observe(time.perf_counter() - start, **self.labels)
+
+        return wrapper
+
+
+def render() -> str:
+    """All registered metrics in the Prometheus text format."""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help_text}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, key, value in metric.samples():
+            lines.append(f"{name}{_format_labels(key)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# Hot-path metrics
+HTTP_REQUEST_SECONDS = Histogram("http_request_seconds", "HTTP request latency by route")
+DB_QUERY_SECONDS = Histogram("db_query_seconds", "Database statement execution time by statement type")
+LLM_CALL_SECONDS = Histogram("llm_call_seconds", "LLM completion latency by calling function")
+LLM_CALLS = Counter("llm_calls_total", "LLM calls by calling function and outcome (ok, error, cache_hit)")
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens reported by the LLM API by calling function and kind (prompt, completion)")
+LLM_PROMPT_TOKENS = Histogram(
+    "llm_prompt_tokens", "Prompt tokens per LLM call by calling function",
+    buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192),
+)
+LLM_QUEUE_DEPTH = Gauge("llm_queue_depth", "LLM calls waiting for the scheduler by priority class")
+LLM_QUEUE_WAIT_SECONDS = Histogram("llm_queue_wait_seconds", "Time LLM calls waited for the scheduler by priority class")
+LLM_IN_FLIGHT = Gauge("llm_in_flight", "LLM calls currently running")
+LLM_RETRIES = Counter("llm_retries_total", "LLM call retries by calling function and reason (rate_limit, timeout, connection, server)")
+PARSE_SECONDS = Histogram("llm_parse_seconds", "Time spent parsing LLM output by parser")
+STRUCTURED_OUTPUTS = Counter(
+    "llm_structured_outputs_total", "Structured LLM replies by parser and outcome (ok, repaired, fallback)"
+)
+EVALUATION_SECONDS = Histogram("evaluation_seconds", "Time to grade one learner response by task type")
+PARSE_FAILURES = Counter("llm_parse_failures_total", "Invalid or missing fields in structured LLM replies by parser and field")
+
+
+def instrument_engine(engine) -> None:
+    """Time every statement executed on a SQLAlchemy engine into DB_QUERY_SECONDS."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["query_start"].pop()
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement else "UNKNOWN"
+        DB_QUERY_SECONDS.observe(time.perf_counter() - start, operation=operation)
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
@@ -0,0 +1,57 @@
+"""
+Lightweight schema migrations for existing databases.
+Base.metadata.create_all creates missing tables but never changes tables that
+already exist, so anything added to an existing table (indexes, columns) is
+applied here. Each migration runs once and is recorded in schema_migrations.
+"""
+
+import logging
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from models import Message, TimelineItem, TaskContentPool
+
+logger = logging.getLogger(__name__)
+
+
+def _create_model_indexes(conn, *models) -> None:
+    """Create every index declared on the given models that does not exist yet."""
+    for model in models:
+        for index in model.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def _hot_query_indexes(conn) -> None:
+    # Message by (session_id, task_title) ordered by timestamp;
+    # TimelineItem by (session_id, status) and (session_id, title)
+    _create_model_indexes(conn, Message, TimelineItem, TaskContentPool)
+
+
+# Ordered list of (migration id, function taking a connection)
+MIGRATIONS = [
+    ("0001_hot_query_indexes", _hot_query_indexes),
+]
+
+
+def run_migrations(engine: Engine) -> list:
+    """Apply pending migrations in order. Returns the ids that were applied."""
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations (id VARCHAR PRIMARY KEY, applied_at TIMESTAMP)"
+        ))
+        applied = {row[0] for row in conn.execute(text("SELECT id FROM schema_migrations"))}
+
+    newly_applied = []
+    for migration_id, migrate in MIGRATIONS:
+        if migration_id in applied:
+            continue
+        with engine.begin() as conn:
+            migrate(conn)
+            conn.execute(
+                text("INSERT INTO schema_migrations (id, applied_at) VALUES (:id, :applied_at)"),
+                {"id": migration_id, "applied_at": datetime.utcnow()},
+            )
+        logger.info("[migrations] Applied %s", migration_id)
+        newly_applied.append(migration_id)
+    return newly_applied
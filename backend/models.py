@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Index
 from datetime import datetime
 from database import Base
 
@@ -9,6 +9,10 @@ class UserSession(Base):
 
 class TimelineItem(Base):
     __tablename__ = "timeline"
+    __table_args__ = (
+        Index("ix_timeline_session_status", "session_id", "status"),
+        Index("ix_timeline_session_title", "session_id", "title"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(String, ForeignKey("sessions.id"))
@@ -27,6 +31,9 @@ class TimelineItem(Base):
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_session_task_ts", "session_id", "task_title", "timestamp"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(String, ForeignKey("sessions.id"))
@@ -45,3 +52,38 @@ class Reflection(Base):
     difficulty = Column(Integer)   # 1–5
     confidence = Column(Integer)   # 1–5
     comment = Column(String)
+
+class TaskContentPool(Base):
+    __tablename__ = "task_content_pool"
+    __table_args__ = (
+        Index("ix_task_content_pool_title_band", "task_title", "band"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    task_title = Column(String)
+    band = Column(String)  # performance band: new | same | harder | easier
+    task_content = Column(Text)  # JSON string, same shape as TimelineItem.task_content
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ConversationSummary(Base):
+    __tablename__ = "conversation_summaries"
+    __table_args__ = (
+        Index("ix_conversation_summaries_session_title", "session_id", "task_title", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String, ForeignKey("sessions.id"))
+    task_title = Column(String)
+    summary = Column(Text)  # LLM-written summary of the turns up to last_message_id
+    last_message_id = Column(Integer)  # newest message covered by the summary
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class PerformanceStats(Base):
+    __tablename__ = "performance_stats"
+
+    session_id = Column(String, ForeignKey("sessions.id"), primary_key=True)
+    grade_count = Column(Integer, default=0)
+    grade_sum = Column(Integer, default=0)
+    grade_sumsq = Column(Integer, default=0)  # sum of squared grades, for the standard deviation
+    recent_grades = Column(Text, default="[]")  # JSON list of [task_id, grade], newest first
+    updated_at = Column(DateTime, default=datetime.utcnow)
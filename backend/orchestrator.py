@@ -1,175 +1,418 @@
-from llm.manager_agent import manager_reply, generate_scenario_example
-from llm.coach_agent import coach_feedback
+from llm.manager_agent import manager_reply_async, manager_reply_stream, generate_scenario_example_async
+from llm.coach_agent import coach_feedback_async
 from database import SessionLocal
+from single_flight import SingleFlight
+from context_builder import build_history, rolling_summary, MANAGER_CONTEXT_TOKENS, COACH_CONTEXT_TOKENS
+from conversation_summary import load_summary, summary_due, schedule_summary_update
 from models import Message, TimelineItem
+from sqlalchemy import select, or_
+import asyncio
 import json
+import logging
+from datetime import datetime
+from typing import Optional
 
-def handle_turn(session_id: str, task_title: str, user_message: str) -> dict:
+logger = logging.getLogger(__name__)
+
+# Coach delivery modes for handle_turn:
+# - "inline": coach tips are part of the /message response. The coach call starts
+#   as soon as the manager reply exists and overlaps with persisting the turn.
+# - "deferred": the response returns right after the manager reply; coach tips are
+#   generated in the background and stored as a coach message (see latest_coach_tips).
+COACH_MODES = ("inline", "deferred")
+
+# Strong references to in-flight background coach tasks so they are not garbage-collected
+_background_tasks = set()
+
+
+def _coach_message(session_id: str, task_title: str, coach_tips) -> Message:
+    """Build the private coach message record for a list of tips."""
+    coach_tips_text = "\n".join(coach_tips) if isinstance(coach_tips, list) else str(coach_tips)
+    return Message(
+        session_id=session_id,
+        task_title=task_title,
+        sender="coach",
+        text=coach_tips_text,
+        meta_info=json.dumps({"tips": coach_tips if isinstance(coach_tips, list) else [coach_tips]}),
+    )
+
+
+def _save_messages(records: list) -> None:
     """
-    Orchestrates a single user turn:
-    1. Fetches active task context
-    2. Calls manager and coach agents
-    3. Persists all messages
-    4. Returns structured response
+    Store new messages in a short-lived session (run via asyncio.to_thread, so neither
+    the event loop nor a pooled connection is held while the LLM calls run).
+    Committed records keep their ids and fields after the session closes.
     """
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        db.add_all(records)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def _persist_deferred_coach_tips(session_id: str, task_title: str, coach_task: asyncio.Task) -> None:
+    """Wait for a background coach call and store its tips once they arrive."""
+    try:
+        coach_tips = await coach_task
+    except Exception as e:
+        logger.error("[orchestrator] Deferred coach feedback failed: %s", e)
+        return
+
+    try:
+        await asyncio.to_thread(_save_messages, [_coach_message(session_id, task_title, coach_tips)])
+        logger.info("[orchestrator] Deferred coach tips stored for task '%s'", task_title)
+    except Exception as e:
+        logger.error("[orchestrator] Error storing deferred coach tips: %s", e)
+
+
+def latest_coach_tips(session_id: str, task_title: str) -> dict:
+    """Return the most recent coach tips stored for a task (used with deferred delivery)."""
     db = SessionLocal()
-    
+    try:
+        coach_msg = (
+            db.query(Message)
+            .filter(
+                Message.session_id == session_id,
+                Message.task_title == task_title,
+                Message.sender == "coach",
+            )
+            .order_by(Message.id.desc())
+            .first()
+        )
+        if not coach_msg:
+            return {"message_id": None, "coach_tips": []}
+        tips = json.loads(coach_msg.meta_info).get("tips", []) if coach_msg.meta_info else [coach_msg.text]
+        return {"message_id": coach_msg.id, "coach_tips": tips}
+    finally:
+        db.close()
+
+
+# Number of most recent messages sent to the agents alongside the scenario
+HISTORY_WINDOW = 10
+
+
+def _history_window(db, session_id: str, task_title: str) -> list:
+    """
+    Return the first message of the task (the scenario, which holds the
+    "Your counterpart is [Name]" line the coach needs) plus the last
+    HISTORY_WINDOW messages, chronologically, using a single query.
+    """
+    task_filter = (Message.session_id == session_id, Message.task_title == task_title)
+    first_id = (
+        select(Message.id)
+        .where(*task_filter)
+        .order_by(Message.timestamp.asc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    tail_ids = (
+        select(Message.id)
+        .where(*task_filter)
+        .order_by(Message.timestamp.desc())
+        .limit(HISTORY_WINDOW)
+    )
+    return (
+        db.query(Message)
+        .filter(*task_filter, or_(Message.id == first_id, Message.id.in_(tail_ids)))
+        .order_by(Message.timestamp.asc())
+        .all()
+    )
+
 
-    # Fetch the task by session and title
-    current_task = (
-        db.query(TimelineItem)
-        .filter(
-            TimelineItem.session_id == session_id,
-            TimelineItem.title == task_title,
+# Scenario generation shared by /scenario-example and the first turn of a simulation
+scenario_flights = SingleFlight("scenario")
+
+
+def _stored_scenario(session_id: str, task_title: str) -> Optional[Message]:
+    db = SessionLocal()
+    try:
+        return (
+            db.query(Message)
+            .filter(
+                Message.session_id == session_id,
+                Message.task_title == task_title,
+                Message.sender == "system",
+            )
+            .first()
         )
-        .first()
+    finally:
+        db.close()
+
+
+async def _create_scenario(session_id: str, task_title: str, coach_summary: str) -> Message:
+    # Another request may have stored it since the caller looked
+    existing = await asyncio.to_thread(_stored_scenario, session_id, task_title)
+    if existing:
+        return existing
+
+    scenario = await generate_scenario_example_async(task_title, coach_summary)
+    logger.debug("[orchestrator] Generated scenario for task '%s':\n%s", task_title, scenario)
+    scenario_msg = Message(
+        session_id=session_id,
+        task_title=task_title,
+        sender="system",  # Mark it as system message so it's not a real chat message
+        text=scenario,
     )
+    await asyncio.to_thread(_save_messages, [scenario_msg])
+    logger.debug("[orchestrator] Scenario stored in database")
+    return scenario_msg
+
+
+async def ensure_scenario(session_id: str, task_title: str, coach_summary: str) -> Message:
+    """
+    Return the stored scenario (system message) for a task, generating it if needed.
+    Concurrent callers for the same (session_id, task_title) share one generation.
+    """
+    return await scenario_flights.run((session_id, task_title), _create_scenario, session_id, task_title, coach_summary)
+
+
+def format_message(msg: Message) -> dict:
+    """Serialize a message for the frontend."""
+    return {
+        "id": msg.id,
+        "sender": msg.sender,
+        "text": msg.text,
+        "timestamp": msg.timestamp.isoformat() if hasattr(msg.timestamp, 'isoformat') else str(msg.timestamp),
+    }
+
+
+def _load_turn(session_id: str, task_title: str) -> tuple:
+    """
+    Load the task and its history window (the first message, i.e. the scenario, plus the
+    last HISTORY_WINDOW messages) in a short-lived session. Returns (task or None, messages).
+    """
+    db = SessionLocal()
+    try:
+        current_task = (
+            db.query(TimelineItem)
+            .filter(
+                TimelineItem.session_id == session_id,
+                TimelineItem.title == task_title,
+            )
+            .first()
+        )
+        return current_task, _history_window(db, session_id, task_title)
+    finally:
+        db.close()
+
+
+def _load_older_context(session_id: str, task_title: str, before_id: int) -> tuple:
+    """
+    The persisted summary of a task's older messages plus one line per message before
+    before_id it does not cover yet, in a short-lived session. Returns (summary, lines).
+    """
+    db = SessionLocal()
+    try:
+        stored = load_summary(db, session_id, task_title)
+        summary_lines = rolling_summary(
+            db, session_id, task_title, before_id, after_id=stored.last_message_id if stored else 0
+        )
+        return (stored.summary if stored else ""), summary_lines
+    finally:
+        db.close()
+
+
+async def _prepare_turn(session_id: str, task_title: str) -> tuple:
+    """
+    Shared setup for a user turn: loads the task, makes sure the scenario exists
+    and builds the manager and coach conversation histories.
+    Database reads run in worker threads with their own short-lived sessions, so no
+    connection or transaction is held while the scenario is generated.
+    Returns (task_context, manager_conversation_history, coach_conversation_history).
+    """
+    current_task, messages_to_use = await asyncio.to_thread(_load_turn, session_id, task_title)
     task_context = {
         "title": current_task.title if current_task else task_title,
         "objective": current_task.coach_summary if current_task else "",
     }
     
-    # Check if this is the first message for this task
-    # If so, generate and store the scenario as a system message
-    all_messages_check = (
-        db.query(Message)
-        .filter(Message.session_id == session_id, Message.task_title == task_title)
-        .count()
-    )
-    
-    if all_messages_check == 0 and current_task:
-        # Generate scenario and store it as the first message
+    # If this is the first message for this task, generate and store the scenario as a system message
+    if not messages_to_use and current_task:
         try:
-            scenario = generate_scenario_example(current_task.title, current_task.coach_summary)
-            print(f"\n[orchestrator] Generated scenario for task '{current_task.title}':\n{scenario}\n")
-            scenario_msg = Message(
-                session_id=session_id,
-                task_title=task_title,
-                sender="system",  # Mark it as system message so it's not a real chat message
-                text=scenario,
-            )
-            db.add(scenario_msg)
-            db.flush()
-            print(f"[orchestrator] Scenario stored in database")
+            scenario_msg = await ensure_scenario(session_id, task_title, current_task.coach_summary)
+            messages_to_use = [scenario_msg]
         except Exception as e:
-            print(f"[orchestrator] Error generating scenario: {e}")
-    
-    # Fetch recent conversation (last 10 messages for context)
-    recent_messages = (
-        db.query(Message)
-        .filter(Message.session_id == session_id, Message.task_title == task_title)
-        .order_by(Message.timestamp.desc())
-        .limit(10)
-        .all()
-    )
-    recent_messages.reverse()  # chronological order
+            logger.error("[orchestrator] Error generating scenario: %s", e)
     
-    # Also fetch the first message (scenario) if it's not in recent_messages
-    # This ensures we have the "Your counterpart is [Name]" line for coach extraction
-    all_messages = (
-        db.query(Message)
-        .filter(Message.session_id == session_id, Message.task_title == task_title)
-        .order_by(Message.timestamp.asc())
-        .all()
-    )
-    
-    # Combine first message + recent messages (avoiding duplicates)
-    messages_to_use = []
-    if all_messages:
-        messages_to_use.append(all_messages[0])  # Always include first message (scenario)
-        message_ids = {all_messages[0].id}
-        # Add recent messages that aren't already included
-        for msg in recent_messages:
-            if msg.id not in message_ids:
-                messages_to_use.append(msg)
-                message_ids.add(msg.id)
-    
-    # Build TWO conversation histories:
+    # Build TWO conversation histories, each within its own token budget:
     # 1. For manager agent: exclude coach tips AND system message (manager shouldn't see the scenario instructions meant for the user)
     # 2. For coach agent: include everything (coach needs full context including scenario)
-    
-    manager_conversation_history = "\n".join(
-        [f"{msg.sender.upper()}: {msg.text}" for msg in messages_to_use if msg.sender not in ["coach", "system"]]
+    scenario = messages_to_use[0] if messages_to_use and messages_to_use[0].sender == "system" else None
+    turns = [msg for msg in messages_to_use[-HISTORY_WINDOW:] if msg is not scenario]
+    # Messages older than the window are represented by the persisted summary plus
+    # one line per message it does not cover yet; refresh it in the background when
+    # enough such messages pile up
+    summary, summary_lines = "", []
+    if turns and len(messages_to_use) > HISTORY_WINDOW:
+        summary, summary_lines = await asyncio.to_thread(_load_older_context, session_id, task_title, turns[0].id)
+        if summary_due(len(summary_lines)):
+            schedule_summary_update(session_id, task_title, turns[0].id)
+
+    manager_conversation_history = build_history(
+        [msg for msg in turns if msg.sender not in ["coach", "system"]],
+        MANAGER_CONTEXT_TOKENS,
+        summary=summary,
+        summary_lines=summary_lines,
+        agent="manager",
     )
     
-    coach_conversation_history = "\n".join(
-        [f"{msg.sender.upper()}: {msg.text}" for msg in messages_to_use]
+    coach_conversation_history = build_history(
+        turns,
+        COACH_CONTEXT_TOKENS,
+        scenario=scenario,
+        summary=summary,
+        summary_lines=summary_lines,
+        agent="coach",
     )
     
-    print(f"\n[orchestrator] Messages for this task (total {len(messages_to_use)}):")
-    for i, msg in enumerate(messages_to_use):
-        print(f"  [{i}] {msg.sender}: {msg.text[:80]}...")
-    print(f"\n[orchestrator] Coach conversation history:\n{coach_conversation_history}\n")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("[orchestrator] Messages for this task (total %s):", len(messages_to_use))
+        for i, msg in enumerate(messages_to_use):
+            logger.debug("  [%s] %s: %s...", i, msg.sender, msg.text[:80])
+        logger.debug("[orchestrator] Coach conversation history:\n%s", coach_conversation_history)
     
-    # Store user message
+    return task_context, manager_conversation_history, coach_conversation_history
+
+
+async def handle_turn(session_id: str, task_title: str, user_message: str, coach_mode: str = "inline") -> dict:
+    """
+    Orchestrates a single user turn:
+    1. Fetches active task context
+    2. Calls the manager agent
+    3. Starts the coach agent and persists the turn while it runs
+    4. Returns structured response (coach tips inline, or later when deferred)
+    """
+    task_context, manager_conversation_history, coach_conversation_history = await _prepare_turn(
+        session_id, task_title
+    )
+
+    # User message is timestamped on arrival but only written after the manager
+    # replies, so no connection or transaction is held open during the LLM call
     user_msg_record = Message(
         session_id=session_id,
         task_title=task_title,
         sender="user",
         text=user_message,
+        timestamp=datetime.utcnow(),
     )
-    db.add(user_msg_record)
-    db.flush()  # Get the ID
     
     # Call manager agent with task context (without coach tips!)
-    manager_response = manager_reply(
+    manager_response = await manager_reply_async(
         user_message=user_message,
         task_context=task_context,
         conversation_history=manager_conversation_history,
     )
     
-    # Store manager message
+    # Store user and manager messages
     manager_msg_record = Message(
         session_id=session_id,
         task_title=task_title,
         sender="manager",
         text=manager_response,
     )
-    db.add(manager_msg_record)
-    db.flush()
+    new_records = [user_msg_record, manager_msg_record]
     
-    # Call coach agent (with full conversation history including scenario for counterpart extraction)
-    coach_tips = coach_feedback(
-        user_message=user_message,
-        manager_reply=manager_response,
-        task_context=task_context,
-        conversation_history=coach_conversation_history,
-    )
-    
-    # Store coach suggestions as a single "coach" message (private)
-    coach_tips_text = "\n".join(coach_tips) if isinstance(coach_tips, list) else str(coach_tips)
-    coach_msg_record = Message(
-        session_id=session_id,
-        task_title=task_title,
-        sender="coach",
-        text=coach_tips_text,
-        meta_info=json.dumps({"tips": coach_tips if isinstance(coach_tips, list) else [coach_tips]}),
-    )
-    db.add(coach_msg_record)
-    
-    db.commit()
-    # Fetch all messages for the session, ordered chronologically
-    all_messages = (
-        db.query(Message)
-        .filter(Message.session_id == session_id, Message.task_title == task_title)
-        .order_by(Message.timestamp.asc())
-        .all()
+    # Start the coach agent right away (with full conversation history including scenario
+    # for counterpart extraction) and persist the user/manager turn while it runs
+    coach_task = asyncio.create_task(
+        coach_feedback_async(
+            user_message=user_message,
+            manager_reply=manager_response,
+            task_context=task_context,
+            conversation_history=coach_conversation_history,
+        )
     )
-    db.close()
-
-    # Format messages for frontend
-    formatted_messages = [
-        {
-            "id": msg.id,
-            "sender": msg.sender,
-            "text": msg.text,
-            "timestamp": msg.timestamp.isoformat() if hasattr(msg.timestamp, 'isoformat') else str(msg.timestamp),
-        }
-        for msg in all_messages
-    ]
+    try:
+        await asyncio.to_thread(_save_messages, list(new_records))
+    except Exception:
+        coach_task.cancel()
+        raise
+
+    coach_pending = coach_mode == "deferred"
+    if coach_pending:
+        persist_task = asyncio.create_task(_persist_deferred_coach_tips(session_id, task_title, coach_task))
+        _background_tasks.add(persist_task)
+        persist_task.add_done_callback(_background_tasks.discard)
+        coach_tips = []
+    else:
+        coach_tips = await coach_task
+        # Store coach suggestions as a single "coach" message (private)
+        coach_msg_record = _coach_message(session_id, task_title, coach_tips)
+        await asyncio.to_thread(_save_messages, [coach_msg_record])
+        new_records.append(coach_msg_record)
 
+    # Only the messages created by this turn; the frontend appends them to its transcript
     return {
         "manager_reply": manager_response,
         "coach_tips": coach_tips,
-        "messages": formatted_messages,
+        "coach_pending": coach_pending,
+        "new_messages": [format_message(msg) for msg in new_records],
     }
+
+
+async def stream_turn(session_id: str, task_title: str, user_message: str):
+    """
+    Streaming variant of handle_turn. Yields (event, data) pairs:
+    - "token": {"text": ...} for each manager reply chunk as the LLM produces it
+    - "coach": {"coach_tips": [...]} once the coach agent has answered
+    - "done": {"manager_reply", "user_message_id", "manager_message_id", "coach_message_id"}
+    - "error": {"error": ...} if the turn fails part way
+    """
+    try:
+        task_context, manager_conversation_history, coach_conversation_history = await _prepare_turn(
+            session_id, task_title
+        )
+        user_msg_record = Message(
+            session_id=session_id,
+            task_title=task_title,
+            sender="user",
+            text=user_message,
+            timestamp=datetime.utcnow(),
+        )
+
+        parts = []
+        async for delta in manager_reply_stream(
+            user_message=user_message,
+            task_context=task_context,
+            conversation_history=manager_conversation_history,
+        ):
+            parts.append(delta)
+            yield "token", {"text": delta}
+        manager_response = "".join(parts).strip()
+
+        manager_msg_record = Message(
+            session_id=session_id,
+            task_title=task_title,
+            sender="manager",
+            text=manager_response,
+        )
+        coach_task = asyncio.create_task(
+            coach_feedback_async(
+                user_message=user_message,
+                manager_reply=manager_response,
+                task_context=task_context,
+                conversation_history=coach_conversation_history,
+            )
+        )
+        try:
+            await asyncio.to_thread(_save_messages, [user_msg_record, manager_msg_record])
+        except Exception:
+            coach_task.cancel()
+            raise
+
+        coach_tips = await coach_task
+        yield "coach", {"coach_tips": coach_tips}
+
+        coach_msg_record = _coach_message(session_id, task_title, coach_tips)
+        await asyncio.to_thread(_save_messages, [coach_msg_record])
+
+        yield "done", {
+            "manager_reply": manager_response,
+            "user_message_id": user_msg_record.id,
+            "manager_message_id": manager_msg_record.id,
+            "coach_message_id": coach_msg_record.id,
+        }
+    except Exception as e:
+        logger.error("[orchestrator] Streaming turn failed: %s", e)
+        yield "error", {"error": str(e)}
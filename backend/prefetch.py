@@ -0,0 +1,135 @@
+"""
+Speculative prefetch of task content.
+When a task starts, the tasks the learner is most likely to open next (the next planned
+task and the candidates "Choose Another" picks from) get their content generated in the
+background: task content for exercise tasks, the scenario for simulations. Results are
+stored like any other content, so /task-content and /scenario-example find them ready.
+Speculative generations are capped per session; the task that just became in_progress
+after a completion is always prefetched.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from jobs import job_queue
+from models import Message, TimelineItem
+from llm.task_analyzer import similar_task_candidates
+
+logger = logging.getLogger(__name__)
+
+# Most speculative prefetches per session (0 disables speculation)
+TASK_PREFETCH_PER_SESSION = int(os.getenv("TASK_PREFETCH_PER_SESSION", "4"))
+# "Choose Another" candidates prefetched on each task start
+TASK_PREFETCH_CANDIDATES = int(os.getenv("TASK_PREFETCH_CANDIDATES", "2"))
+# Sessions whose prefetch history is remembered (least recently active are forgotten)
+PREFETCH_TRACKED_SESSIONS = 10000
+
+
+class _PrefetchLedger:
+    """Task ids already prefetched speculatively, per session (bounded LRU)."""
+
+    def __init__(self, max_sessions: int):
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def claim(self, session_id: str, task_id: int, cap: int) -> bool:
+        """Record a prefetch of task_id; False if already done or the session is at its cap."""
+        with self._lock:
+            task_ids = self._sessions.setdefault(session_id, set())
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            if task_id in task_ids or len(task_ids) >= cap:
+                return False
+            task_ids.add(task_id)
+            return True
+
+
+_ledger = _PrefetchLedger(PREFETCH_TRACKED_SESSIONS)
+
+
+def _enqueue(session_id: str, task: TimelineItem) -> None:
+    job_queue.enqueue(
+        "prefetch_task_content",
+        {"session_id": session_id, "task_id": task.id},
+        dedupe_key=f"prefetch:{session_id}:{task.id}",
+    )
+
+
+def prefetch_task(session_id: str, task) -> None:
+    """Queue content generation for the task that just became in_progress (best effort)."""
+    if task is None or task.task_content:
+        return
+    try:
+        _enqueue(session_id, task)
+    except RuntimeError as e:
+        logger.debug("[prefetch] Not queued: %s", e)
+
+
+def _needs_content(task: TimelineItem, scenario_titles: set) -> bool:
+    if (task.task_type or "simulation") == "simulation":
+        return task.title not in scenario_titles
+    return not task.task_content
+
+
+def prefetch_likely_next(db, session_id: str, current_task: TimelineItem) -> list:
+    """
+    Queue content for the tasks likely to follow current_task, within the session's
+    speculative cap. Returns the ids of the tasks queued.
+    """
+    if current_task is None or TASK_PREFETCH_PER_SESSION <= 0:
+        return []
+    all_tasks = (
+        db.query(TimelineItem)
+        .filter(TimelineItem.session_id == session_id)
+        .order_by(TimelineItem.id)
+        .all()
+    )
+    by_id = {t.id: t for t in all_tasks}
+    next_planned = next(
+        (t for t in all_tasks if t.status == "planned" and t.id != current_task.id),
+        None,
+    )
+    candidates = similar_task_candidates(
+        current_task.id,
+        current_task.difficulty,
+        [{"id": t.id, "difficulty": t.difficulty, "status": t.status} for t in all_tasks],
+    )
+    targets = [next_planned] if next_planned else []
+    for candidate in candidates:
+        if len(targets) >= 1 + TASK_PREFETCH_CANDIDATES:
+            break
+        task = by_id[candidate["id"]]
+        if task not in targets:
+            targets.append(task)
+
+    # Simulations are ready once their scenario message exists
+    simulation_titles = [t.title for t in targets if (t.task_type or "simulation") == "simulation"]
+    scenario_titles = set()
+    if simulation_titles:
+        scenario_titles = {
+            title for (title,) in db.query(Message.task_title).filter(
+                Message.session_id == session_id,
+                Message.task_title.in_(simulation_titles),
+                Message.sender == "system",
+            )
+        }
+
+    queued = []
+    for task in targets:
+        if not _needs_content(task, scenario_titles):
+            continue
+        if not _ledger.claim(session_id, task.id, TASK_PREFETCH_PER_SESSION):
+            continue
+        try:
+            _enqueue(session_id, task)
+        except RuntimeError as e:
+            logger.debug("[prefetch] Not queued: %s", e)
+            break
+        queued.append(task.id)
+    if queued:
+        logger.info("[prefetch] Queued content for tasks %s of session %s", queued, session_id)
+    return queued
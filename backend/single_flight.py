@@ -0,0 +1,37 @@
+"""
+Single-flight request coalescing.
+Concurrent callers asking for the same key share one in-flight execution instead of each
+starting their own (e.g. a double-clicked button firing two identical LLM generations).
+Coalescing is per process; the key is released as soon as the execution finishes, so
+later callers start fresh and should find the stored result.
+"""
+
+import asyncio
+
+from metrics import Counter
+
+SINGLE_FLIGHT_CALLS = Counter("single_flight_calls_total", "Single-flight calls by group and role (leader, coalesced)")
+
+
+class SingleFlight:
+    """Run at most one coroutine per key at a time; concurrent callers await its result."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight = {}
+
+    async def run(self, key, fn, *args, **kwargs):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._release(key, done))
+            SINGLE_FLIGHT_CALLS.inc(group=self.name, role="leader")
+        else:
+            SINGLE_FLIGHT_CALLS.inc(group=self.name, role="coalesced")
+        # A caller that goes away (client disconnect) must not cancel the work the others await
+        return await asyncio.shield(task)
+
+    def _release(self, key, task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
@@ -52,12 +52,8 @@ export default function AnalysisTask({ sessionId, taskTitle, taskId, onTaskCompl
 
     setEvaluating(true);
     try {
-      // Mark task as completed
-      await fetch(`http://localhost:8000/complete-task/${sessionId}/${taskId}`, {
-        method: "POST"
-      }).catch(err => console.error("Error marking task complete:", err));
-
-      const result = await evaluateAnalysis(sessionId, taskTitle, content.question, answer);
+      // Grading also saves the grade and completes the task
+      const result = await evaluateAnalysis(sessionId, taskTitle, content.question, answer, taskId);
       
       // Set refresh flag for home page
       if (typeof window !== "undefined") {
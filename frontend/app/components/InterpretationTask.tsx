@@ -45,12 +45,8 @@ export default function InterpretationTask({ sessionId, taskTitle, taskId, onTas
 
     setEvaluating(true);
     try {
-      // Mark task as completed
-      await fetch(`http://localhost:8000/complete-task/${sessionId}/${taskId}`, {
-        method: "POST"
-      }).catch(err => console.error("Error marking task complete:", err));
-
-      const result = await evaluateInterpretation(sessionId, taskTitle, content.statement, answer);
+      // Grading also saves the grade and completes the task
+      const result = await evaluateInterpretation(sessionId, taskTitle, content.statement, answer, taskId);
       
       // Set refresh flag for home page
       if (typeof window !== "undefined") {
@@ -52,12 +52,8 @@ export default function PlanningTask({ sessionId, taskTitle, taskId, onTaskCompl
 
     setEvaluating(true);
     try {
-      // Mark task as completed
-      await fetch(`http://localhost:8000/complete-task/${sessionId}/${taskId}`, {
-        method: "POST"
-      }).catch(err => console.error("Error marking task complete:", err));
-
-      const result = await evaluatePlan(sessionId, taskTitle, content.scenario, content.constraints, plan);
+      // Grading also saves the grade and completes the task
+      const result = await evaluatePlan(sessionId, taskTitle, content.scenario, content.constraints, plan, taskId);
             // Set refresh flag for home page
       if (typeof window !== "undefined") {
         localStorage.setItem("refresh_timeline", "true");
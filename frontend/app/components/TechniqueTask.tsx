@@ -53,18 +53,15 @@ export default function TechniqueTask({ sessionId, taskTitle, taskId, onTaskComp
 
     setEvaluating(true);
     try {
-      // Mark task as completed
-      await fetch(`http://localhost:8000/complete-task/${sessionId}/${taskId}`, {
-        method: "POST"
-      }).catch(err => console.error("Error marking task complete:", err));
-
+      // Grading also saves the grade and completes the task
       const result = await evaluateTechnique(
         sessionId,
         taskTitle,
         content.technique_name,
         content.technique_instruction,
         content.other_person_says,
-        response
+        response,
+        taskId
       );
       
       // Set refresh flag for home page
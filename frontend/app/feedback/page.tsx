@@ -60,35 +60,37 @@ export default function FeedbackPage() {
   }, [taskTitle]);
 
   const handleReturnHome = async () => {
-    // Save grade and user feedback to backend if available
-    if (grade !== null && typeof window !== "undefined") {
+    // The grade was already stored with the evaluation (save=true) or by /task-feedback;
+    // the survey is saved separately so it never overwrites the grade or the AI feedback
+    if (typeof window !== "undefined") {
       const sessionId = localStorage.getItem("session_id");
       const taskIdParam = new URLSearchParams(window.location.search).get("taskId");
-      
-      if (sessionId && taskIdParam) {
+
+      if (sessionId && taskIdParam && (difficulty || confidence || challenges || takeaways)) {
         try {
-          // Combine user's survey responses into feedback string
-          const userFeedback = [
-            difficulty ? `Difficulty: ${difficulty}` : null,
-            confidence ? `Confidence: ${confidence}` : null,
+          const comment = [
             challenges ? `Challenges: ${challenges}` : null,
             takeaways ? `Takeaways: ${takeaways}` : null,
           ].filter(Boolean).join(" | ");
 
-          // Send grade + user's survey feedback (not AI feedback)
-          const params = new URLSearchParams({
-            grade: String(grade),
-            feedback: userFeedback || "No survey responses provided"
+          // Ratings are stored as 1-5, the position of the chosen option
+          await fetch(`http://localhost:8000/task-survey/${sessionId}/${taskIdParam}`, {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({
+              difficulty: difficulty ? difficultyOptions.indexOf(difficulty) + 1 : null,
+              confidence: confidence ? confidenceOptions.indexOf(confidence) + 1 : null,
+              comment,
+            }),
           });
-          await fetch(`http://localhost:8000/save-task-grade/${sessionId}/${taskIdParam}?${params.toString()}`, {
-            method: "POST"
-          }).catch(err => console.error("Error saving grade:", err));
         } catch (err) {
-          console.error("Failed to save grade:", err);
+          console.error("Failed to save survey:", err);
         }
       }
-      
-      localStorage.setItem("refresh_timeline", "true");
+
+      if (grade !== null) {
+        localStorage.setItem("refresh_timeline", "true");
+      }
     }
     router.push("/");
   };
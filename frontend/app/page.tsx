@@ -226,13 +226,20 @@ export default function Home() {
       }
     };
     
-    // Check immediately
+    // Check immediately (pages that set the flag navigate back here, remounting this page)
     checkAndRefresh();
     
-    // Also set up an interval to check periodically (every 300ms for responsiveness)
-    const interval = setInterval(checkAndRefresh, 300);
+    // Also when another tab sets the flag or this tab becomes visible again, instead of polling
+    const onVisible = () => {
+      if (document.visibilityState === "visible") checkAndRefresh();
+    };
+    window.addEventListener("storage", checkAndRefresh);
+    document.addEventListener("visibilitychange", onVisible);
     
-    return () => clearInterval(interval);
+    return () => {
+      window.removeEventListener("storage", checkAndRefresh);
+      document.removeEventListener("visibilitychange", onVisible);
+    };
   }, []);
 
   // Load task details when currentTask changes (from clicking on progress list or from init)
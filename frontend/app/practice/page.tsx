@@ -2,7 +2,7 @@
 
 import { useEffect, useState, useRef } from "react";
 import { useRouter, useSearchParams } from "next/navigation";
-import { getMessages, sendMessage, getTimeline, getTaskContent } from "@/lib/api";
+import { getMessages, sendMessage, getTimeline, getTaskContent, subscribeMessages } from "@/lib/api";
 import type { Message } from "@/lib/api";
 import AnalysisTask from "@/app/components/AnalysisTask";
 import InterpretationTask from "@/app/components/InterpretationTask";
@@ -36,6 +36,8 @@ export default function Practice() {
   const [showCoachBubble, setShowCoachBubble] = useState(true); // Show bubble when tips are hidden
   const [error, setError] = useState<string | null>(null);
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  // Highest message id loaded for the current task; the message stream starts after it
+  const cursorRef = useRef(0);
 
   const handleEndTask = async () => {
     if (sessionId && currentTask) {
@@ -171,6 +173,7 @@ export default function Practice() {
               }
             }
             const key = `${stored}_${active.id}`;
+            cursorRef.current = Math.max(0, ...msgs.map((m) => m.id));
             setMessagesByTask((prev) => ({ ...prev, [key]: taskMsgs }));
             setMessages(taskMsgs);
           }
@@ -196,24 +199,40 @@ export default function Practice() {
     }
   }, [currentTask, sessionId, messagesByTask]);
 
+  // Append messages not shown yet (from a /message response or the message stream)
+  const mergeMessages = (incoming: Message[]) => {
+    if (!sessionId || !currentTask || incoming.length === 0) return;
+    cursorRef.current = Math.max(cursorRef.current, ...incoming.map((m) => m.id));
+    const coachMsg = [...incoming].reverse().find((m) => m.sender === "coach");
+    if (coachMsg) setCoachTips(coachMsg.text.split("\n"));
+    setMessages((prev) => {
+      const seen = new Set(prev.map((m) => m.id));
+      const fresh = incoming.filter((m) => !seen.has(m.id));
+      if (fresh.length === 0) return prev;
+      const newMsgs = [...prev, ...fresh];
+      // Save to messagesByTask with composite key
+      const key = `${sessionId}_${currentTask.id}`;
+      setMessagesByTask((prevMap) => ({ ...prevMap, [key]: newMsgs }));
+      return newMsgs;
+    });
+  };
+
+  // Stream messages stored after the loaded history (coach tips delivered in the
+  // background arrive this way) instead of polling
+  useEffect(() => {
+    if (loading || !sessionId || !currentTask || taskType !== "simulation") return;
+    return subscribeMessages(sessionId, currentTask.title, cursorRef.current, mergeMessages);
+  }, [loading, sessionId, currentTask, taskType]);
+
   const handleSendMessage = async () => {
     if (!draftMessage.trim() || !sessionId || sending || !currentTask) return;
 
     setSending(true);
     try {
       const response = await sendMessage(sessionId, currentTask.title, draftMessage);
-      setMessages((prev) => {
-        // Preserve system message (scenario) if it exists
-        const scenarioMsg = prev.length > 0 && (prev[0].sender === "system" || prev[0].text?.toLowerCase().includes("you are")) ? prev[0] : null;
-        const newMsgs = scenarioMsg
-          ? [scenarioMsg, ...response.messages]
-          : response.messages;
-        // Save to messagesByTask with composite key
-        const key = `${sessionId}_${currentTask.id}`;
-        setMessagesByTask((prevMap) => ({ ...prevMap, [key]: newMsgs }));
-        return newMsgs;
-      });
-      if (response.coach_tips) setCoachTips(response.coach_tips);
+      // The backend returns only the messages created by this turn; the stream may have delivered them already
+      mergeMessages(response.new_messages);
+      if (response.coach_tips?.length) setCoachTips(response.coach_tips);
       setDraftMessage("");
     } finally {
       setSending(false);
@@ -65,6 +65,24 @@ export async function getMessages(sessionId: string, taskTitle: string): Promise
   }
 }
 
+// Receive messages stored after sinceId as they arrive (SSE), e.g. coach tips delivered in
+// the background. A reconnect may repeat messages, so callers de-duplicate by id.
+// Returns a function that closes the stream.
+export function subscribeMessages(
+  sessionId: string,
+  taskTitle: string,
+  sinceId: number,
+  onMessages: (messages: Message[]) => void
+): () => void {
+  const source = new EventSource(
+    `${API_BASE}/messages/${sessionId}/${encodeURIComponent(taskTitle)}/stream?since_id=${sinceId}`
+  );
+  source.addEventListener("messages", (event) => {
+    onMessages(JSON.parse((event as MessageEvent).data).messages);
+  });
+  return () => source.close();
+}
+
 // Send a message to the backend (Manager + Coach)
 export async function sendMessage(sessionId: string, taskTitle: string, text: string) {
   try {
@@ -272,8 +290,13 @@ export async function getTaskContent(sessionId: string, taskTitle?: string) {
   }
 }
 
+// With a task id, the backend saves the grade and completes the task in the same request
+function saveEvaluation(taskId?: number) {
+  return taskId === undefined ? {} : { task_id: taskId, save: true };
+}
+
 // Evaluate analysis task response
-export async function evaluateAnalysis(sessionId: string, taskTitle: string, question: string, response: string) {
+export async function evaluateAnalysis(sessionId: string, taskTitle: string, question: string, response: string, taskId?: number) {
   try {
     const res = await fetch(`${API_BASE}/evaluate-analysis`, {
       method: "POST",
@@ -285,6 +308,7 @@ export async function evaluateAnalysis(sessionId: string, taskTitle: string, que
         task_title: taskTitle,
         question,
         response,
+        ...saveEvaluation(taskId),
       }),
     });
     return handleFetchError(res, "/evaluate-analysis");
@@ -295,7 +319,7 @@ export async function evaluateAnalysis(sessionId: string, taskTitle: string, que
 }
 
 // Evaluate interpretation task response
-export async function evaluateInterpretation(sessionId: string, taskTitle: string, position: string, response: string) {
+export async function evaluateInterpretation(sessionId: string, taskTitle: string, position: string, response: string, taskId?: number) {
   try {
     const res = await fetch(`${API_BASE}/evaluate-interpretation`, {
       method: "POST",
@@ -307,6 +331,7 @@ export async function evaluateInterpretation(sessionId: string, taskTitle: strin
         task_title: taskTitle,
         position,
         response,
+        ...saveEvaluation(taskId),
       }),
     });
     return handleFetchError(res, "/evaluate-interpretation");
@@ -317,7 +342,7 @@ export async function evaluateInterpretation(sessionId: string, taskTitle: strin
 }
 
 // Evaluate planning task response
-export async function evaluatePlan(sessionId: string, taskTitle: string, scenario: string, constraints: string, response: string) {
+export async function evaluatePlan(sessionId: string, taskTitle: string, scenario: string, constraints: string, response: string, taskId?: number) {
   try {
     const res = await fetch(`${API_BASE}/evaluate-plan`, {
       method: "POST",
@@ -330,6 +355,7 @@ export async function evaluatePlan(sessionId: string, taskTitle: string, scenari
         scenario,
         constraints,
         response,
+        ...saveEvaluation(taskId),
       }),
     });
     return handleFetchError(res, "/evaluate-plan");
@@ -346,7 +372,8 @@ export async function evaluateTechnique(
   techniqueName: string,
   instruction: string,
   otherPersonStatement: string,
-  response: string
+  response: string,
+  taskId?: number
 ) {
   try {
     const res = await fetch(`${API_BASE}/evaluate-technique`, {
@@ -361,6 +388,7 @@ export async function evaluateTechnique(
         instruction,
         other_person_statement: otherPersonStatement,
         response,
+        ...saveEvaluation(taskId),
       }),
     });
     return handleFetchError(res, "/evaluate-technique");